@@ -2,29 +2,131 @@ import os
 os.environ["OMP_NUM_THREADS"] = "1"
 os.environ["OPENBLAS_NUM_THREADS"] = "1"
 os.environ["MKL_NUM_THREADS"] = "1"
-from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, Response, jsonify, g
 from flask_caching import Cache
 from flask_compress import Compress
 from flask_bcrypt import Bcrypt
-from face_emotion import EmotionDetector
-from database_setup import get_db_connection, init_db
+from session_manager import SessionManager, RemoteSessions, SessionLimitError, BROWSER_SOURCE
+from live_state import create_state
+from emotion_log_writer import EmotionLogWriter
+from video_analysis import VideoAnalysisJobs
+from database_setup import get_db_connection, migrate, pool_stats
+from metrics import REGISTRY, REQUEST_SECONDS
+from profiler import SamplingProfiler
 import pymysql
 from pymysql.cursors import DictCursor
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import io
-import base64
+import math
+import time
+import tempfile
+from werkzeug.utils import secure_filename
+from datetime import timedelta
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "dev_secret_123")
 app.config['CACHE_TYPE'] = 'simple'
 app.config['COMPRESS_ALGORITHM'] = 'gzip'
+app.config['STATS_CACHE_TIMEOUT'] = int(os.environ.get("STATS_CACHE_TIMEOUT", "30"))
+app.config['TIMELINE_MAX_POINTS'] = int(os.environ.get("TIMELINE_MAX_POINTS", "2000"))
 cache = Cache(app)
 Compress(app)
 bcrypt = Bcrypt(app)
-detector = EmotionDetector()
-init_db()
+# A device index, stream URL or replay:<video or image dir>?fps=15&loop=1
+app.config['CAMERA_SOURCE'] = os.environ.get("CAMERA_SOURCE", "0")
+# server: the host's CAMERA_SOURCE, as before; browser: clients upload their own camera frames
+app.config['CAPTURE_MODE'] = os.environ.get("CAPTURE_MODE", "server")
+app.config['INGEST_MAX_FPS'] = float(os.environ.get("INGEST_MAX_FPS", "10"))
+app.config['INGEST_MAX_BYTES'] = int(os.environ.get("INGEST_MAX_KB", "512")) * 1024
+app.config['ALLOW_CUSTOM_CAPTURE_SOURCE'] = os.environ.get("ALLOW_CUSTOM_CAPTURE_SOURCE", "0") == "1"
+# all: this process serves HTTP and runs sessions; web: HTTP only, sessions run in
+# inference_worker.py processes. Web workers need a shared LIVE_STATE_URL such as
+# redis://localhost:6379/0, which lets gunicorn run several of them
+app.config['PROCESS_ROLE'] = os.environ.get("PROCESS_ROLE", "all")
+live_state = create_state(os.environ.get("LIVE_STATE_URL"))
+if app.config['PROCESS_ROLE'] not in ("all", "web"):
+    raise ValueError(f"Unknown PROCESS_ROLE '{app.config['PROCESS_ROLE']}'")
+if app.config['PROCESS_ROLE'] == "web" and not live_state.shared:
+    raise ValueError("PROCESS_ROLE=web needs a shared LIVE_STATE_URL")
+local_sessions = None if app.config['PROCESS_ROLE'] == "web" else SessionManager(
+    max_sessions=int(os.environ.get("MAX_SESSIONS", "4")),
+    inference_workers=int(os.environ.get("INFERENCE_WORKERS", "0")) or None,
+    inference_backend=os.environ.get("INFERENCE_BACKEND", "thread"),
+    process_pool_options={
+        "slot_bytes": int(os.environ.get("INFERENCE_SLOT_KB", "0")) * 1024 or None,
+        "slot_count": int(os.environ.get("INFERENCE_SLOTS", "0")) or None
+    },
+    stream_options={
+        "jpeg_quality": int(os.environ.get("STREAM_JPEG_QUALITY", "80")),
+        "max_fps": float(os.environ.get("STREAM_MAX_FPS", "15")),
+        "output_size": tuple(int(v) for v in os.environ["STREAM_SIZE"].split("x")) if os.environ.get("STREAM_SIZE") else None
+    },
+    summary_interval=float(os.environ.get("SUMMARY_PUSH_INTERVAL", "0.25")),
+    log_writer=EmotionLogWriter(
+        batch_size=int(os.environ.get("LOG_BATCH_SIZE", "200")),
+        flush_interval=float(os.environ.get("LOG_FLUSH_INTERVAL", "1.0")),
+        max_queue=int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+    ),
+    scheduler_options={
+        "target_latency": float(os.environ.get("TARGET_LATENCY_MS", "200")) / 1000
+    },
+    classifier_engine=os.environ.get("CLASSIFIER_ENGINE", "deepface"),
+    classifier_options={"precision": os.environ["CLASSIFIER_PRECISION"]} if os.environ.get("CLASSIFIER_PRECISION") else None,
+    decode_workers=int(os.environ.get("DECODE_WORKERS", "2")),
+    state=live_state,
+    # Static scenes skip face detection; MOTION_GATE=0 detects every scheduled frame
+    motion_options={
+        "threshold": int(os.environ.get("MOTION_THRESHOLD", "20")),
+        "refresh_interval": int(os.environ.get("MOTION_REFRESH_FRAMES", "50"))
+    } if os.environ.get("MOTION_GATE", "1") == "1" else None,
+    session_ttl=float(os.environ.get("SESSION_TTL", "10"))
+)
+# With shared state every route goes through it, so any worker can answer for any session
+sessions = RemoteSessions(live_state) if live_state.shared else local_sessions
+# /metrics and /debug/profile are only served with a token: behind a reverse proxy
+# every client looks local, so the peer address cannot stand in for one
+app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+app.config['PROFILER_ENABLED'] = os.environ.get("PROFILER_ENABLED", "0") == "1"
+if app.config['PROFILER_ENABLED'] and not app.config['METRICS_TOKEN']:
+    raise ValueError("PROFILER_ENABLED=1 needs a METRICS_TOKEN")
+profiler = SamplingProfiler(interval=float(os.environ.get("PROFILER_INTERVAL_MS", "10")) / 1000)
+# Web-only workers never run sessions, so they skip loading OpenCV and TensorFlow
+app.config['MODEL_WARMUP'] = os.environ.get(
+    "MODEL_WARMUP", "lazy" if app.config['PROCESS_ROLE'] == "web" else "background"
+)
+# Deploys apply schema migrations as a separate step before starting any server:
+#   python database_setup.py migrate
+# AUTO_MIGRATE=1 runs them on import instead, for single-process setups; migrate()
+# takes a lock, so workers that do this can race safely
+app.config['AUTO_MIGRATE'] = os.environ.get("AUTO_MIGRATE", "0") == "1"
+app.config['UPLOAD_FOLDER'] = os.environ.get("UPLOAD_FOLDER", tempfile.gettempdir())
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_UPLOAD_MB", "2048")) * 1024 * 1024
+def video_job_done(user_id):
+    # Runs on the job thread, outside any request
+    with app.app_context():
+        bump_stats_version(user_id)
+
+video_jobs = VideoAnalysisJobs(
+    max_concurrent=int(os.environ.get("VIDEO_JOBS", "1")),
+    on_done=video_job_done,
+    job_ttl=float(os.environ.get("VIDEO_JOB_TTL", "3600")),
+    workers=int(os.environ.get("VIDEO_WORKERS", "0")) or None,
+    frame_step=int(os.environ.get("VIDEO_FRAME_STEP", "1")),
+    classifier_engine=os.environ.get("CLASSIFIER_ENGINE", "deepface"),
+    classifier_options={"precision": os.environ["CLASSIFIER_PRECISION"]} if os.environ.get("CLASSIFIER_PRECISION") else None
+)
+def run_startup():
+    if app.config['AUTO_MIGRATE']:
+        migrate()
+    if local_sessions is not None:
+        if app.config['MODEL_WARMUP'] == "background":
+            local_sessions.warmup()
+        if live_state.shared:
+            local_sessions.serve_commands()
+
+# Spawned inference workers re-import the main script as __mp_main__; only the
+# real server process runs the startup work
+if __name__ != "__mp_main__":
+    run_startup()
 
 @app.route("/")
 def index():
@@ -36,116 +138,436 @@ def index():
 def video_feed():
     if 'user_id' not in session:
         return redirect(url_for('login'))
+    detector = sessions.get(session['user_id'])
+    if detector is None:
+        return jsonify({"success": False, "message": "No active session"}), 404
     return Response(detector.generate_frames(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
 @app.route("/get_emotion_summary")
 def get_emotion_summary():
     if 'user_id' not in session:
         return jsonify({"success": False, "message": "Not logged in"}), 401
+    detector = sessions.get(session['user_id'])
+    if detector is None:
+        return jsonify({"total_faces": 0, "emotions": {}})
     return jsonify(detector.emotion_summary)
 
+@app.route("/pipeline_stats")
+def pipeline_stats():
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    detector = sessions.get(session['user_id'])
+    if detector is None:
+        return jsonify({"success": False, "message": "No active session"}), 404
+    return jsonify(detector.pipeline_stats())
+
+@app.route("/emotion_summary_stream")
+def emotion_summary_stream():
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    detector = sessions.get(session['user_id'])
+    if detector is None:
+        return jsonify({"success": False, "message": "No active session"}), 404
+    interval = request.args.get('interval', type=float)
+    if interval is not None:
+        interval = max(interval, 0.05)
+    return Response(
+        detector.generate_summary_events(interval),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/start_session", methods=["POST"])
 def start_session():
     if 'user_id' not in session:
         return jsonify({"success": False, "message": "Not logged in"}), 401
-    if detector.start_session():
-        return jsonify({"success": True})
+    source = BROWSER_SOURCE if app.config['CAPTURE_MODE'] == "browser" else app.config['CAMERA_SOURCE']
+    data = request.get_json(silent=True) or {}
+    if app.config['ALLOW_CUSTOM_CAPTURE_SOURCE'] and data.get('source') is not None:
+        source = data['source']
+    try:
+        if sessions.start(session['user_id'], session['user_id'], source):
+            info = sessions.describe(session['user_id'])
+            if info is None or info['capture'] != "browser":
+                return jsonify({"success": True, "capture": "server"})
+            # Clients downscale to the detector's input size so the server never resizes
+            return jsonify({
+                "success": True,
+                "capture": "browser",
+                "frame_size": info['frame_size'],
+                "max_fps": app.config['INGEST_MAX_FPS']
+            })
+    except SessionLimitError as e:
+        return jsonify({"success": False, "message": str(e)}), 429
     return jsonify({"success": False, "message": "Failed to start session"}), 500
 
+INGEST_MIME_TYPES = {"image/jpeg", "image/webp"}
+
+@app.route("/ingest_frame", methods=["POST"])
+def ingest_frame():
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    detector = sessions.get(session['user_id'])
+    if detector is None:
+        return jsonify({"success": False, "message": "No active session"}), 404
+    if detector.source != BROWSER_SOURCE:
+        return jsonify({"success": False, "message": "Session captures on the server"}), 409
+    if request.mimetype not in INGEST_MIME_TYPES:
+        return jsonify({"success": False, "message": "Frames must be image/jpeg or image/webp"}), 415
+    # The length is checked before reading, so chunked uploads are refused
+    if not request.content_length:
+        return jsonify({"success": False, "message": "Content-Length required"}), 411
+    if request.content_length > app.config['INGEST_MAX_BYTES']:
+        return jsonify({"success": False, "message": "Frame too large"}), 413
+    # 429 tells the client the frame was dropped because decoding is behind
+    if not detector.submit_frame(request.get_data(cache=False)):
+        return jsonify({"success": False, "accepted": False}), 429
+    return jsonify({"success": True, "accepted": True}), 202
+
 @app.route("/stop_session", methods=["POST"])
 def stop_session():
     if 'user_id' not in session:
         return jsonify({"success": False, "message": "Not logged in"}), 401
-    detector.stop_session()
+    sessions.stop(session['user_id'])
+    bump_stats_version(session['user_id'])
     return jsonify({"success": True})
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    # Streaming routes are timed to the first byte; their bodies are produced later
+    started = g.pop('request_started', None)
+    if started is not None:
+        REQUEST_SECONDS.labels(
+            request.endpoint or 'unmatched', request.method, str(response.status_code)
+        ).observe(time.perf_counter() - started)
+    return response
+
+def collect_runtime_metrics():
+    # Everything here already lives in a stats() dict, so it is read only when scraped
+    yield ("fed_active_sessions", "gauge", "Live capture sessions", sessions.active_count())
+    lag, intervals = [], []
+    for key, detector in (local_sessions.items() if local_sessions is not None else []):
+        stats = detector.scheduler.stats()
+        labels = {"session": str(key)}
+        lag.append((labels, stats["lag_ema_ms"] / 1000))
+        intervals.append(({**labels, "kind": "detect"}, stats["detect_interval"]))
+        intervals.append(({**labels, "kind": "reinfer"}, stats["reinfer_interval"]))
+    yield ("fed_pipeline_lag_seconds", "gauge", "Smoothed capture-to-publish lag per session", lag)
+    yield ("fed_pipeline_interval_frames", "gauge", "Adaptive detect and re-inference intervals", intervals)
+    if local_sessions is not None and local_sessions.process_pool is not None:
+        pool = local_sessions.process_pool
+        yield ("fed_inference_jobs_in_flight", "gauge", "Frames held by inference worker processes",
+               len(pool.slots) - pool.free_slots.qsize())
+    if local_sessions is not None:
+        writer = local_sessions.log_writer.stats()
+        yield ("fed_log_queue_depth", "gauge", "Emotion log records waiting to be written", writer["queued"])
+        yield ("fed_log_records_total", "counter", "Emotion log records by outcome",
+               [({"outcome": outcome}, writer[outcome]) for outcome in ("written", "dropped", "failed")])
+    db = pool_stats()
+    if db is not None:
+        yield ("fed_db_pool_connections", "gauge", "Database pool connections by state",
+               [({"state": "in_use"}, db["in_use"]), ({"state": "idle"}, db["idle"]), ({"state": "max"}, db["max_size"])])
+        yield ("fed_db_pool_checkouts_total", "counter", "Database pool checkouts", db["checkouts"])
+        yield ("fed_db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection",
+               db["wait_time_total_ms"] / 1000)
+
+REGISTRY.register_collector(collect_runtime_metrics)
+
+def metrics_authorized():
+    token = app.config['METRICS_TOKEN']
+    return bool(token) and request.headers.get('Authorization') == f"Bearer {token}"
+
+@app.route("/metrics")
+def metrics():
+    # Metrics carry per-session labels, so the endpoint is off until a token is set
+    if not app.config['METRICS_TOKEN']:
+        return Response("Metrics disabled\n", status=404, mimetype="text/plain")
+    if not metrics_authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/debug/profile")
+def debug_profile():
+    if not app.config['PROFILER_ENABLED']:
+        return Response("Profiler disabled\n", status=404, mimetype="text/plain")
+    if not metrics_authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    seconds = min(max(request.args.get('seconds', 10, type=float), 0.1), 60)
+    report = profiler.profile(seconds)
+    if report is None:
+        return Response("Profiler already running\n", status=409, mimetype="text/plain")
+    return Response(report, mimetype="text/plain")
+
+EMOTIONS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+CHART_COLORS = ['#FF6384', '#FF9F40', '#FFCD56', '#4BC0C0', '#36A2EB', '#9966FF', '#C9CBCF']
+
+def stats_version(user_id):
+    return cache.get(f"stats_version:{user_id}") or 0
+
+def bump_stats_version(user_id):
+    # Ending a session changes the user's rollups; bumping the version orphans cached stats and charts
+    # timeout=0 keeps the counter forever; an expired counter would restart at 0 and
+    # make keys written under old versions current again
+    key = f"stats_version:{user_id}"
+    cache.set(key, (cache.get(key) or 0) + 1, timeout=0)
+
+def load_emotion_stats(user_id, selected_session):
+    key = f"stats:{user_id}:{selected_session}:{stats_version(user_id)}"
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    conn = get_db_connection()
+    if not conn:
+        return None
+    counts = [0] * len(EMOTIONS)
+    stats = {"total_sessions": 0, "total_faces_detected": 0, "most_common_emotion": "N/A"}
+    try:
+        with conn.cursor(DictCursor) as cursor:
+            # Get user stats
+            cursor.execute('SELECT total_sessions, total_faces_detected, most_common_emotion FROM users WHERE id = %s', (user_id,))
+            user_stats = cursor.fetchone()
+            if user_stats:
+                stats = {
+                    "total_sessions": user_stats['total_sessions'],
+                    "total_faces_detected": user_stats['total_faces_detected'],
+                    "most_common_emotion": user_stats['most_common_emotion'] or 'N/A'
+                }
+
+            # Get sessions list
+            cursor.execute('SELECT id, start_time FROM sessions WHERE user_id = %s ORDER BY start_time DESC', (user_id,))
+            session_list = cursor.fetchall()
+
+            # Get emotion counts from the rollup tables
+            if selected_session:
+                cursor.execute('''
+                    SELECT c.emotion, c.count
+                    FROM session_emotion_counts c
+                    JOIN sessions s ON s.id = c.session_id
+                    WHERE s.user_id = %s AND c.session_id = %s
+                ''', (user_id, selected_session))
+            else:
+                cursor.execute('SELECT emotion, count FROM user_emotion_counts WHERE user_id = %s', (user_id,))
+            for entry in cursor.fetchall():
+                if entry['emotion'] in EMOTIONS:
+                    counts[EMOTIONS.index(entry['emotion'])] = entry['count']
+    finally:
+        conn.close()
+
+    data = {"stats": stats, "sessions": session_list, "counts": counts}
+    cache.set(key, data, timeout=app.config['STATS_CACHE_TIMEOUT'])
+    return data
+
+def render_chart(kind, counts, selected_session):
+    # The object-oriented Figure API keeps no global pyplot state, so concurrent requests are safe
+    from matplotlib.figure import Figure
+
+    if kind == 'pie':
+        fig = Figure(figsize=(5, 5))
+        ax = fig.subplots()
+        ax.pie(counts, labels=EMOTIONS, autopct='%1.1f%%', startangle=90)
+        ax.set_title('Emotion Proportions')
+    else:
+        fig = Figure(figsize=(8, 5))
+        ax = fig.subplots()
+        ax.bar(EMOTIONS, counts, color=CHART_COLORS)
+        ax.set_title(f'Emotion Distribution {"(Session #" + selected_session + ")" if selected_session else "(All Sessions)"}')
+        ax.set_xlabel('Emotions')
+        ax.set_ylabel('Count')
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
 @app.route("/dashboard")
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    user_id = session['user_id']
-    conn = get_db_connection()
-    emotions = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
-    counts = [0] * 7
-    sessions = []
     selected_session = request.args.get('session_id', '')
-    stats = {"total_sessions": 0, "total_faces_detected": 0, "most_common_emotion": "N/A"}
+    data = None
+    try:
+        data = load_emotion_stats(session['user_id'], selected_session)
+    except pymysql.MySQLError as e:
+        flash(f"Database error: {e.args[1]}", "error")
+    if data is None:
+        data = {
+            "stats": {"total_sessions": 0, "total_faces_detected": 0, "most_common_emotion": "N/A"},
+            "sessions": [],
+            "counts": [0] * len(EMOTIONS)
+        }
+
+    return render_template("dashboard.html", 
+                         sessions=data['sessions'],
+                         selected_session=selected_session,
+                         stats=data['stats'])
 
-    if conn:
+@app.route("/api/stats")
+def api_stats():
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    selected_session = request.args.get('session_id', '')
+    try:
+        data = load_emotion_stats(session['user_id'], selected_session)
+    except pymysql.MySQLError as e:
+        return jsonify({"success": False, "message": f"Database error: {e.args[1]}"}), 500
+    if data is None:
+        return jsonify({"success": False, "message": "Database error"}), 500
+    return jsonify({
+        "success": True,
+        "session_id": selected_session or None,
+        "emotions": EMOTIONS,
+        "colors": CHART_COLORS,
+        "counts": data['counts'],
+        "stats": data['stats'],
+        "sessions": [{"id": s['id'], "start_time": s['start_time'].isoformat()} for s in data['sessions']]
+    })
+
+@app.route("/api/stats/chart.png")
+def api_stats_chart():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    user_id = session['user_id']
+    kind = 'pie' if request.args.get('kind') == 'pie' else 'bar'
+    selected_session = request.args.get('session_id', '')
+    key = f"chart:{user_id}:{selected_session}:{stats_version(user_id)}:{kind}"
+    png = cache.get(key)
+    if png is None:
         try:
-            with conn.cursor(DictCursor) as cursor:
-                # Get user stats
-                cursor.execute('SELECT total_sessions, total_faces_detected, most_common_emotion FROM users WHERE id = %s', (user_id,))
-                user_stats = cursor.fetchone()
-                if user_stats:
-                    stats = {
-                        "total_sessions": user_stats['total_sessions'],
-                        "total_faces_detected": user_stats['total_faces_detected'],
-                        "most_common_emotion": user_stats['most_common_emotion'] or 'N/A'
-                    }
-
-                # Get sessions list
-                cursor.execute('SELECT id, start_time FROM sessions WHERE user_id = %s ORDER BY start_time DESC', (user_id,))
-                sessions = cursor.fetchall()
-
-                # Get emotion counts
-                query = '''
-                    SELECT emotion, COUNT(*) as count 
-                    FROM emotion_logs 
-                    WHERE session_id IN (
-                        SELECT id FROM sessions WHERE user_id = %s
-                    )
-                '''
-                params = [user_id]
-                if selected_session:
-                    query += ' AND session_id = %s'
-                    params.append(selected_session)
-                query += ' GROUP BY emotion'
-                cursor.execute(query, params)
-                emotion_data = cursor.fetchall()
-                
-                for entry in emotion_data:
-                    if entry['emotion'] in emotions:
-                        index = emotions.index(entry['emotion'])
-                        counts[index] = entry['count']
+            data = load_emotion_stats(user_id, selected_session)
+        except pymysql.MySQLError:
+            data = None
+        if data is None:
+            return Response("Database error", status=500)
+        if kind == 'pie' and sum(data['counts']) == 0:
+            return Response("No emotion data", status=404)
+        png = render_chart(kind, data['counts'], selected_session)
+        cache.set(key, png, timeout=app.config['STATS_CACHE_TIMEOUT'])
+    return Response(png, mimetype="image/png", headers={"Cache-Control": "private, max-age=30"})
 
-        except pymysql.MySQLError as e:
-            flash(f"Database error: {e.args[1]}", "error")
-        finally:
-            conn.close()
+def timeline_bucket_seconds(first_ts, last_ts, bucket_seconds, max_points):
+    # Widen the buckets so a session of any length yields at most max_points of them.
+    # Buckets are epoch-aligned, so the count is taken from the aligned span; minute
+    # multiples grow by whole minutes to stay on the per-minute rollup
+    first_ts, last_ts = float(first_ts), float(last_ts)
+    step = 60 if bucket_seconds % 60 == 0 else 1
+    estimate = math.ceil((last_ts - first_ts + 1) / max_points)
+    bucket_seconds = max(bucket_seconds, math.ceil(estimate / step) * step)
+    while math.floor(last_ts / bucket_seconds) - math.floor(first_ts / bucket_seconds) + 1 > max_points:
+        bucket_seconds += step
+    return bucket_seconds
 
-    # Generate charts
-    plt.figure(figsize=(8, 5))
-    plt.bar(emotions, counts, color=['#FF6384', '#FF9F40', '#FFCD56', '#4BC0C0', '#36A2EB', '#9966FF', '#C9CBCF'])
-    plt.title(f'Emotion Distribution {"(Session #" + selected_session + ")" if selected_session else "(All Sessions)"}')
-    plt.xlabel('Emotions')
-    plt.ylabel('Count')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    bar_buffer = io.BytesIO()
-    plt.savefig(bar_buffer, format='png')
-    bar_buffer.seek(0)
-    bar_chart = base64.b64encode(bar_buffer.getvalue()).decode()
-    plt.close()
-
-    pie_chart = None
-    if sum(counts) > 0:
-        plt.figure(figsize=(5, 5))
-        plt.pie(counts, labels=emotions, autopct='%1.1f%%', startangle=90)
-        plt.title('Emotion Proportions')
-        pie_buffer = io.BytesIO()
-        plt.savefig(pie_buffer, format='png')
-        pie_buffer.seek(0)
-        pie_chart = base64.b64encode(pie_buffer.getvalue()).decode()
-        plt.close()
+def load_session_timeline(user_id, session_id, bucket_seconds, max_points):
+    key = f"timeline:{user_id}:{session_id}:{bucket_seconds}:{max_points}:{stats_version(user_id)}"
+    data = cache.get(key)
+    if data is not None:
+        return data
 
-    return render_template("dashboard.html", 
-                         bar_chart_data=bar_chart,
-                         pie_chart_data=pie_chart,
-                         sessions=sessions,
-                         selected_session=selected_session,
-                         stats=stats)
+    conn = get_db_connection()
+    if not conn:
+        raise pymysql.OperationalError(2003, "Database connection failed")
+    try:
+        with conn.cursor(DictCursor) as cursor:
+            cursor.execute('''
+                SELECT MIN(l.captured_at) AS first_at,
+                       UNIX_TIMESTAMP(MIN(l.captured_at)) AS first_ts,
+                       UNIX_TIMESTAMP(MAX(l.captured_at)) AS last_ts
+                FROM sessions s
+                LEFT JOIN emotion_logs l ON l.session_id = s.id
+                WHERE s.id = %s AND s.user_id = %s
+                GROUP BY s.id
+            ''', (session_id, user_id))
+            span = cursor.fetchone()
+            if span is None:
+                return None
+            if span['first_at'] is None:
+                data = {"bucket_seconds": bucket_seconds, "buckets": [], "series": {e: [] for e in EMOTIONS}}
+                cache.set(key, data, timeout=app.config['STATS_CACHE_TIMEOUT'])
+                return data
+
+            bucket_seconds = timeline_bucket_seconds(span['first_ts'], span['last_ts'], bucket_seconds, max_points)
+
+            if bucket_seconds % 60 == 0:
+                # Minute-aligned buckets can be summed from the per-minute rollup
+                cursor.execute('''
+                    SELECT FLOOR(UNIX_TIMESTAMP(bucket) / %s) AS idx,
+                           FROM_UNIXTIME(FLOOR(UNIX_TIMESTAMP(bucket) / %s) * %s) AS bucket_start,
+                           emotion, SUM(count) AS count
+                    FROM emotion_minute_counts
+                    WHERE session_id = %s
+                    GROUP BY idx, bucket_start, emotion
+                    ORDER BY idx
+                ''', (bucket_seconds, bucket_seconds, bucket_seconds, session_id))
+            else:
+                cursor.execute('''
+                    SELECT FLOOR(UNIX_TIMESTAMP(captured_at) / %s) AS idx,
+                           FROM_UNIXTIME(FLOOR(UNIX_TIMESTAMP(captured_at) / %s) * %s) AS bucket_start,
+                           emotion, COUNT(*) AS count
+                    FROM emotion_logs
+                    WHERE session_id = %s AND captured_at IS NOT NULL
+                    GROUP BY idx, bucket_start, emotion
+                    ORDER BY idx
+                ''', (bucket_seconds, bucket_seconds, bucket_seconds, session_id))
+            rows = cursor.fetchall()
+    finally:
+        conn.close()
+
+    series = {e: [] for e in EMOTIONS}
+    buckets = []
+    if rows:
+        first_idx, first_start = int(rows[0]['idx']), rows[0]['bucket_start']
+        size = int(rows[-1]['idx']) - first_idx + 1
+        series = {e: [0] * size for e in EMOTIONS}
+        buckets = [(first_start + timedelta(seconds=i * bucket_seconds)).isoformat() for i in range(size)]
+        for row in rows:
+            if row['emotion'] in series:
+                series[row['emotion']][int(row['idx']) - first_idx] = int(row['count'])
+
+    data = {"bucket_seconds": bucket_seconds, "buckets": buckets, "series": series}
+    cache.set(key, data, timeout=app.config['STATS_CACHE_TIMEOUT'])
+    return data
+
+@app.route("/api/sessions/<int:session_id>/timeline")
+def api_session_timeline(session_id):
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    bucket_seconds = max(request.args.get('resolution', 60, type=int), 1)
+    max_points = min(max(request.args.get('max_points', 500, type=int), 1), app.config['TIMELINE_MAX_POINTS'])
+    try:
+        data = load_session_timeline(session['user_id'], session_id, bucket_seconds, max_points)
+    except pymysql.MySQLError as e:
+        return jsonify({"success": False, "message": f"Database error: {e.args[1]}"}), 500
+    if data is None:
+        return jsonify({"success": False, "message": "Session not found"}), 404
+    return jsonify({"success": True, "session_id": session_id, "emotions": EMOTIONS, **data})
+
+@app.route("/api/analyze_video", methods=["POST"])
+def api_analyze_video():
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    upload = request.files.get('video')
+    if upload is None or not upload.filename:
+        return jsonify({"success": False, "message": "No video file uploaded"}), 400
+    filename = secure_filename(upload.filename) or "upload"
+    fd, path = tempfile.mkstemp(prefix="video_", suffix="_" + filename, dir=app.config['UPLOAD_FOLDER'])
+    with os.fdopen(fd, 'wb') as f:
+        upload.save(f)
+    job_id = video_jobs.submit(path, session['user_id'])
+    return jsonify({"success": True, "job_id": job_id, "status_url": url_for('api_analyze_video_status', job_id=job_id)}), 202
+
+@app.route("/api/analyze_video/<job_id>")
+def api_analyze_video_status(job_id):
+    if 'user_id' not in session:
+        return jsonify({"success": False, "message": "Not logged in"}), 401
+    job = video_jobs.get(job_id, session['user_id'])
+    if job is None:
+        return jsonify({"success": False, "message": "Job not found"}), 404
+    return jsonify({"success": True, **job})
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -269,4 +691,7 @@ def about_us():
     return render_template("about_us.html")
 
 if __name__ == "__main__":
+    # The development server migrates itself unless run_startup() already did
+    if not app.config['AUTO_MIGRATE']:
+        migrate()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import asyncio
+import tempfile
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from flask import session as flask_session
+from app import app, sessions, local_sessions
+
+# Run with a single worker process unless LIVE_STATE_URL points at shared state:
+#   python database_setup.py migrate
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000
+# Stream routes are served natively on the event loop. Everything else runs the
+# Flask app on a bounded thread pool, so blocking pymysql calls never stall it.
+wsgi_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ASGI_WSGI_THREADS", "32")),
+    thread_name_prefix='wsgi'
+)
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin1")
+    return None
+
+def _build_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False
+    }
+    for key, value in scope["headers"]:
+        key = key.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = value
+        else:
+            key = f"HTTP_{key}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *headers]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def run_wsgi(scope, receive, send):
+    length = _header(scope, b"content-length")
+    limit = app.config.get('MAX_CONTENT_LENGTH')
+    if length and limit and int(length) > limit:
+        await _send_json(send, 413, {"success": False, "message": "Request too large"})
+        return
+
+    # Uploads beyond 1 MB spill to disk instead of sitting in memory
+    body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    loop = asyncio.get_running_loop()
+    iterable = None
+    in_flight = None
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = headers
+
+        environ = _build_environ(scope, body)
+        iterable = await loop.run_in_executor(wsgi_executor, app, environ, start_response)
+        chunks = iter(iterable)
+        await send({
+            "type": "http.response.start",
+            "status": response["status"],
+            "headers": [(k.lower().encode("latin1"), v.encode("latin1")) for k, v in response["headers"]]
+        })
+
+        async def pump():
+            nonlocal in_flight
+            while True:
+                in_flight = wsgi_executor.submit(next, chunks, None)
+                chunk = await asyncio.wrap_future(in_flight)
+                in_flight = None
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        # Streaming responses run until the client leaves, not until the generator ends
+        await _until_disconnected(receive, pump())
+    finally:
+        if iterable is not None and hasattr(iterable, "close"):
+            if in_flight is not None:
+                # A generator cannot be closed mid-step; close it once that chunk returns
+                in_flight.add_done_callback(lambda _: iterable.close())
+            else:
+                await loop.run_in_executor(wsgi_executor, iterable.close)
+        body.close()
+
+def _session_user_id(scope):
+    # Reuses Flask's signed cookie session so streams share login state with the app
+    cookie = _header(scope, b"cookie")
+    with app.test_request_context(scope["path"], headers={"Cookie": cookie} if cookie else None):
+        return flask_session.get('user_id')
+
+async def _until_disconnected(receive, response):
+    async def disconnected():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    # Whichever finishes first ends the response; cancelling it closes the generator
+    tasks = [asyncio.ensure_future(response), asyncio.ensure_future(disconnected())]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        task.result()
+
+async def _stream(receive, send, content_type, chunks):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", content_type.encode()),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no")
+        ]
+    })
+
+    async def pump():
+        async for chunk in chunks:
+            await send({
+                "type": "http.response.body",
+                "body": chunk if isinstance(chunk, bytes) else chunk.encode(),
+                "more_body": True
+            })
+        await send({"type": "http.response.body", "body": b""})
+
+    await _until_disconnected(receive, pump())
+
+def _find_detector(user_id):
+    # A session this process owns streams from its broadcasters, even when shared
+    # state would otherwise hand back a RemoteView of it
+    if local_sessions is not None and local_sessions is not sessions:
+        detector = local_sessions.get(user_id)
+        if detector is not None:
+            return detector
+    return sessions.get(user_id)
+
+async def video_feed(scope, receive, send):
+    user_id = _session_user_id(scope)
+    if user_id is None:
+        await send({"type": "http.response.start", "status": 302, "headers": [(b"location", b"/login")]})
+        await send({"type": "http.response.body", "body": b""})
+        return
+    detector = _find_detector(user_id)
+    if detector is None:
+        await _send_json(send, 404, {"success": False, "message": "No active session"})
+        return
+    if hasattr(detector, "broadcaster"):
+        chunks = detector.broadcaster.astream()
+    else:
+        # Sessions owned by another process stream from the live state
+        chunks = detector.astream_frames()
+    await _stream(receive, send, "multipart/x-mixed-replace; boundary=frame", chunks)
+
+async def emotion_summary_stream(scope, receive, send):
+    user_id = _session_user_id(scope)
+    if user_id is None:
+        await _send_json(send, 401, {"success": False, "message": "Not logged in"})
+        return
+    detector = _find_detector(user_id)
+    if detector is None:
+        await _send_json(send, 404, {"success": False, "message": "No active session"})
+        return
+    interval = None
+    values = parse_qs(scope["query_string"].decode("latin1")).get("interval")
+    if values:
+        try:
+            interval = max(float(values[0]), 0.05)
+        except ValueError:
+            pass
+    if hasattr(detector, "summary_broadcaster"):
+        events = detector.summary_broadcaster.astream(interval)
+    else:
+        events = detector.astream_summary(interval)
+    await _stream(receive, send, "text/event-stream", events)
+
+STREAM_ROUTES = {
+    "/video_feed": video_feed,
+    "/emotion_summary_stream": emotion_summary_stream
+}
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if local_sessions is not None:
+                await asyncio.get_running_loop().run_in_executor(None, local_sessions.shutdown)
+            wsgi_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    handler = STREAM_ROUTES.get(scope["path"])
+    if handler is not None and scope["method"] == "GET":
+        await handler(scope, receive, send)
+    else:
+        await run_wsgi(scope, receive, send)
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+import argparse
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from emotion_classifier import EMOTION_LABELS, create_classifier
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def load_faces(root, max_per_label):
+    # FER-style layout: one sub-directory of face crops per emotion label
+    faces, labels = [], []
+    for index, label in enumerate(EMOTION_LABELS):
+        directory = os.path.join(root, label)
+        if not os.path.isdir(directory):
+            continue
+        names = [name for name in sorted(os.listdir(directory)) if name.lower().endswith(IMAGE_EXTENSIONS)]
+        for name in names[:max_per_label]:
+            face = cv2.imread(os.path.join(directory, name), cv2.IMREAD_GRAYSCALE)
+            if face is not None:
+                faces.append(face)
+                labels.append(index)
+    return faces, np.array(labels, dtype=np.int32)
+
+def parse_engine(spec):
+    name, _, precision = spec.partition(':')
+    return name, ({"precision": precision} if precision else {})
+
+def bench_engine(spec, root, max_per_label, batch_sizes, warmup):
+    # Runs in its own process so load time and peak RSS belong to this engine alone
+    faces, _ = load_faces(root, max_per_label)
+    name, options = parse_engine(spec)
+    classifier = create_classifier(name, **options)
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    started = time.perf_counter()
+    classifier.load()
+    load_s = time.perf_counter() - started
+    for _ in range(warmup):
+        classifier.predict_proba(faces[:max(batch_sizes)])
+
+    predictions = classifier.predict_proba(faces).argmax(axis=1)
+
+    latencies = []
+    for face in faces:
+        started = time.perf_counter()
+        classifier.predict_proba([face])
+        latencies.append(time.perf_counter() - started)
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        classifier.max_batch_size = batch_size
+        started = time.perf_counter()
+        for i in range(0, len(faces), batch_size):
+            classifier.predict_proba(faces[i:i + batch_size])
+        throughput[batch_size] = len(faces) / (time.perf_counter() - started)
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "engine": spec,
+        "load_s": load_s,
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "throughput": throughput,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "model_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - baseline_rss,
+        "predictions": predictions
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare emotion classifier engines for speed and agreement")
+    parser.add_argument("faces", help="Directory with one sub-directory of face crops per emotion label")
+    parser.add_argument("--engines", nargs="+", default=["deepface", "onnx:fp32", "onnx:fp16", "onnx:int8", "tflite:int8"],
+                        help="engine or engine:precision; the first one is the agreement reference")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--max-per-label", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=3)
+    args = parser.parse_args()
+
+    faces, labels = load_faces(args.faces, args.max_per_label)
+    if not faces:
+        sys.exit(f"No labelled faces found under {args.faces}")
+    print(f"{len(faces)} faces across {len(set(labels.tolist()))} labels")
+
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for spec in args.engines:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            try:
+                results.append(executor.submit(
+                    bench_engine, spec, args.faces, args.max_per_label, args.batch_sizes, args.warmup
+                ).result())
+            except (ImportError, FileNotFoundError, ValueError) as e:
+                print(f"{spec:<12} skipped: {e}")
+
+    if not results:
+        return
+    reference = results[0]["predictions"]
+    if results[0]["engine"] != args.engines[0]:
+        print(f"{args.engines[0]} was skipped; agreement is measured against {results[0]['engine']}")
+    batch_columns = "".join(f"{f'b{size}/s':>9}" for size in args.batch_sizes)
+    print(f"{'engine':<12} {'load s':>7} {'p50 ms':>7} {'p95 ms':>7}{batch_columns} {'RSS MB':>7} "
+          f"{'model MB':>8} {'accuracy':>8} {'agree':>6}")
+    for r in results:
+        throughput = "".join(f"{r['throughput'][size]:>9.0f}" for size in args.batch_sizes)
+        accuracy = float((r["predictions"] == labels).mean())
+        agreement = float((r["predictions"] == reference).mean())
+        print(f"{r['engine']:<12} {r['load_s']:>7.2f} {r['latency_ms_p50']:>7.2f} {r['latency_ms_p95']:>7.2f}"
+              f"{throughput} {r['rss_mb']:>7.0f} {r['model_rss_mb']:>8.0f} {accuracy:>8.1%} {agreement:>6.1%}")
+
+if __name__ == "__main__":
+    main()
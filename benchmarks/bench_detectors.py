@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import argparse
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_detectors import DETECTOR_ENGINES, create_detector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def load_frames(source, max_frames, size):
+    frames = []
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    frames.append(frame)
+            if len(frames) >= max_frames:
+                break
+    else:
+        cap = cv2.VideoCapture(source)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    if size:
+        frames = [cv2.resize(frame, size) for frame in frames]
+    return frames
+
+def bench_engine(detector, frames, warmup):
+    for frame in frames[:warmup]:
+        detector.detect(frame)
+
+    total_faces = 0
+    start = time.perf_counter()
+    for frame in frames:
+        total_faces += len(detector.detect(frame))
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": len(frames),
+        "faces": total_faces,
+        "ms_per_frame": elapsed * 1000 / len(frames),
+        "faces_per_s": total_faces / elapsed if elapsed else 0.0,
+        "fps": len(frames) / elapsed if elapsed else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face detector engines on recorded frames")
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--engines", nargs="+", default=sorted(DETECTOR_ENGINES))
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--threads", type=int, default=None, help="cv2.setNumThreads value")
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+
+    frames = load_frames(args.source, args.max_frames, (args.width, args.height))
+    if not frames:
+        sys.exit(f"No frames could be read from {args.source}")
+
+    print(f"{len(frames)} frames at {args.width}x{args.height}")
+    print(f"{'engine':<8} {'input':>9} {'ms/frame':>9} {'fps':>8} {'faces':>7} {'faces/s':>9}")
+    for name in args.engines:
+        try:
+            detector = create_detector(name)
+        except (ImportError, FileNotFoundError, ValueError, cv2.error) as e:
+            print(f"{name:<8} skipped: {e}")
+            continue
+        result = bench_engine(detector, frames, args.warmup)
+        input_size = "x".join(str(v) for v in detector.input_size)
+        print(f"{name:<8} {input_size:>9} {result['ms_per_frame']:>9.2f} {result['fps']:>8.1f} "
+              f"{result['faces']:>7} {result['faces_per_s']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import itertools
+import threading
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Metrics compared by --compare, and whether a higher value is better
+TRACKED = {
+    ("pipeline", "fps"): True,
+    ("pipeline", "latency_ms", "p95"): False,
+    ("pipeline", "cpu_percent"): False,
+    ("peak_rss_mb",): False
+}
+
+class NullLogWriter:
+    # --persist none: emotion logs are counted and discarded
+    def __init__(self):
+        self.written = 0
+
+    def write(self, *record):
+        self.written += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        return True
+
+    def stop(self, timeout=5.0):
+        pass
+
+    def stats(self):
+        return {"queued": 0, "written": self.written, "dropped": 0, "failed": 0, "batches": 0}
+
+def disable_persistence(app_module):
+    import face_emotion
+
+    session_ids = itertools.count(1)
+    face_emotion.create_session_record = lambda user_id: next(session_ids)
+    face_emotion.finish_session_record = lambda session_id, user_id, total_faces: True
+    app_module.local_sessions.log_writer = NullLogWriter()
+
+def ensure_users(count):
+    # Sessions reference users, so MySQL runs need real rows to attach them to
+    from database_setup import get_db_connection, migrate
+
+    migrate()
+    conn = get_db_connection()
+    if not conn:
+        sys.exit("MySQL is not reachable; use --persist none")
+    try:
+        with conn.cursor() as cursor:
+            names = [f"bench_user_{i}" for i in range(count)]
+            cursor.executemany("INSERT IGNORE INTO users (username, password) VALUES (%s, '')",
+                               [(name,) for name in names])
+            cursor.execute("SELECT id FROM users WHERE username IN %s ORDER BY username", (names,))
+            return [row['id'] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    values = np.asarray(values)
+    return {f"p{p}": round(float(np.percentile(values, p)), 2) for p in (50, 95, 99)}
+
+def run_route_user(app, user_id, routes, deadline, latencies):
+    client = app.test_client()
+    with client.session_transaction() as flask_session:
+        flask_session['user_id'] = user_id
+    for path in itertools.cycle(routes):
+        if time.monotonic() >= deadline:
+            break
+        started = time.perf_counter()
+        if path == "/video_feed":
+            # Timed to the first multipart frame; the stream is then dropped
+            response = client.get(path, buffered=False)
+            next(iter(response.response), None)
+            response.close()
+        else:
+            response = client.get(path)
+        if response.status_code < 400:
+            latencies[path].append((time.perf_counter() - started) * 1000)
+        else:
+            latencies[path + ":errors"].append(response.status_code)
+
+def run(args):
+    os.environ["MODEL_WARMUP"] = "lazy"
+    os.environ["PROCESS_ROLE"] = "all"
+    os.environ["INFERENCE_BACKEND"] = args.inference_backend
+    if args.classifier:
+        os.environ["CLASSIFIER_ENGINE"] = args.classifier
+    import app as app_module
+
+    sessions, local = app_module.sessions, app_module.local_sessions
+    if args.persist == "none":
+        disable_persistence(app_module)
+        user_ids = list(range(1, args.users + 1))
+    else:
+        user_ids = ensure_users(args.users)
+    local.warmup(background=False)
+
+    source = f"replay:{args.source}?fps={args.fps}&loop=1&preload={int(args.preload)}"
+    for user_id in user_ids:
+        if not sessions.start(user_id, user_id, source):
+            sys.exit(f"Failed to start a replay session on {args.source}")
+    time.sleep(args.warmup)
+    for _, detector in local.items():
+        detector.scheduler.reset()
+
+    cpu_started = resource.getrusage(resource.RUSAGE_SELF)
+    started = time.perf_counter()
+    latencies = {}
+    for path in args.routes:
+        latencies[path], latencies[path + ":errors"] = [], []
+    deadline = time.monotonic() + args.duration
+    users = [
+        threading.Thread(target=run_route_user, args=(app_module.app, user_id, args.routes, deadline, latencies))
+        for user_id in user_ids
+    ]
+    for thread in users:
+        thread.start()
+    for thread in users:
+        thread.join()
+    remaining = deadline - time.monotonic()
+    if remaining > 0:
+        time.sleep(remaining)
+    elapsed = time.perf_counter() - started
+    cpu_ended = resource.getrusage(resource.RUSAGE_SELF)
+
+    stats = [detector.scheduler.stats() for _, detector in local.items()]
+    # Snapshots, because the sessions are still appending to the deques
+    lags = [lag for _, detector in local.items() for lag in list(detector.scheduler.lag_samples)]
+    processed = sum(s["processed"] for s in stats)
+    stages = {}
+    for s in stats:
+        for stage, ms in s["stage_ms"].items():
+            stages.setdefault(stage, []).append(ms)
+    cpu_seconds = (cpu_ended.ru_utime - cpu_started.ru_utime) + (cpu_ended.ru_stime - cpu_started.ru_stime)
+
+    for user_id in user_ids:
+        sessions.stop(user_id)
+    local.shutdown()
+
+    return {
+        "pipeline": {
+            "sessions": len(stats),
+            "frames": processed,
+            "fps": round(processed / elapsed, 2),
+            "fps_per_session": round(processed / elapsed / max(len(stats), 1), 2),
+            "captured": sum(s["captured"] for s in stats),
+            "dropped": sum(s["dropped"] for s in stats),
+            "detected": sum(s["detected"] for s in stats),
+            "region_detected": sum(s["region_detected"] for s in stats),
+            "regions": sum(s["regions"] for s in stats),
+            "motion_skipped": sum(s["motion_skipped"] for s in stats),
+            "classified": sum(s["classified"] for s in stats),
+            "latency_ms": percentiles(lags),
+            "stage_ms": {stage: round(sum(v) / len(v), 2) for stage, v in stages.items()},
+            "cpu_percent": round(cpu_seconds / elapsed * 100, 1),
+            "cpu_ms_per_frame": round(cpu_seconds * 1000 / processed, 2) if processed else None
+        },
+        "routes": {
+            path: {
+                "requests": len(latencies[path]),
+                "rps": round(len(latencies[path]) / elapsed, 2),
+                "errors": len(latencies[path + ":errors"]),
+                "latency_ms": percentiles(latencies[path])
+            }
+            for path in args.routes
+        },
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def lookup(result, keys):
+    for part in keys:
+        if not isinstance(result, dict) or result.get(part) is None:
+            return None
+        result = result[part]
+    return result
+
+def compare(baseline, current, tolerance):
+    tracked = dict(TRACKED)
+    for path in current["routes"]:
+        tracked[("routes", path, "latency_ms", "p95")] = False
+    regressions = []
+    print(f"{'metric':<40} {'baseline':>10} {'current':>10} {'change':>8}")
+    for metric, higher_is_better in tracked.items():
+        old, new = lookup(baseline, metric), lookup(current, metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        print(f"{'.'.join(metric):<40} {old:>10.2f} {new:>10.2f} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+        if regressed:
+            regressions.append('.'.join(metric))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay a recording through N live sessions and the Flask routes, and write a JSON baseline"
+    )
+    parser.add_argument("source", help="Video file or directory of images to replay")
+    parser.add_argument("--users", type=int, default=4, help="Simulated users, each with its own session")
+    parser.add_argument("--fps", type=float, default=15, help="Replay rate per session; 0 replays unthrottled")
+    parser.add_argument("--preload", action="store_true", help="Decode an image directory before replaying")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--routes", nargs="*", default=["/get_emotion_summary", "/dashboard", "/video_feed"])
+    parser.add_argument("--persist", choices=["mysql", "none"], default="mysql",
+                        help="Write sessions and emotion logs to the configured MySQL, or discard them")
+    parser.add_argument("--inference-backend", choices=["thread", "process"], default="thread")
+    parser.add_argument("--classifier", default=None, help="CLASSIFIER_ENGINE override")
+    parser.add_argument("--output", default=None, help="Write the JSON result here")
+    parser.add_argument("--compare", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative change before failing")
+    args = parser.parse_args()
+
+    result = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "tolerance")},
+        **run(args)
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
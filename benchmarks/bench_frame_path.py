@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_detectors import load_frames
+from face_detectors import DETECTOR_ENGINES, create_detector
+from frame_broadcaster import FrameBroadcaster
+from frame_buffers import FrameBufferPool, ScratchBuffer
+
+# Classifier input size, so both paths do the same work per face
+FACE_SIZE = (48, 48)
+
+def run_pooled(detector, broadcaster, frames):
+    # Mirrors EmotionDetector: capture into a pooled buffer, gray once into scratch, recycle
+    pool = FrameBufferPool(size=4)
+    gray_buffer = ScratchBuffer()
+    face_buffer = ScratchBuffer()
+    previous = None
+    for source in frames:
+        frame = pool.acquire(source.shape)
+        np.copyto(frame, source)
+        faces = detector.detect(frame)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray_buffer.get(frame.shape[:2]))
+        for x, y, w, h in faces:
+            # The crop is a view; the classifier resizes it into its own buffer
+            cv2.resize(gray[y:y+h, x:x+w], FACE_SIZE, dst=face_buffer.get(FACE_SIZE), interpolation=cv2.INTER_AREA)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+        broadcaster.publish(frame)
+        pool.release(previous)
+        previous = frame
+        yield
+
+def run_copying(detector, broadcaster, frames):
+    # The pre-pool path: a fresh capture array and a fresh gray crop per face
+    for source in frames:
+        frame = source.copy()
+        faces = detector.detect(frame)
+        for x, y, w, h in faces:
+            roi = cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
+            cv2.resize(roi, FACE_SIZE, interpolation=cv2.INTER_AREA)
+            cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
+        broadcaster.publish(frame)
+        yield
+
+def measure(path, detector, frames, jpeg_quality):
+    # numpy reports its buffers to tracemalloc, so the per-frame peak above the
+    # starting footprint is the transient memory that frame needed
+    broadcaster = FrameBroadcaster(jpeg_quality=jpeg_quality, max_fps=0)
+    peaks = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    steps = path(detector, broadcaster, frames)
+    while True:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        if next(steps, StopIteration) is StopIteration:
+            break
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    peaks = np.array(peaks[1:] or peaks, dtype=np.float64)
+    return {
+        "ms_per_frame": elapsed * 1000 / len(frames),
+        "kb_mean": peaks.mean() / 1024,
+        "kb_p95": np.percentile(peaks, 95) / 1024,
+        "kb_max": peaks.max() / 1024,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-frame memory churn from capture to JPEG encode")
+    parser.add_argument("source", help="Video file or directory of images")
+    parser.add_argument("--engine", default="haar", choices=sorted(DETECTOR_ENGINES))
+    parser.add_argument("--max-frames", type=int, default=200)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--jpeg-quality", type=int, default=80)
+    args = parser.parse_args()
+
+    frames = load_frames(args.source, args.max_frames, (args.width, args.height))
+    if not frames:
+        sys.exit(f"No frames could be read from {args.source}")
+
+    detector = create_detector(args.engine)
+    print(f"{len(frames)} frames at {args.width}x{args.height}, engine {args.engine}")
+    print(f"{'path':<8} {'ms/frame':>9} {'KB mean':>9} {'KB p95':>9} {'KB max':>9}")
+    for name, path in (("copying", run_copying), ("pooled", run_pooled)):
+        result = measure(path, detector, frames, args.jpeg_quality)
+        print(f"{name:<8} {result['ms_per_frame']:>9.2f} {result['kb_mean']:>9.1f} "
+              f"{result['kb_p95']:>9.1f} {result['kb_max']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so every measurement is a true cold start
+CHILD = """
+import json, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import app
+imported = time.perf_counter() - started
+if {warm!r}:
+    app.sessions.warmup(background=False)
+print(json.dumps({{
+    "import_s": imported,
+    "ready_s": time.perf_counter() - started,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": len(sys.modules),
+    "cv2": "cv2" in sys.modules,
+    "tensorflow": "tensorflow" in sys.modules
+}}))
+"""
+
+TIERS = {
+    # Serves login, dashboard and stats only; models stay unloaded
+    "web": False,
+    # Loads OpenCV and the emotion model before reporting ready
+    "inference": True
+}
+
+def run_tier(warm):
+    # Otherwise the default configuration; export AUTO_MIGRATE=1 to include migrate()
+    env = {**os.environ, "MODEL_WARMUP": "lazy"}
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=ROOT, warm=warm)],
+        env=env, cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_s"] = time.perf_counter() - started
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time and resident memory per tier")
+    parser.add_argument("--tiers", nargs="+", default=list(TIERS), choices=list(TIERS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = {}
+    for tier in args.tiers:
+        runs = [run_tier(TIERS[tier]) for _ in range(args.runs)]
+        results[tier] = {
+            "import_s": statistics.median(r["import_s"] for r in runs),
+            "ready_s": statistics.median(r["ready_s"] for r in runs),
+            "process_s": statistics.median(r["process_s"] for r in runs),
+            "max_rss_mb": max(r["max_rss_mb"] for r in runs),
+            "modules": runs[-1]["modules"],
+            "cv2": runs[-1]["cv2"],
+            "tensorflow": runs[-1]["tensorflow"]
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"median of {args.runs} runs")
+    print(f"{'tier':<10} {'import s':>9} {'ready s':>8} {'process s':>10} {'RSS MB':>8} {'modules':>8} {'cv2':>5} {'tf':>5}")
+    for tier, r in results.items():
+        print(f"{tier:<10} {r['import_s']:>9.2f} {r['ready_s']:>8.2f} {r['process_s']:>10.2f} "
+              f"{r['max_rss_mb']:>8.1f} {r['modules']:>8} {str(r['cv2']):>5} {str(r['tensorflow']):>5}")
+
+if __name__ == "__main__":
+    main()
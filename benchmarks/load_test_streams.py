@@ -0,0 +1,146 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from urllib.parse import urlencode
+import numpy as np
+
+# Raw asyncio HTTP/1.1 so a single process can hold hundreds of stream connections
+async def request(host, port, method, path, headers=None, body=b""):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close",
+                 f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            response_headers.setdefault(name.lower(), []).append(value.strip())
+        return status, response_headers, await reader.read()
+    finally:
+        writer.close()
+
+async def login(host, port, username, password):
+    body = urlencode({"username": username, "password": password}).encode()
+    status, headers, _ = await request(host, port, "POST", "/login",
+                                       {"Content-Type": "application/x-www-form-urlencoded"}, body)
+    cookies = [value.split(";", 1)[0] for value in headers.get("set-cookie", [])]
+    # A failed login also redirects, but back to /login
+    location = headers.get("location", [""])[0]
+    if status != 302 or location.endswith("/login") or not cookies:
+        sys.exit(f"Login failed with status {status}")
+    return "; ".join(cookies)
+
+async def viewer(host, port, path, cookie, stop, counters):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        counters["failed"] += 1
+        return
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nCookie: {cookie}\r\n\r\n".encode())
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        if status != 200:
+            counters["failed"] += 1
+            return
+        counters["connected"] += 1
+        while not stop.is_set():
+            try:
+                chunk = await asyncio.wait_for(reader.read(65536), 1.0)
+            except asyncio.TimeoutError:
+                continue
+            if not chunk:
+                break
+            counters["bytes"] += len(chunk)
+    except (OSError, ValueError, IndexError):
+        counters["failed"] += 1
+    finally:
+        writer.close()
+
+async def probe(host, port, paths, cookie, duration, interval):
+    # Normal page requests issued while the streams are open
+    latencies = {path: [] for path in paths}
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for path in paths:
+            started = time.perf_counter()
+            try:
+                status, _, _ = await asyncio.wait_for(
+                    request(host, port, "GET", path, {"Cookie": cookie} if cookie else None), 30
+                )
+                if status >= 500:
+                    errors += 1
+            except (OSError, asyncio.TimeoutError):
+                errors += 1
+                continue
+            latencies[path].append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval)
+    return latencies, errors
+
+async def run_level(args, cookie, viewers):
+    stop = asyncio.Event()
+    counters = {"connected": 0, "failed": 0, "bytes": 0}
+    paths = [args.stream_path] if args.stream_path else ["/video_feed", "/emotion_summary_stream"]
+    tasks = [
+        asyncio.ensure_future(viewer(args.host, args.port, paths[i % len(paths)], cookie, stop, counters))
+        for i in range(viewers)
+    ]
+    await asyncio.sleep(args.settle)
+    started = time.perf_counter()
+    latencies, errors = await probe(args.host, args.port, args.pages, cookie, args.duration, args.interval)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return counters, latencies, errors, elapsed
+
+async def main_async(args):
+    cookie = args.cookie or await login(args.host, args.port, args.username, args.password)
+    if args.source is not None:
+        status, _, body = await request(args.host, args.port, "POST", "/start_session",
+                                        {"Cookie": cookie, "Content-Type": "application/json"},
+                                        json.dumps({"source": args.source}).encode())
+        print(f"start_session: {status} {body.decode(errors='replace')}")
+
+    print(f"{'viewers':>8} {'open':>6} {'failed':>7} {'MB/s':>7} {'page':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for viewers in args.viewers:
+        counters, latencies, errors, elapsed = await run_level(args, cookie, viewers)
+        for path, values in latencies.items():
+            values = np.array(values) if values else np.array([np.nan])
+            print(f"{viewers:>8} {counters['connected']:>6} {counters['failed']:>7} "
+                  f"{counters['bytes'] / elapsed / 1e6:>7.2f} {path:<12} {np.percentile(values, 50):>8.1f} "
+                  f"{np.percentile(values, 95):>8.1f} {np.percentile(values, 99):>8.1f} {errors:>7}")
+
+    if args.source is not None:
+        await request(args.host, args.port, "POST", "/stop_session", {"Cookie": cookie})
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hold many /video_feed and summary streams open while timing normal page requests"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--username", default="loadtest")
+    parser.add_argument("--password", default="loadtest")
+    parser.add_argument("--cookie", default=None, help="Reuse an existing session cookie instead of logging in")
+    parser.add_argument("--source", default=None,
+                        help="Start a server-side session on this source first (needs ALLOW_CUSTOM_CAPTURE_SOURCE=1)")
+    parser.add_argument("--viewers", nargs="+", type=int, default=[0, 100, 250, 500])
+    parser.add_argument("--stream-path", default=None, help="Only open this stream route")
+    parser.add_argument("--pages", nargs="+", default=["/login", "/dashboard", "/api/stats"])
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--settle", type=float, default=3)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import math
+import time
+import cv2
+import numpy as np
+from urllib.parse import parse_qs
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Capture sources of the form replay:<video or image dir>?fps=15&loop=1
+REPLAY_PREFIX = 'replay:'
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class ReplaySource:
+    # Plays a recorded video or a directory of images through the cv2.VideoCapture
+    # interface, so a session can be driven without a camera. fps=0 hands frames out as
+    # fast as they are read; otherwise they are paced against a fixed clock, so a slow
+    # consumer sees dropped frames rather than a slowed-down recording
+    def __init__(self, path, fps=0, loop=False, preload=False):
+        self.path = path
+        self.fps = fps
+        self.loop = loop
+        self.index = 0
+        # Set once a non-looping replay has run out, so the reader can stop polling
+        self.ended = False
+        self.started = None
+        self.cap = None
+        self.files = None
+        self.frames = None
+        if os.path.isdir(path):
+            self.files = [
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            ]
+            if preload:
+                # Decoded once up front, so replay costs a copy instead of an imread
+                self.frames = [frame for frame in map(cv2.imread, self.files) if frame is not None]
+        elif os.path.exists(path):
+            self.cap = cv2.VideoCapture(path)
+
+    def isOpened(self):
+        if self.cap is not None:
+            return self.cap.isOpened()
+        return bool(self.frames if self.frames is not None else self.files)
+
+    def set(self, prop, value):
+        return False
+
+    def _next_image(self, position, image):
+        if self.frames is not None:
+            frame = self.frames[position % len(self.frames)]
+        else:
+            frame = cv2.imread(self.files[position % len(self.files)])
+            if frame is None:
+                return None
+        if image is not None and image.shape == frame.shape:
+            np.copyto(image, frame)
+            return image
+        return frame.copy() if self.frames is not None else frame
+
+    def _skip(self, count):
+        if count <= 0:
+            return
+        if self.cap is not None:
+            # grab() demuxes without decoding, so falling behind stays cheap
+            for _ in range(count):
+                if not self.cap.grab():
+                    if not self.loop:
+                        break
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    self.cap.grab()
+        self.index += count
+
+    def read(self, image=None):
+        if self.fps:
+            now = time.monotonic()
+            if self.started is None:
+                self.started = now
+            due = self.started + self.index / self.fps
+            if due > now:
+                time.sleep(due - now)
+            else:
+                # Frames whose time has already passed are skipped, as a camera would drop them
+                self._skip(int((now - self.started) * self.fps) - self.index)
+
+        if self.cap is not None:
+            ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+            if not ret and self.loop and self.index:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+        else:
+            count = len(self.frames if self.frames is not None else self.files)
+            if self.index >= count and not self.loop:
+                self.ended = True
+                return False, None
+            frame = self._next_image(self.index, image)
+            ret = frame is not None
+        if ret:
+            self.index += 1
+        elif self.cap is not None and not self.loop:
+            self.ended = True
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+        self.frames = None
+
+def parse_replay_source(source):
+    path, _, query = source[len(REPLAY_PREFIX):].partition('?')
+    options = {key: values[-1] for key, values in parse_qs(query).items()}
+    try:
+        fps = float(options.get('fps', 0))
+    except ValueError:
+        fps = -1
+    if not math.isfinite(fps) or fps < 0:
+        logger.error(f"Invalid replay fps {options.get('fps')!r} in {source!r}")
+        return None
+    return {
+        "path": path,
+        "fps": fps,
+        "loop": options.get('loop', '0') == '1',
+        "preload": options.get('preload', '0') == '1'
+    }
+
+def open_capture(source):
+    # None when a replay source is malformed
+    if isinstance(source, str) and source.startswith(REPLAY_PREFIX):
+        options = parse_replay_source(source)
+        return ReplaySource(**options) if options is not None else None
+    return cv2.VideoCapture(source)
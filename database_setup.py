@@ -1,5 +1,9 @@
 import pymysql
 from pymysql.cursors import DictCursor
+import collections
+import os
+import threading
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -15,80 +19,482 @@ db_config = {
     "charset": "utf8mb4"
 }
 
-def get_db_connection():
+pool_config = {
+    "max_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+    "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+    "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+}
+
+class PoolTimeoutError(Exception):
+    pass
+
+def _ping(conn):
+    if hasattr(conn, 'ping'):
+        conn.ping(reconnect=False)
+    else:
+        conn.execute('SELECT 1')
+
+class PooledConnection:
+    # Proxies the DB-API connection; close() hands it back to the pool instead of disconnecting
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise AttributeError(f"Connection already returned to pool: {name}")
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._conn is not None:
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+class ConnectionPool:
+    def __init__(self, connect, max_size=10, max_idle=300.0, timeout=10.0, ping=_ping):
+        self._connect = connect
+        self._ping = ping
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.created = 0
+        self.discarded = 0
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, timeout=None):
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout if timeout is None else timeout):
+            raise PoolTimeoutError(f"No database connection available after {time.monotonic() - start:.1f}s")
+        waited = time.monotonic() - start
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.max_wait = max(self.max_wait, waited)
+        return PooledConnection(self, conn)
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                # Oldest connections sit on the left; drop any that idled too long
+                now = time.monotonic()
+                stale = []
+                while self._idle and now - self._idle[0][1] > self.max_idle:
+                    stale.append(self._idle.popleft()[0])
+                conn = self._idle.pop()[0] if self._idle else None
+            for old in stale:
+                self._discard(old)
+            if conn is None:
+                break
+            try:
+                self._ping(conn)
+                return conn
+            except Exception:
+                self._discard(conn)
+
+        conn = self._connect()
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def release(self, conn):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            self.in_use -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "created": self.created,
+                "discarded": self.discarded,
+                "checkouts": self.checkouts,
+                "wait_time_total_ms": self.wait_time_total * 1000,
+                "max_wait_ms": self.max_wait * 1000
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def ensure_database():
+    temp_conn = pymysql.connect(
+        host=db_config["host"],
+        user=db_config["user"],
+        password=db_config["password"],
+        autocommit=True
+    )
     try:
-        # Verify/Create database
-        temp_conn = pymysql.connect(
-            host="localhost",
-            user="root",
-            password="admin@123",
-            autocommit=True
-        )
         with temp_conn.cursor() as cursor:
-            cursor.execute("CREATE DATABASE IF NOT EXISTS face_emotion_detection")
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_config['database']}")
+    finally:
         temp_conn.close()
-        
-        # Connect to the database
-        conn = pymysql.connect(**db_config)
-        logger.info("Database connection successful")
-        return conn
-    except pymysql.MySQLError as e:
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The database is bootstrapped once, when the pool is first created
+            ensure_database()
+            _pool = ConnectionPool(lambda: pymysql.connect(**db_config), **pool_config)
+            logger.info(f"Database connection pool created (max {_pool.max_size})")
+    return _pool
+
+def pool_stats():
+    # Read without creating the pool, so a metrics scrape never opens connections
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+def get_db_connection():
+    try:
+        return get_pool().acquire()
+    except (pymysql.MySQLError, PoolTimeoutError) as e:
         logger.error(f"Database connection failed: {e}")
         return None
 
-def init_db():
+SCHEMA = [
+    '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            password VARCHAR(128) NOT NULL,
+            total_sessions INT DEFAULT 0,
+            total_faces_detected INT DEFAULT 0,
+            most_common_emotion VARCHAR(50)
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            end_time DATETIME,
+            total_faces INT DEFAULT 0,
+            most_common_emotion VARCHAR(50),
+            INDEX idx_sessions_user_start (user_id, start_time),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS emotion_logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            session_id INT,
+            track_id INT,
+            emotion VARCHAR(50),
+            confidence FLOAT,
+            captured_at DATETIME(3),
+            INDEX idx_logs_session_emotion (session_id, emotion),
+            INDEX idx_logs_session_time (session_id, captured_at),
+            FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+        )
+    ''',
+    # Rollups maintained by the emotion log writer alongside emotion_logs
+    '''
+        CREATE TABLE IF NOT EXISTS session_emotion_counts (
+            session_id INT NOT NULL,
+            emotion VARCHAR(50) NOT NULL,
+            count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, emotion),
+            FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS user_emotion_counts (
+            user_id INT NOT NULL,
+            emotion VARCHAR(50) NOT NULL,
+            count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, emotion),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    ''',
+    '''
+        CREATE TABLE IF NOT EXISTS emotion_minute_counts (
+            session_id INT NOT NULL,
+            bucket DATETIME NOT NULL,
+            emotion VARCHAR(50) NOT NULL,
+            count INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (session_id, bucket, emotion),
+            FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+        )
+    '''
+]
+
+# What tables created by the old import-time init_db lack. Step 1 leaves existing
+# tables alone, so on those databases these are added by step 2
+BASELINE_UPGRADES = {
+    "sessions": {
+        "columns": [],
+        "indexes": [("idx_sessions_user_start", "(user_id, start_time)")]
+    },
+    "emotion_logs": {
+        "columns": [
+            ("track_id", "INT AFTER session_id"),
+            ("confidence", "FLOAT AFTER emotion"),
+            ("captured_at", "DATETIME(3) AFTER confidence")
+        ],
+        "indexes": [
+            ("idx_logs_session_emotion", "(session_id, emotion)"),
+            ("idx_logs_session_time", "(session_id, captured_at)")
+        ]
+    }
+}
+
+def upgrade_baseline(cursor):
+    # MySQL has no ADD COLUMN IF NOT EXISTS, so the catalog is checked first and
+    # databases created from SCHEMA pass through unchanged
+    for table, upgrade in BASELINE_UPGRADES.items():
+        cursor.execute(
+            "SELECT COLUMN_NAME AS name FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,)
+        )
+        columns = {row['name'] for row in cursor.fetchall()}
+        cursor.execute(
+            "SELECT DISTINCT INDEX_NAME AS name FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table,)
+        )
+        indexes = {row['name'] for row in cursor.fetchall()}
+        for name, definition in upgrade["columns"]:
+            if name not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        for name, key in upgrade["indexes"]:
+            if name not in indexes:
+                cursor.execute(f"CREATE INDEX {name} ON {table} {key}")
+
+# Applied in order and recorded in schema_migrations; append new steps, never edit old ones.
+# A step is a list of statements or a function taking the cursor
+MIGRATIONS = [
+    (1, SCHEMA),
+    (2, upgrade_baseline)
+]
+
+DEV_TABLES = [
+    "emotion_minute_counts", "session_emotion_counts", "user_emotion_counts",
+    "emotion_logs", "sessions", "users", "schema_migrations"
+]
+
+def migrate():
     conn = get_db_connection()
     if not conn:
-        logger.error("Failed to initialize database")
-        return
+        logger.error("Failed to migrate database")
+        return False
+    
+    try:
+        with conn.cursor() as cursor:
+            # Serialise concurrent migrators, e.g. several app workers starting together
+            cursor.execute("SELECT GET_LOCK('schema_migrations', 30) AS locked")
+            if not cursor.fetchone()['locked']:
+                logger.error("Timed out waiting for the migration lock")
+                return False
+            try:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_migrations (
+                        version INT PRIMARY KEY,
+                        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute("SELECT version FROM schema_migrations")
+                applied = {row['version'] for row in cursor.fetchall()}
+                for version, statements in MIGRATIONS:
+                    if version in applied:
+                        continue
+                    if callable(statements):
+                        statements(cursor)
+                    else:
+                        for statement in statements:
+                            cursor.execute(statement)
+                    cursor.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+                    logger.info(f"Applied schema migration {version}")
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+        return True
+    except Exception as e:
+        logger.error(f"Error migrating database: {e}")
+        return False
+    finally:
+        conn.close()
+
+def reset_db():
+    # Development only: drops every table and rebuilds the schema from scratch
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Failed to reset database")
+        return False
     
     try:
         with conn.cursor() as cursor:
-            # Drop existing tables (for development only)
-            cursor.execute("DROP TABLE IF EXISTS emotion_logs")
-            cursor.execute("DROP TABLE IF EXISTS sessions")
-            cursor.execute("DROP TABLE IF EXISTS users")
+            for table in DEV_TABLES:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    except Exception as e:
+        logger.error(f"Error resetting database: {e}")
+        return False
+    finally:
+        conn.close()
+    return migrate()
+
+def create_session_record(user_id):
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO sessions (user_id) VALUES (%s)",
+                (user_id,)
+            )
+            session_id = cursor.lastrowid
+            conn.commit()
+            logger.info(f"New session started: {session_id}")
+            return session_id
+    except Exception as e:
+        logger.error(f"Session creation failed: {e}")
+        return None
+    finally:
+        conn.close()
+
+def finish_session_record(session_id, user_id, total_faces):
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            # Update session stats from the rollups kept by the log writer
+            cursor.execute('''
+                UPDATE sessions SET
+                    end_time = NOW(),
+                    total_faces = %s,
+                    most_common_emotion = COALESCE((
+                        SELECT emotion FROM session_emotion_counts
+                        WHERE session_id = %s
+                        ORDER BY count DESC
+                        LIMIT 1
+                    ), 'neutral')
+                WHERE id = %s
+            ''', (total_faces, session_id, session_id))
             
-            # Create tables
+            # Update user stats
             cursor.execute('''
-                CREATE TABLE users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    password VARCHAR(128) NOT NULL,
-                    total_sessions INT DEFAULT 0,
-                    total_faces_detected INT DEFAULT 0,
-                    most_common_emotion VARCHAR(50)
-                )
-            ''')
+                UPDATE users SET
+                    total_sessions = total_sessions + 1,
+                    total_faces_detected = total_faces_detected + %s,
+                    most_common_emotion = (
+                        SELECT emotion FROM user_emotion_counts
+                        WHERE user_id = %s
+                        ORDER BY count DESC
+                        LIMIT 1
+                    )
+                WHERE id = %s
+            ''', (total_faces, user_id, user_id))
             
+            conn.commit()
+            return True
+    except Exception as e:
+        logger.error(f"Session cleanup failed: {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def backfill_rollups():
+    conn = get_db_connection()
+    if not conn:
+        logger.error("Failed to backfill rollups")
+        return
+    
+    try:
+        conn.begin()
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM emotion_minute_counts")
+            cursor.execute("DELETE FROM session_emotion_counts")
+            cursor.execute("DELETE FROM user_emotion_counts")
             cursor.execute('''
-                CREATE TABLE sessions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    start_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    end_time DATETIME,
-                    total_faces INT DEFAULT 0,
-                    most_common_emotion VARCHAR(50),
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
+                INSERT INTO session_emotion_counts (session_id, emotion, count)
+                SELECT session_id, emotion, COUNT(*) FROM emotion_logs
+                WHERE session_id IS NOT NULL AND emotion IS NOT NULL
+                GROUP BY session_id, emotion
+            ''')
+            cursor.execute('''
+                INSERT INTO user_emotion_counts (user_id, emotion, count)
+                SELECT s.user_id, c.emotion, SUM(c.count) FROM session_emotion_counts c
+                JOIN sessions s ON s.id = c.session_id
+                WHERE s.user_id IS NOT NULL
+                GROUP BY s.user_id, c.emotion
+            ''')
+            cursor.execute('''
+                INSERT INTO emotion_minute_counts (session_id, bucket, emotion, count)
+                SELECT session_id, DATE_FORMAT(captured_at, '%Y-%m-%d %H:%i:00'), emotion, COUNT(*)
+                FROM emotion_logs
+                WHERE session_id IS NOT NULL AND emotion IS NOT NULL AND captured_at IS NOT NULL
+                GROUP BY session_id, DATE_FORMAT(captured_at, '%Y-%m-%d %H:%i:00'), emotion
             ''')
-            
             cursor.execute('''
-                CREATE TABLE emotion_logs (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    session_id INT,
-                    emotion VARCHAR(50),
-                    FOREIGN KEY (session_id) REFERENCES sessions(id) ON DELETE CASCADE
+                UPDATE users u SET most_common_emotion = (
+                    SELECT emotion FROM user_emotion_counts c
+                    WHERE c.user_id = u.id
+                    ORDER BY c.count DESC
+                    LIMIT 1
                 )
             ''')
-            
-            conn.commit()
-            logger.info("Database tables created successfully")
+        conn.commit()
+        logger.info("Emotion rollups backfilled")
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error(f"Error backfilling rollups: {e}")
         conn.rollback()
     finally:
         conn.close()
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Database maintenance")
+    parser.add_argument("command", nargs="?", default="migrate", choices=["migrate", "reset", "backfill"])
+    args = parser.parse_args()
+    if args.command == "backfill":
+        backfill_rollups()
+    elif args.command == "reset":
+        reset_db()
+    else:
+        migrate()
\ No newline at end of file
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+
+def dhash(gray_roi, size=8):
+    # 64-bit difference hash: cheap enough to run on every candidate crop
+    small = cv2.resize(gray_roi, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+class EmotionCache:
+    def __init__(self, alpha=0.4, confidence_threshold=0.6, max_hash_distance=6, max_skips=4):
+        self.alpha = alpha
+        self.confidence_threshold = confidence_threshold
+        self.max_hash_distance = max_hash_distance
+        self.max_skips = max_skips
+        self.inferred = 0
+        self.skipped = 0
+
+    def should_infer(self, track, gray_roi):
+        # State lives on the track itself, so it expires when the tracker drops the track
+        crop_hash = dhash(gray_roi)
+        if (track.smoothed is not None
+                and track.skips < self.max_skips
+                and track.smoothed.max() >= self.confidence_threshold
+                and track.crop_hash is not None
+                and hamming(crop_hash, track.crop_hash) <= self.max_hash_distance):
+            track.skips += 1
+            self.skipped += 1
+            return False
+        track.crop_hash = crop_hash
+        track.skips = 0
+        self.inferred += 1
+        return True
+
+    def update(self, track, probs):
+        probs = np.asarray(probs, dtype=np.float32)
+        track.probs = probs
+        if track.smoothed is None:
+            track.smoothed = probs
+        else:
+            track.smoothed = self.alpha * probs + (1 - self.alpha) * track.smoothed
+        index = int(track.smoothed.argmax())
+        return index, float(track.smoothed[index])
+
+    def stats(self):
+        return {"inferred": self.inferred, "skipped": self.skipped}
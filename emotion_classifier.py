@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+import argparse
+import cv2
+import numpy as np
+from metrics import MODEL_LOAD_SECONDS
+from model_paths import MODELS_DIR
+import logging
+
+logger = logging.getLogger(__name__)
+
+EMOTION_LABELS = ['angry', 'disgust', 'fear', 'happy', 'sad', 'surprise', 'neutral']
+
+PRECISIONS = ('fp32', 'fp16', 'int8')
+
+class EmotionClassifier:
+    # The DeepFace emotion CNN run through Keras; the other engines run the same
+    # network exported by `python emotion_classifier.py export`
+    name = 'deepface'
+
+    def __init__(self, input_size=48, max_batch_size=32):
+        self.input_size = input_size
+        self.max_batch_size = max_batch_size
+        self.model = None
+        self.lock = threading.Lock()
+        # Preprocessing buffers are per thread because one classifier serves every stream
+        self._local = threading.local()
+
+    def _load_model(self):
+        # TensorFlow comes in with DeepFace, so it is only imported once a model is needed
+        from deepface import DeepFace
+
+        client = DeepFace.build_model("Emotion")
+        return getattr(client, 'model', client)
+
+    def _predict(self, model, batch):
+        return model.predict_on_batch(batch)
+
+    def load(self):
+        # The model is built once and reused for every batch
+        with self.lock:
+            if self.model is None:
+                started = time.perf_counter()
+                self.model = self._load_model()
+                elapsed = time.perf_counter() - started
+                MODEL_LOAD_SECONDS.labels(f'emotion_{self.name}').set(elapsed)
+                logger.info(f"Emotion model ({self.name}) loaded in {elapsed:.2f}s")
+        return self.model
+
+    def _buffers(self, count):
+        local = self._local
+        if getattr(local, 'pixels', None) is None or len(local.pixels) < count:
+            size = self.input_size
+            capacity = max(count, self.max_batch_size)
+            local.pixels = np.empty((capacity, size, size), dtype=np.uint8)
+            local.batch = np.empty((capacity, size, size, 1), dtype=np.float32)
+        return local.pixels[:count], local.batch[:count]
+
+    def preprocess(self, face_rois):
+        size = self.input_size
+        pixels, batch = self._buffers(len(face_rois))
+        for i, roi in enumerate(face_rois):
+            gray = roi if roi.ndim == 2 else cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+            cv2.resize(gray, (size, size), dst=pixels[i], interpolation=cv2.INTER_AREA)
+        np.multiply(pixels[..., np.newaxis], 1.0 / 255.0, out=batch)
+        return batch
+
+    def predict_proba(self, face_rois):
+        if not face_rois:
+            return np.zeros((0, len(EMOTION_LABELS)), dtype=np.float32)
+        model = self.load()
+        batch = self.preprocess(face_rois)
+        outputs = [
+            np.asarray(self._predict(model, batch[i:i + self.max_batch_size]), dtype=np.float32)
+            for i in range(0, len(batch), self.max_batch_size)
+        ]
+        return np.concatenate(outputs)
+
+    def classify(self, face_rois):
+        probs = self.predict_proba(face_rois)
+        return [EMOTION_LABELS[i] for i in probs.argmax(axis=1)]
+
+def _model_path(extension, precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    suffix = '' if precision == 'fp32' else f'_{precision}'
+    return os.path.join(MODELS_DIR, f'emotion{suffix}.{extension}')
+
+class ONNXEmotionClassifier(EmotionClassifier):
+    name = 'onnx'
+
+    def __init__(self, model_path=None, precision='int8', input_size=48, max_batch_size=32, num_threads=None):
+        super().__init__(input_size, max_batch_size)
+        self.model_path = model_path or _model_path('onnx', precision)
+        self.num_threads = num_threads
+
+    def _load_model(self):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required for the 'onnx' emotion classifier") from e
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"ONNX emotion model not found: {self.model_path}")
+        options = ort.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        session = ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+        return session, session.get_inputs()[0].name
+
+    def _predict(self, model, batch):
+        # InferenceSession.run is thread-safe, so one session serves every stream
+        session, input_name = model
+        return session.run(None, {input_name: batch})[0]
+
+class TFLiteEmotionClassifier(EmotionClassifier):
+    name = 'tflite'
+
+    def __init__(self, model_path=None, precision='int8', input_size=48, max_batch_size=32, num_threads=None):
+        super().__init__(input_size, max_batch_size)
+        self.model_path = model_path or _model_path('tflite', precision)
+        self.num_threads = num_threads
+
+    def _load_model(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tensorflow.lite import Interpreter
+            except ImportError as e:
+                raise ImportError("tflite-runtime or tensorflow is required for the 'tflite' emotion classifier") from e
+        if not os.path.exists(self.model_path):
+            raise FileNotFoundError(f"TFLite emotion model not found: {self.model_path}")
+        # The model is the interpreter class; building one here checks the file loads
+        self._interpreter(Interpreter)
+        return Interpreter
+
+    def _interpreter(self, interpreter_class):
+        # Interpreters are not thread-safe, so each inference thread gets its own
+        local = self._local
+        if getattr(local, 'interpreter', None) is None:
+            local.interpreter = interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+            local.input_shape = None
+        return local.interpreter
+
+    def _predict(self, model, batch):
+        interpreter = self._interpreter(model)
+        input_index = interpreter.get_input_details()[0]['index']
+        if self._local.input_shape != batch.shape:
+            interpreter.resize_tensor_input(input_index, batch.shape)
+            interpreter.allocate_tensors()
+            self._local.input_shape = batch.shape
+        interpreter.set_tensor(input_index, batch)
+        interpreter.invoke()
+        return interpreter.get_tensor(interpreter.get_output_details()[0]['index'])
+
+CLASSIFIER_ENGINES = {
+    engine.name: engine
+    for engine in (EmotionClassifier, ONNXEmotionClassifier, TFLiteEmotionClassifier)
+}
+
+def create_classifier(name='deepface', **options):
+    if name not in CLASSIFIER_ENGINES:
+        raise ValueError(f"Unknown emotion classifier '{name}', expected one of {sorted(CLASSIFIER_ENGINES)}")
+    return CLASSIFIER_ENGINES[name](**options)
+
+def export_onnx(model, path, precision):
+    import tensorflow as tf
+    import tf2onnx
+
+    size = model.input_shape[1]
+    signature = [tf.TensorSpec((None, size, size, 1), tf.float32, name='input')]
+    if precision == 'fp32':
+        tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=path)
+        return
+    fp32_path = path + '.fp32'
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=13, output_path=fp32_path)
+    try:
+        if precision == 'int8':
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+        else:
+            import onnx
+            from onnxconverter_common import float16
+            onnx.save(float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True), path)
+    finally:
+        os.remove(fp32_path)
+
+def export_tflite(model, path, precision):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if precision != 'fp32':
+        # Dynamic-range quantization: int8 weights without a calibration set
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    with open(path, 'wb') as f:
+        f.write(converter.convert())
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the DeepFace emotion model for the onnx/tflite engines")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("--format", choices=["onnx", "tflite"], default="onnx")
+    parser.add_argument("--precision", choices=PRECISIONS, default="int8")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    path = args.output or _model_path(args.format, args.precision)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    model = EmotionClassifier().load()
+    (export_onnx if args.format == 'onnx' else export_tflite)(model, path, args.precision)
+    print(f"Wrote {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import threading
+import time
+import queue
+from collections import Counter
+from datetime import datetime
+from database_setup import get_db_connection
+from metrics import STAGE_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+INSERT_EMOTION_LOGS = (
+    "INSERT INTO emotion_logs (session_id, track_id, emotion, confidence, captured_at) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+UPSERT_SESSION_COUNTS = (
+    "INSERT INTO session_emotion_counts (session_id, emotion, count) VALUES (%s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+)
+
+UPSERT_USER_COUNTS = (
+    "INSERT INTO user_emotion_counts (user_id, emotion, count) VALUES (%s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+)
+
+UPSERT_MINUTE_COUNTS = (
+    "INSERT INTO emotion_minute_counts (session_id, bucket, emotion, count) VALUES (%s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE count = count + VALUES(count)"
+)
+
+class EmotionLogWriter:
+    def __init__(self, batch_size=200, flush_interval=1.0, max_queue=10000, block_timeout=0.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name='emotion-log-writer', daemon=True)
+                self._thread.start()
+
+    def write(self, session_id, track_id, emotion, confidence=None, captured_at=None, user_id=None):
+        self.start()
+        captured_at = datetime.fromtimestamp(captured_at if captured_at is not None else time.time())
+        record = (session_id, track_id, emotion, confidence, captured_at, user_id)
+        try:
+            # Block briefly for backpressure if configured, otherwise drop and count
+            if self.block_timeout:
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def flush(self, timeout=5.0):
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def stop(self, timeout=5.0):
+        self.flush(timeout)
+        self._stopping = True
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches
+        }
+
+    def _run(self):
+        batch = []
+        waiters = []
+        deadline = time.monotonic() + self.flush_interval
+        while not self._stopping:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0.01))
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or waiters or time.monotonic() >= deadline):
+                self._write_batch(batch)
+                batch = []
+            if time.monotonic() >= deadline or waiters:
+                deadline = time.monotonic() + self.flush_interval
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        started = time.perf_counter()
+        conn = get_db_connection()
+        if not conn:
+            self.failed += len(batch)
+            return
+        session_counts = Counter((r[0], r[2]) for r in batch)
+        user_counts = Counter((r[5], r[2]) for r in batch if r[5] is not None)
+        minute_counts = Counter((r[0], r[4].replace(second=0, microsecond=0), r[2]) for r in batch)
+        try:
+            # Logs and their rollups land in one transaction so the counts never drift
+            conn.begin()
+            with conn.cursor() as cursor:
+                # pymysql folds executemany INSERTs into multi-row statements
+                cursor.executemany(INSERT_EMOTION_LOGS, [r[:5] for r in batch])
+                cursor.executemany(UPSERT_SESSION_COUNTS, [(s, e, c) for (s, e), c in session_counts.items()])
+                if user_counts:
+                    cursor.executemany(UPSERT_USER_COUNTS, [(u, e, c) for (u, e), c in user_counts.items()])
+                cursor.executemany(UPSERT_MINUTE_COUNTS, [(s, b, e, c) for (s, b, e), c in minute_counts.items()])
+            conn.commit()
+            self.written += len(batch)
+            self.batches += 1
+            STAGE_SECONDS.labels('db_write').observe(time.perf_counter() - started)
+        except Exception as e:
+            logger.error(f"Emotion log write of {len(batch)} records failed: {e}")
+            self.failed += len(batch)
+            conn.rollback()
+        finally:
+            conn.close()
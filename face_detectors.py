@@ -0,0 +1,186 @@
+import os
+import time
+import cv2
+import numpy as np
+from frame_buffers import ScratchBuffer
+from metrics import MODEL_LOAD_SECONDS
+from model_paths import MODELS_DIR
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _clip_boxes(boxes, frame_w, frame_h):
+    if len(boxes) == 0:
+        return np.empty((0, 4), dtype=np.int32)
+    boxes = boxes.round().astype(np.int32)
+    x1 = np.clip(boxes[:, 0], 0, frame_w)
+    y1 = np.clip(boxes[:, 1], 0, frame_h)
+    x2 = np.clip(boxes[:, 0] + boxes[:, 2], 0, frame_w)
+    y2 = np.clip(boxes[:, 1] + boxes[:, 3], 0, frame_h)
+    boxes = np.stack([x1, y1, x2 - x1, y2 - y1], axis=1)
+    return boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+
+class FaceDetector:
+    name = None
+    input_size = (320, 240)
+    # Engines that accept any input size can detect inside changed regions only
+    supports_regions = False
+    _resize_buffer = None
+
+    def _detect(self, image):
+        raise NotImplementedError
+
+    def detect(self, frame):
+        # Engines run at their own input resolution; boxes come back in frame coordinates
+        frame_h, frame_w = frame.shape[:2]
+        in_w, in_h = self.input_size
+        if (frame_w, frame_h) == (in_w, in_h):
+            image = frame
+        else:
+            if self._resize_buffer is None:
+                self._resize_buffer = ScratchBuffer()
+            dst = self._resize_buffer.get((in_h, in_w) + frame.shape[2:])
+            image = cv2.resize(frame, (in_w, in_h), dst=dst, interpolation=cv2.INTER_AREA)
+
+        boxes = np.asarray(self._detect(image), dtype=np.float32).reshape(-1, 4)
+        boxes[:, [0, 2]] *= frame_w / in_w
+        boxes[:, [1, 3]] *= frame_h / in_h
+        return _clip_boxes(boxes, frame_w, frame_h)
+
+    def detect_regions(self, frame, regions):
+        # Each region is scaled by the same factor as a full-frame detect, so the cost
+        # follows the area that changed rather than the input size
+        frame_h, frame_w = frame.shape[:2]
+        scale_x, scale_y = self.input_size[0] / frame_w, self.input_size[1] / frame_h
+        found = []
+        for x, y, w, h in regions:
+            crop = frame[y:y+h, x:x+w]
+            size = (max(int(round(w * scale_x)), 1), max(int(round(h * scale_y)), 1))
+            image = crop if size == (w, h) else cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+            boxes = np.asarray(self._detect(image), dtype=np.float32).reshape(-1, 4)
+            boxes[:, [0, 2]] *= w / size[0]
+            boxes[:, [1, 3]] *= h / size[1]
+            boxes[:, 0] += x
+            boxes[:, 1] += y
+            found.append(boxes)
+        return _clip_boxes(np.concatenate(found) if found else np.empty((0, 4), dtype=np.float32), frame_w, frame_h)
+
+class HaarFaceDetector(FaceDetector):
+    name = 'haar'
+    supports_regions = True
+
+    def __init__(self, input_size=(320, 240), scale_factor=1.1, min_neighbors=4, min_size=(30, 30)):
+        self.input_size = tuple(input_size)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = tuple(min_size)
+        self.cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        )
+        self._gray_buffer = ScratchBuffer()
+
+    def _detect(self, image):
+        if image.ndim == 2:
+            gray = image
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self._gray_buffer.get(image.shape[:2]))
+        return self.cascade.detectMultiScale(gray, self.scale_factor, self.min_neighbors, minSize=self.min_size)
+
+class YuNetFaceDetector(FaceDetector):
+    name = 'yunet'
+    supports_regions = True
+
+    def __init__(self, model_path=None, input_size=(320, 240), score_threshold=0.6, nms_threshold=0.3, top_k=500):
+        model_path = model_path or os.path.join(MODELS_DIR, 'face_detection_yunet_2023mar.onnx')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"YuNet model not found: {model_path}")
+        self.input_size = tuple(input_size)
+        self.net = cv2.FaceDetectorYN.create(
+            model_path, "", self.input_size, score_threshold, nms_threshold, top_k
+        )
+        self._net_size = self.input_size
+
+    def _detect(self, image):
+        size = (image.shape[1], image.shape[0])
+        if size != self._net_size:
+            self.net.setInputSize(size)
+            self._net_size = size
+        _, faces = self.net.detect(image)
+        if faces is None:
+            return []
+        return faces[:, :4]
+
+class SSDFaceDetector(FaceDetector):
+    name = 'ssd'
+
+    def __init__(self, prototxt_path=None, model_path=None, input_size=(300, 300), score_threshold=0.5):
+        prototxt_path = prototxt_path or os.path.join(MODELS_DIR, 'deploy.prototxt')
+        model_path = model_path or os.path.join(MODELS_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+        for path in (prototxt_path, model_path):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"SSD model file not found: {path}")
+        self.input_size = tuple(input_size)
+        self.score_threshold = score_threshold
+        self.net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+    def _detect(self, image):
+        in_w, in_h = self.input_size
+        blob = cv2.dnn.blobFromImage(image, 1.0, (in_w, in_h), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        detections = self.net.forward()[0, 0]
+        detections = detections[detections[:, 2] >= self.score_threshold]
+        boxes = detections[:, 3:7] * np.array([in_w, in_h, in_w, in_h], dtype=np.float32)
+        boxes[:, 2:] -= boxes[:, :2]
+        return boxes
+
+class ONNXFaceDetector(FaceDetector):
+    # Ultra-Light-Fast-Generic-Face-Detector layout: scores (1, N, 2), boxes (1, N, 4) normalised corners
+    name = 'onnx'
+
+    def __init__(self, model_path=None, input_size=(320, 240), score_threshold=0.7, nms_threshold=0.3, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("onnxruntime is required for the 'onnx' face detector") from e
+        model_path = model_path or os.path.join(MODELS_DIR, 'version-RFB-320.onnx')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"ONNX face model not found: {model_path}")
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.input_size = tuple(input_size)
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+
+    def _detect(self, image):
+        in_w, in_h = self.input_size
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB).astype(np.float32)
+        blob = ((rgb - 127.0) / 128.0).transpose(2, 0, 1)[np.newaxis]
+        scores, boxes = self.session.run(None, {self.input_name: blob})
+        scores = scores[0, :, 1]
+        keep = scores >= self.score_threshold
+        scores = scores[keep]
+        boxes = boxes[0][keep] * np.array([in_w, in_h, in_w, in_h], dtype=np.float32)
+        boxes[:, 2:] -= boxes[:, :2]
+        if len(boxes) == 0:
+            return []
+        indices = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.score_threshold, self.nms_threshold)
+        return boxes[np.asarray(indices, dtype=np.int32).reshape(-1)]
+
+DETECTOR_ENGINES = {
+    engine.name: engine
+    for engine in (HaarFaceDetector, YuNetFaceDetector, SSDFaceDetector, ONNXFaceDetector)
+}
+
+def create_detector(name='haar', **options):
+    if name not in DETECTOR_ENGINES:
+        raise ValueError(f"Unknown face detector '{name}', expected one of {sorted(DETECTOR_ENGINES)}")
+    started = time.perf_counter()
+    detector = DETECTOR_ENGINES[name](**options)
+    MODEL_LOAD_SECONDS.labels(f'detector_{name}').set(time.perf_counter() - started)
+    return detector
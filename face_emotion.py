@@ -2,90 +2,146 @@ import cv2
 import threading
 import time
 import queue
-from deepface import DeepFace
-from database_setup import get_db_connection
-from flask import session
+import collections
+import numpy as np
+from concurrent.futures import TimeoutError as FutureTimeoutError, wait as wait_futures
+from emotion_classifier import create_classifier, EMOTION_LABELS
+from face_detectors import create_detector
+from face_tracker import FaceTracker
+from frame_broadcaster import FrameBroadcaster, SummaryBroadcaster
+from emotion_log_writer import EmotionLogWriter
+from frame_scheduler import FrameScheduler
+from emotion_cache import EmotionCache
+from frame_buffers import FrameBufferPool, ScratchBuffer
+from database_setup import create_session_record, finish_session_record
+from session_manager import BROWSER_SOURCE
+from capture_sources import open_capture
+from motion_gate import MotionGate, overlaps
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class EmotionDetector:
-    def __init__(self):
+    def __init__(self, detector_engine='haar', detector_options=None, classifier=None, inference_pool=None,
+                 process_pool=None, stream_options=None, summary_interval=0.25, log_writer=None,
+                 scheduler_options=None, cache_options=None, classifier_engine='deepface', classifier_options=None,
+                 decode_pool=None, max_pending_decodes=2, state=None, state_key=None, motion_options=None):
         self.cap = None
+        self.source = 0
+        self.capture_thread = None
+        self.user_id = None
         self.is_running = False
         self.lock = threading.Lock()
         self.emotion_summary = {"total_faces": 0, "emotions": {}}
-        self.face_tracker = {}
-        self.frame_queue = queue.Queue(maxsize=3)
+        self.scheduler = FrameScheduler(**(scheduler_options or {}))
+        self.face_tracker = FaceTracker(max_distance=75, max_missed=10,
+                                        reinfer_interval=self.scheduler.reinfer_interval)
+        self.cache_options = cache_options or {}
+        self.emotion_cache = EmotionCache(**self.cache_options)
         self.processed_frame = None
-        self.tracking_threshold = 75
-        self.frame_skip_count = 5
+        # Capture reads into recycled buffers; a buffer returns to the pool once it is
+        # dropped by the scheduler or superseded as the processed frame
+        self.buffer_pool = FrameBufferPool(size=4)
+        self.frame_shape = None
+        self._gray = ScratchBuffer()
+        self.stream_options = stream_options or {}
+        self.broadcaster = FrameBroadcaster(**self.stream_options)
+        self.summary_interval = summary_interval
+        self.summary_broadcaster = SummaryBroadcaster(min_interval=summary_interval)
         self.current_frame_count = 0
         self.session_id = None
-        self.face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        self.analyzer_backend = 'opencv'
+        self.face_detector = create_detector(detector_engine, **(detector_options or {}))
+        self.classifier = classifier or create_classifier(classifier_engine, **(classifier_options or {}))
+        self.inference_pool = inference_pool
+        self.process_pool = process_pool
+        # Static scenes skip detection and keep the last boxes; None disables the gate
+        self.motion_gate = MotionGate(**motion_options) if motion_options is not None else None
+        self.faces = np.empty((0, 4), dtype=np.int32)
+        self.log_writer = log_writer or EmotionLogWriter()
+        # Browser sessions receive frames through submit_frame instead of a capture thread
+        self.decode_pool = decode_pool
+        self.max_pending_decodes = max_pending_decodes
+        self._ingest_lock = threading.Lock()
+        self._pending_decodes = 0
+        self._ingest_sequence = 0
+        self._latest_sequence = 0
+        # With a shared live state, summaries and encoded frames are mirrored there for
+        # web workers in other processes
+        self.state = state
+        self.state_key = state_key
+        # Classify jobs still running in worker processes; stop_session waits for them
+        self._classify_futures = set()
+
+    def set_detector(self, name, **options):
+        self.face_detector = create_detector(name, **options)
+        logger.info(f"Face detector set to {name} at {self.face_detector.input_size}")
 
     def _analyze_emotion(self, face_roi):
+        probs = self._analyze_emotions([face_roi])
+        return EMOTION_LABELS[probs[0].argmax()] if probs is not None else 'neutral'
+
+    def _analyze_emotions(self, face_rois):
+        # Faces are already located by the face detector, so the crops go straight
+        # to the classifier in one batch instead of through DeepFace.analyze
         try:
-            rgb_face = cv2.cvtColor(face_roi, cv2.COLOR_BGR2RGB)
-            result = DeepFace.analyze(
-                img_path=rgb_face,
-                actions=['emotion'],
-                detector_backend=self.analyzer_backend,
-                enforce_detection=False,
-                silent=True
-            )
-            if result and isinstance(result, list):
-                emotions = result[0]['emotion']
-                dominant = max(emotions, key=emotions.get)
-                return dominant
-            return 'neutral'
+            if self.inference_pool is not None:
+                return self.inference_pool.submit(self.classifier.predict_proba, face_rois).result()
+            return self.classifier.predict_proba(face_rois)
         except Exception as e:
             logger.error(f"Emotion analysis failed: {e}")
-            return 'neutral'
+            return None
+
+    def _set_emotion(self, track, probs, captured_at, session_id=None, user_id=None):
+        # Labels follow the track's smoothed probabilities rather than a single inference
+        index, confidence = self.emotion_cache.update(track, probs)
+        track.emotion = EMOTION_LABELS[index]
+        track.confidence = confidence
+        if session_id is None:
+            session_id, user_id = self.session_id, self.user_id
+        self.log_writer.write(session_id, track.id, track.emotion, track.confidence, captured_at, user_id)
 
-    def start_session(self):
+    def start_session(self, user_id, source=0):
         with self.lock:
             if self.is_running:
                 return False
             
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
-                logger.error("Webcam access failed")
-                return False
+            if source != BROWSER_SOURCE:
+                self.cap = open_capture(source)
+                if self.cap is None or not self.cap.isOpened():
+                    logger.error(f"Capture source {source!r} could not be opened")
+                    self.cap = None
+                    return False
             
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            if isinstance(source, int):
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            self.source = source
+            self.user_id = user_id
+            self.broadcaster = FrameBroadcaster(**self.stream_options)
+            self.summary_broadcaster = SummaryBroadcaster(min_interval=self.summary_interval)
+            self.scheduler.reset()
+            self.emotion_cache = EmotionCache(**self.cache_options)
+            self.faces = np.empty((0, 4), dtype=np.int32)
+            if self.motion_gate is not None:
+                self.motion_gate.reset()
             self.is_running = True
             
-            conn = get_db_connection()
-            if conn:
-                try:
-                    with conn.cursor() as cursor:
-                        # Fixed line below
-                        cursor.execute(
-                            "INSERT INTO sessions (user_id) VALUES (%s)",
-                            (session.get('user_id'),)  # <-- Closing parenthesis added
-                        )
-                        self.session_id = cursor.lastrowid
-                        conn.commit()
-                        logger.info(f"New session started: {self.session_id}")
-                except Exception as e:
-                    logger.error(f"Session creation failed: {e}")
-                    self.session_id = None
-                finally:
-                    conn.close()
+            self.session_id = create_session_record(user_id)
             
             if not self.session_id:
                 self.is_running = False
+                if self.cap:
+                    self.cap.release()
+                    self.cap = None
                 return False
             
-            self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
+            self._ingest_sequence = self._latest_sequence = 0
+            self.capture_thread = None
+            if self.cap is not None:
+                self.capture_thread = threading.Thread(target=self._capture_frames, daemon=True)
+                self.capture_thread.start()
             self.process_thread = threading.Thread(target=self._process_frames, daemon=True)
-            self.capture_thread.start()
             self.process_thread.start()
             return True
 
@@ -94,7 +150,12 @@ class EmotionDetector:
             if not self.is_running:
                 return
             
-            self.is_running = False
+            # Under the ingest lock, so an in-flight decode never puts after the close
+            with self._ingest_lock:
+                self.is_running = False
+            self.scheduler.close()
+            self.broadcaster.close()
+            self.summary_broadcaster.close()
             if self.cap:
                 self.cap.release()
                 self.cap = None
@@ -103,138 +164,339 @@ class EmotionDetector:
                 self.capture_thread.join(timeout=2)
             if self.process_thread:
                 self.process_thread.join(timeout=2)
+            # Late classify results would otherwise be logged after the flush below
+            pending = list(self._classify_futures)
+            if pending and wait_futures(pending, timeout=2).not_done:
+                logger.warning(f"Dropping unfinished emotion results for session {self.session_id}")
             
-            conn = get_db_connection()
-            if conn and self.session_id:
-                try:
-                    with conn.cursor() as cursor:
-                        # Insert emotion logs
-                        for fid, (_, emotion, _) in self.face_tracker.items():
-                            if emotion:
-                                cursor.execute(
-                                    "INSERT INTO emotion_logs (session_id, emotion) VALUES (%s, %s)",
-                                    (self.session_id, emotion)
-                                )
-                        
-                        # Update session stats
-                        total_faces = self.emotion_summary['total_faces']
-                        common_emotion = max(
-                            self.emotion_summary['emotions'],
-                            key=self.emotion_summary['emotions'].get,
-                            default='neutral'
-                        )
-                        cursor.execute(
-                            "UPDATE sessions SET end_time = NOW(), total_faces = %s, most_common_emotion = %s WHERE id = %s",
-                            (total_faces, common_emotion, self.session_id)
-                        )
-                        
-                        # Update user stats
-                        cursor.execute('''
-                            UPDATE users SET
-                                total_sessions = total_sessions + 1,
-                                total_faces_detected = total_faces_detected + %s,
-                                most_common_emotion = (
-                                    SELECT emotion FROM emotion_logs 
-                                    WHERE session_id IN (
-                                        SELECT id FROM sessions WHERE user_id = %s
-                                    )
-                                    GROUP BY emotion 
-                                    ORDER BY COUNT(*) DESC 
-                                    LIMIT 1
-                                )
-                            WHERE id = %s
-                        ''', (total_faces, session.get('user_id'), session.get('user_id')))
-                        
-                        conn.commit()
-                except Exception as e:
-                    logger.error(f"Session cleanup failed: {e}")
-                    conn.rollback()
-                finally:
-                    conn.close()
+            # Emotion logs are streamed during the session; wait for the tail to land
+            if not self.log_writer.flush():
+                logger.error(f"Timed out flushing emotion logs for session {self.session_id}")
+            
+            if self.session_id:
+                finish_session_record(self.session_id, self.user_id, self.emotion_summary['total_faces'])
             
-            self.face_tracker.clear()
+            self.face_tracker.reset()
             self.emotion_summary = {"total_faces": 0, "emotions": {}}
             self.session_id = None
+            self.user_id = None
 
     def _capture_frames(self):
+        # cap.read() blocks at the source's frame rate, so no sleep is needed
         while self.is_running:
-            ret, frame = self.cap.read()
-            if ret:
-                try:
-                    if not self.frame_queue.full():
-                        small_frame = cv2.resize(frame, (320, 240))
-                        self.frame_queue.put(small_frame)
-                except:
-                    pass
-            time.sleep(0.01)
+            buffer = self.buffer_pool.acquire(self.frame_shape) if self.frame_shape else None
+            started = time.perf_counter()
+            ret, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
+            self.scheduler.record_stage('capture', time.perf_counter() - started)
+            if not ret:
+                self.buffer_pool.release(buffer)
+                if getattr(self.cap, 'ended', False):
+                    # A replay without loop=1 has no more frames; the session stays open
+                    # until it is stopped, but nothing is left to capture
+                    logger.info(f"Replay source finished for session {self.session_id}")
+                    return
+                time.sleep(0.01)
+                continue
+            if frame is not buffer:
+                # The source allocated its own frame; the unused buffer goes back
+                self.buffer_pool.release(buffer)
+                self.frame_shape = frame.shape
+            self.buffer_pool.release(self.scheduler.put(frame, time.time()))
+
+    def submit_frame(self, data):
+        # Called from the ingest route; decoding happens on the shared decode pool. With
+        # max_pending_decodes already queued the frame is dropped, so a client sending
+        # faster than we decode never builds a backlog
+        if not self.is_running or self.source != BROWSER_SOURCE:
+            return False
+        with self._ingest_lock:
+            if self._pending_decodes >= self.max_pending_decodes:
+                self.scheduler.record_dropped()
+                return False
+            self._pending_decodes += 1
+            self._ingest_sequence += 1
+            sequence = self._ingest_sequence
+        captured_at = time.time()
+        if self.decode_pool is not None:
+            try:
+                self.decode_pool.submit(self._decode_frame, data, sequence, captured_at)
+            except RuntimeError as e:
+                # The pool is shutting down; the slot taken above is never decoded
+                logger.warning(f"Dropped an uploaded frame: {e}")
+                with self._ingest_lock:
+                    self._pending_decodes -= 1
+                return False
+        else:
+            self._decode_frame(data, sequence, captured_at)
+        return True
+
+    def _decode_frame(self, data, sequence, captured_at):
+        try:
+            started = time.perf_counter()
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self.scheduler.record_stage('decode', time.perf_counter() - started)
+            if frame is None:
+                logger.warning("Dropped an undecodable uploaded frame")
+                return
+            with self._ingest_lock:
+                # stop_session may have closed the scheduler while this frame decoded
+                if not self.is_running:
+                    return
+                # Decodes finish out of order; never let an older frame replace a newer one
+                if sequence < self._latest_sequence:
+                    self.scheduler.record_dropped()
+                    return
+                self._latest_sequence = sequence
+                self.buffer_pool.release(self.scheduler.put(frame, captured_at))
+        except Exception as e:
+            logger.error(f"Frame decode error: {e}")
+        finally:
+            with self._ingest_lock:
+                self._pending_decodes -= 1
+
+    def _update_tracks(self, faces):
+        self.current_frame_count += 1
+        tracks = self.face_tracker.update(faces)
+        boxes = [tuple(int(v) for v in box) for box in faces]
+        
+        # Only new or stale tracks are candidates for the classifier
+        candidates = []
+        for track, box in zip(tracks, boxes):
+            if self.face_tracker.needs_inference(track):
+                candidates.append((track, box))
+                self.face_tracker.mark_inferred(track)
+        return list(zip(tracks, boxes)), candidates
+
+    def _select_for_inference(self, frame, candidates):
+        # Confident tracks whose crop barely changed keep their cached probabilities
+        selected = []
+        if not candidates:
+            return selected
+        # One grayscale conversion into a reused buffer; each crop is a view into it
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray.get(frame.shape[:2]))
+        for track, (x, y, w, h) in candidates:
+            roi = gray[y:y+h, x:x+w]
+            if self.emotion_cache.should_infer(track, roi):
+                selected.append((track, (x, y, w, h), roi))
+        return selected
+
+    def _detect_faces(self, frame):
+        # Returns this frame's boxes; when the motion gate saw no change those are
+        # the previous boxes, carried forward without running the detector
+        regions = None
+        if self.motion_gate is not None:
+            started = time.perf_counter()
+            regions = self.motion_gate.check(frame, self.faces)
+            self.scheduler.record_stage('motion', time.perf_counter() - started)
+            if regions == []:
+                self.scheduler.record_detection(regions)
+                return self.faces
+            if regions is not None and not self.face_detector.supports_regions:
+                regions = None
+
+        started = time.perf_counter()
+        if regions is None:
+            # The detector scales to its own input size and returns full-resolution boxes
+            faces = self.face_detector.detect(frame)
+        else:
+            # Boxes outside the changed regions are carried forward unchanged
+            carried = [box for box in self.faces if not overlaps(box, regions)]
+            found = self.face_detector.detect_regions(frame, regions)
+            faces = np.concatenate([np.asarray(carried, dtype=np.int32).reshape(-1, 4), found])
+        self.scheduler.record_stage('detect', time.perf_counter() - started)
+        self.scheduler.record_detection(regions)
+        if self.motion_gate is not None:
+            self.motion_gate.commit(frame.shape, regions)
+        self.faces = faces
+        return faces
+
+    def _is_static(self, frame):
+        if self.motion_gate is None:
+            return False
+        started = time.perf_counter()
+        regions = self.motion_gate.check(frame, self.faces)
+        self.scheduler.record_stage('motion', time.perf_counter() - started)
+        if regions == []:
+            self.scheduler.record_detection(regions)
+            return True
+        self.motion_gate.commit(frame.shape)
+        return False
+
+    def _track(self, frame, faces):
+        started = time.perf_counter()
+        tracked, candidates = self._update_tracks(faces)
+        to_classify = self._select_for_inference(frame, candidates)
+        self.scheduler.record_stage('track', time.perf_counter() - started)
+        return tracked, to_classify
 
     def _process_frames(self):
+        if self.process_pool is not None:
+            return self._process_frames_pooled()
+        
+        tracked = []
         while self.is_running:
             try:
-                if self.frame_queue.empty():
-                    time.sleep(0.01)
+                item = self.scheduler.get(timeout=0.5)
+                if item is None:
                     continue
+                captured_at, frame = item
                 
-                small_frame = self.frame_queue.get()
-                self.current_frame_count += 1
-                process_emotion = (self.current_frame_count % self.frame_skip_count) == 0
+                # Between detections the previous boxes and labels are carried forward
+                if self.scheduler.should_detect():
+                    tracked, to_classify = self._track(frame, self._detect_faces(frame))
+                    if to_classify:
+                        started = time.perf_counter()
+                        probs = self._analyze_emotions([roi for _, _, roi in to_classify])
+                        if probs is not None:
+                            for (track, _, _), track_probs in zip(to_classify, probs):
+                                self._set_emotion(track, track_probs, captured_at)
+                        self.scheduler.record_stage('classify', time.perf_counter() - started)
+                        self.scheduler.record_classified(len(to_classify))
                 
-                gray = cv2.cvtColor(small_frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
-                
-                frame = cv2.resize(small_frame, (640, 480))
-                current_emotions = []
-                new_tracker = {}
-                
-                for (x, y, w, h) in faces:
-                    x *= 2; y *= 2; w *= 2; h *= 2
-                    face_roi = frame[y:y+h, x:x+w]
-                    
-                    emotion = None
-                    if process_emotion:
-                        emotion = self._analyze_emotion(face_roi)
-                    
-                    centroid = (x + w//2, y + h//2)
-                    closest_id = None
-                    min_dist = float('inf')
-                    
-                    # Track existing faces
-                    for fid, (old_cent, old_emotion, _) in self.face_tracker.items():
-                        dist = ((centroid[0]-old_cent[0])**2 + (centroid[1]-old_cent[1])**2)**0.5
-                        if dist < min_dist and dist < self.tracking_threshold:
-                            min_dist = dist
-                            closest_id = fid
-                            if not process_emotion:
-                                emotion = old_emotion
-                    
-                    fid = closest_id if closest_id else len(new_tracker)
-                    new_tracker[fid] = (centroid, emotion, (x, y, w, h))
-                    if emotion:
-                        current_emotions.append(emotion)
-                    
-                    # Draw annotations
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                    if emotion:
-                        cv2.putText(frame, f"{emotion} ID:{fid}", (x, y-10), 
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                self._annotate_frame(frame, tracked)
+                self._complete_frame(captured_at)
+            except Exception as e:
+                logger.error(f"Frame processing error: {e}")
+
+    def _complete_frame(self, captured_at):
+        self.scheduler.complete(captured_at)
+        self.face_tracker.reinfer_interval = self.scheduler.reinfer_interval
+
+    def _process_frames_pooled(self):
+        # Detection and classification run in worker processes; up to max_in_flight
+        # frames are pipelined and their results applied to the tracker in order
+        in_flight = collections.deque()
+        tracked = []
+        while self.is_running:
+            try:
+                if len(in_flight) < self.process_pool.max_in_flight:
+                    item = self.scheduler.get(timeout=0.01)
+                    if item is not None:
+                        captured_at, frame = item
+                        # Workers detect whole frames, so only fully static ones are gated,
+                        # and only once every earlier frame has been applied
+                        if not in_flight and self._is_static(frame):
+                            # The carried-forward boxes still age their tracks, so stale
+                            # labels are re-classified from the static frame
+                            tracked, to_classify = self._track(frame, self.faces)
+                            if to_classify:
+                                try:
+                                    job = self.process_pool.submit(frame, timeout=1, detect=False)
+                                    self._classify_pooled(job, to_classify, captured_at)
+                                except (queue.Empty, ValueError):
+                                    # Retried once the tracks are due for re-inference again
+                                    pass
+                            self._annotate_frame(frame, tracked)
+                            self._complete_frame(captured_at)
+                            continue
+                        try:
+                            in_flight.append((captured_at, frame, self.process_pool.submit(frame, timeout=1)))
+                        except (queue.Empty, ValueError) as e:
+                            # No free slot in time, or a frame larger than the slots
+                            if isinstance(e, ValueError):
+                                logger.warning(str(e))
+                            self.scheduler.record_dropped()
+                            self.buffer_pool.release(frame)
+                        continue
+                    if not in_flight:
+                        continue
                 
-                self.face_tracker = new_tracker
-                if process_emotion:
-                    emotion_counts = {e: current_emotions.count(e) for e in set(current_emotions)}
-                    self.emotion_summary = {
-                        "total_faces": len(faces),
-                        "emotions": emotion_counts if emotion_counts else {"neutral": 0}
-                    }
+                captured_at, frame, job = in_flight[0]
+                try:
+                    faces = job.detections.result(timeout=0.05)
+                except FutureTimeoutError:
+                    continue
+                except Exception:
+                    in_flight.popleft()
+                    job.release()
+                    raise
+                in_flight.popleft()
                 
-                self.processed_frame = frame
+                self.scheduler.record_detection()
+                self.faces = faces
+                tracked, to_classify = self._track(frame, faces)
+                if to_classify:
+                    self._classify_pooled(job, to_classify, captured_at)
+                else:
+                    job.release()
+                self._annotate_frame(frame, tracked)
+                self._complete_frame(captured_at)
             except Exception as e:
                 logger.error(f"Frame processing error: {e}")
+        
+        for _, _, job in in_flight:
+            job.detections.add_done_callback(lambda _, job=job: job.release())
+
+    def _classify_pooled(self, job, to_classify, captured_at):
+        # The job's slot is released once classification finishes
+        self.scheduler.record_classified(len(to_classify))
+        tracks = [track for track, _, _ in to_classify]
+        future = job.classify([box for _, box, _ in to_classify])
+        session = (self.session_id, self.user_id)
+        self._classify_futures.add(future)
+        future.add_done_callback(
+            lambda f: self._apply_probabilities(tracks, captured_at, session, f)
+        )
+
+    def _apply_probabilities(self, tracks, captured_at, session, future):
+        self._classify_futures.discard(future)
+        try:
+            probs = future.result()
+        except Exception as e:
+            logger.error(f"Emotion analysis failed: {e}")
+            return
+        session_id, user_id = session
+        if session_id is None or session_id != self.session_id:
+            # The session was finalized before this result arrived
+            return
+        for track, track_probs in zip(tracks, probs):
+            self._set_emotion(track, track_probs, captured_at, session_id, user_id)
+
+    def _annotate_frame(self, frame, faces):
+        started = time.perf_counter()
+        current_emotions = []
+        for track, (x, y, w, h) in faces:
+            if track.emotion:
+                current_emotions.append(track.emotion)
+            
+            # Draw annotations
+            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+            if track.emotion:
+                cv2.putText(frame, f"{track.emotion} ID:{track.id}", (x, y-10), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        
+        emotion_counts = {e: current_emotions.count(e) for e in set(current_emotions)}
+        self.emotion_summary = {
+            "total_faces": len(faces),
+            "emotions": emotion_counts if emotion_counts else {"neutral": 0}
+        }
+        self.scheduler.record_stage('annotate', time.perf_counter() - started)
+        summary_changed = self.summary_broadcaster.publish(self.emotion_summary)
+        frame_encoded = self.broadcaster.publish(frame)
+        if self.state is not None and (summary_changed or frame_encoded):
+            self._mirror_state(summary_changed, frame_encoded)
+        previous, self.processed_frame = self.processed_frame, frame
+        if previous is not frame:
+            self.buffer_pool.release(previous)
+
+    def _mirror_state(self, summary_changed, frame_encoded):
+        try:
+            if summary_changed:
+                self.state.set_summary(self.state_key, self.emotion_summary)
+            if frame_encoded:
+                self.state.set_frame(self.state_key, self.broadcaster.jpeg)
+        except Exception as e:
+            logger.warning(f"Live state update failed: {e}")
 
     def generate_frames(self):
-        while self.is_running:
-            if self.processed_frame is not None:
-                ret, buffer = cv2.imencode('.jpg', self.processed_frame)
-                frame = buffer.tobytes()
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(0.01)
\ No newline at end of file
+        yield from self.broadcaster.stream()
+
+    def pipeline_stats(self):
+        return {
+            **self.scheduler.stats(),
+            "emotion_cache": self.emotion_cache.stats(),
+            "frame_buffers": self.buffer_pool.stats()
+        }
+
+    def generate_summary_events(self, min_interval=None):
+        yield from self.summary_broadcaster.stream(min_interval)
\ No newline at end of file
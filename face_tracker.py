@@ -0,0 +1,156 @@
+import itertools
+import cv2
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+class Track:
+    def __init__(self, track_id, box, frame_index, use_kalman=False):
+        self.id = track_id
+        self.box = box
+        self.emotion = None
+        self.confidence = None
+        self.probs = None
+        self.smoothed = None
+        self.crop_hash = None
+        self.skips = 0
+        self.hits = 1
+        self.misses = 0
+        self.first_seen = frame_index
+        self.last_seen = frame_index
+        self.last_inference = None
+        self.predicted = self.centroid
+        self.kalman = self._create_kalman() if use_kalman else None
+
+    @property
+    def centroid(self):
+        x, y, w, h = self.box
+        return np.array([x + w / 2, y + h / 2], dtype=np.float32)
+
+    def _create_kalman(self):
+        # Constant-velocity model over the box centre
+        kalman = cv2.KalmanFilter(4, 2)
+        kalman.transitionMatrix = np.array(
+            [[1, 0, 1, 0], [0, 1, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float32
+        )
+        kalman.measurementMatrix = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float32)
+        kalman.processNoiseCov = np.eye(4, dtype=np.float32) * 1e-2
+        kalman.measurementNoiseCov = np.eye(2, dtype=np.float32) * 1e-1
+        kalman.statePost = np.array([[self.predicted[0]], [self.predicted[1]], [0], [0]], dtype=np.float32)
+        return kalman
+
+    def predict(self):
+        if self.kalman is not None:
+            self.predicted = self.kalman.predict()[:2, 0].copy()
+        else:
+            self.predicted = self.centroid
+        return self.predicted
+
+    def predicted_box(self):
+        x, y, w, h = self.box
+        dx, dy = self.predicted - self.centroid
+        return np.array([x + dx, y + dy, w, h], dtype=np.float32)
+
+    def update(self, box, frame_index):
+        self.box = box
+        self.hits += 1
+        self.misses = 0
+        self.last_seen = frame_index
+        if self.kalman is not None:
+            self.kalman.correct(self.centroid.reshape(2, 1))
+
+def centroid_distances(boxes_a, boxes_b):
+    centres_a = boxes_a[:, :2] + boxes_a[:, 2:] / 2
+    centres_b = boxes_b[:, :2] + boxes_b[:, 2:] / 2
+    return np.linalg.norm(centres_a[:, None, :] - centres_b[None, :, :], axis=2)
+
+def iou_matrix(boxes_a, boxes_b):
+    a1, a2 = boxes_a[:, None, :2], boxes_a[:, None, :2] + boxes_a[:, None, 2:]
+    b1, b2 = boxes_b[None, :, :2], boxes_b[None, :, :2] + boxes_b[None, :, 2:]
+    inter = np.clip(np.minimum(a2, b2) - np.maximum(a1, b1), 0, None).prod(axis=2)
+    area_a = boxes_a[:, 2:].prod(axis=1)[:, None]
+    area_b = boxes_b[:, 2:].prod(axis=1)[None, :]
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+def assign(cost, valid):
+    if cost.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(np.where(valid, cost, 1e9))
+        keep = valid[rows, cols]
+        return rows[keep], cols[keep]
+
+    # Greedy fallback: take the cheapest valid pairs first
+    rows, cols = np.nonzero(valid)
+    order = np.argsort(cost[rows, cols], kind='stable')
+    used_rows, used_cols, matched = set(), set(), []
+    for r, c in zip(rows[order], cols[order]):
+        if r not in used_rows and c not in used_cols:
+            used_rows.add(r)
+            used_cols.add(c)
+            matched.append((r, c))
+    matched = np.array(matched, dtype=np.intp).reshape(-1, 2)
+    return matched[:, 0], matched[:, 1]
+
+class FaceTracker:
+    def __init__(self, metric='centroid', max_distance=75, min_iou=0.3, max_missed=10,
+                 reinfer_interval=30, use_kalman=False):
+        if metric not in ('centroid', 'iou'):
+            raise ValueError(f"Unknown tracking metric '{metric}'")
+        self.metric = metric
+        self.max_distance = max_distance
+        self.min_iou = min_iou
+        self.max_missed = max_missed
+        self.reinfer_interval = reinfer_interval
+        self.use_kalman = use_kalman
+        self.reset()
+
+    def reset(self):
+        self.tracks = {}
+        self.frame_index = 0
+        self._ids = itertools.count(1)
+
+    def _match(self, boxes, tracks):
+        predicted = np.array([track.predicted_box() for track in tracks], dtype=np.float32).reshape(-1, 4)
+        if self.metric == 'iou':
+            iou = iou_matrix(boxes, predicted)
+            return assign(1.0 - iou, iou >= self.min_iou)
+        distances = centroid_distances(boxes, predicted)
+        return assign(distances, distances <= self.max_distance)
+
+    def update(self, boxes):
+        self.frame_index += 1
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        tracks = list(self.tracks.values())
+        for track in tracks:
+            track.predict()
+
+        rows, cols = self._match(boxes, tracks)
+        matched = [None] * len(boxes)
+        for r, c in zip(rows, cols):
+            tracks[c].update(boxes[r], self.frame_index)
+            matched[r] = tracks[c]
+
+        seen = set(int(c) for c in cols)
+        for i, track in enumerate(tracks):
+            if i not in seen:
+                track.misses += 1
+                if track.misses > self.max_missed:
+                    del self.tracks[track.id]
+
+        for r, track in enumerate(matched):
+            if track is None:
+                track = Track(next(self._ids), boxes[r], self.frame_index, self.use_kalman)
+                self.tracks[track.id] = track
+                matched[r] = track
+        return matched
+
+    def needs_inference(self, track):
+        return (track.last_inference is None
+                or self.frame_index - track.last_inference >= self.reinfer_interval)
+
+    def mark_inferred(self, track):
+        track.last_inference = self.frame_index
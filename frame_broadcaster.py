@@ -0,0 +1,200 @@
+import json
+import asyncio
+import threading
+import time
+from frame_buffers import ScratchBuffer
+from metrics import STAGE_SECONDS
+
+_ENCODE_SECONDS = STAGE_SECONDS.labels('encode')
+
+class AsyncWaiters:
+    # Wakes asyncio subscribers from the publishing thread: one call_soon_threadsafe
+    # per event loop, however many viewers that loop is serving
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}
+
+    def add(self):
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        with self.lock:
+            self.events.setdefault(loop, set()).add(event)
+        return loop, event
+
+    def remove(self, waiter):
+        loop, event = waiter
+        with self.lock:
+            events = self.events.get(loop)
+            if events is not None:
+                events.discard(event)
+                if not events:
+                    del self.events[loop]
+
+    def notify(self):
+        with self.lock:
+            targets = [(loop, tuple(events)) for loop, events in self.events.items()]
+        for loop, events in targets:
+            try:
+                loop.call_soon_threadsafe(_set_all, events)
+            except RuntimeError:
+                # The loop has already shut down
+                pass
+
+def _set_all(events):
+    for event in events:
+        event.set()
+
+def frame_part(sequence, jpeg):
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            b'X-Frame-Sequence: ' + str(sequence).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+
+class FrameBroadcaster:
+    def __init__(self, jpeg_quality=80, max_fps=15, output_size=None):
+        self.jpeg_quality = jpeg_quality
+        self.max_fps = max_fps
+        self.output_size = tuple(output_size) if output_size else None
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.jpeg = None
+        self.closed = False
+        self._last_publish = 0.0
+        self._resize_buffer = ScratchBuffer()
+        self.async_waiters = AsyncWaiters()
+
+    def publish(self, frame):
+        # Each processed frame is encoded once here and shared by every subscriber.
+        # OpenCV is imported here so web workers can use frame_part without it
+        import cv2
+
+        now = time.monotonic()
+        if self.max_fps and now - self._last_publish < 1.0 / self.max_fps:
+            return False
+        started = time.perf_counter()
+        if self.output_size and (frame.shape[1], frame.shape[0]) != self.output_size:
+            dst = self._resize_buffer.get((self.output_size[1], self.output_size[0]) + frame.shape[2:])
+            frame = cv2.resize(frame, self.output_size, dst=dst, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        _ENCODE_SECONDS.observe(time.perf_counter() - started)
+        if not ok:
+            return False
+        with self.condition:
+            self.sequence += 1
+            self.jpeg = buffer.tobytes()
+            self._last_publish = now
+            self.condition.notify_all()
+        self.async_waiters.notify()
+        return True
+
+    def wait(self, last_sequence, timeout=1.0):
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence or self.closed, timeout)
+            return self.sequence, self.jpeg
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.async_waiters.notify()
+
+    def stream(self):
+        sequence = 0
+        while not self.closed:
+            latest, jpeg = self.wait(sequence)
+            if latest == sequence or jpeg is None:
+                continue
+            sequence = latest
+            yield frame_part(sequence, jpeg)
+
+    async def astream(self):
+        # Async twin of stream() for the ASGI server: a viewer costs an asyncio.Event, not a thread
+        waiter = self.async_waiters.add()
+        _, event = waiter
+        try:
+            sequence = 0
+            while not self.closed:
+                event.clear()
+                latest, jpeg = self.sequence, self.jpeg
+                if latest == sequence or jpeg is None:
+                    try:
+                        await asyncio.wait_for(event.wait(), 1.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                sequence = latest
+                yield frame_part(sequence, jpeg)
+        finally:
+            self.async_waiters.remove(waiter)
+
+class SummaryBroadcaster:
+    def __init__(self, min_interval=0.25, heartbeat=15.0):
+        self.min_interval = min_interval
+        self.heartbeat = heartbeat
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.summary = None
+        self.closed = False
+        self.async_waiters = AsyncWaiters()
+
+    def publish(self, summary):
+        with self.condition:
+            if summary == self.summary:
+                return False
+            self.sequence += 1
+            self.summary = summary
+            self.condition.notify_all()
+        self.async_waiters.notify()
+        return True
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.async_waiters.notify()
+
+    def stream(self, min_interval=None):
+        # Server-Sent Events; updates arriving within min_interval are coalesced into the latest one
+        min_interval = self.min_interval if min_interval is None else min_interval
+        sequence = 0
+        while not self.closed:
+            with self.condition:
+                self.condition.wait_for(lambda: self.sequence != sequence or self.closed, self.heartbeat)
+                latest, summary = self.sequence, self.summary
+            if self.closed:
+                break
+            if latest == sequence:
+                yield ': keep-alive\n\n'
+                continue
+            sequence = latest
+            yield f'id: {sequence}\ndata: {json.dumps(summary)}\n\n'
+            if min_interval:
+                time.sleep(min_interval)
+        yield 'event: end\ndata: {}\n\n'
+
+    async def astream(self, min_interval=None):
+        min_interval = self.min_interval if min_interval is None else min_interval
+        waiter = self.async_waiters.add()
+        _, event = waiter
+        try:
+            sequence = 0
+            while not self.closed:
+                event.clear()
+                if self.sequence == sequence:
+                    try:
+                        await asyncio.wait_for(event.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield ': keep-alive\n\n'
+                        continue
+                    if self.closed:
+                        break
+                with self.condition:
+                    latest, summary = self.sequence, self.summary
+                if latest == sequence:
+                    continue
+                sequence = latest
+                yield f'id: {sequence}\ndata: {json.dumps(summary)}\n\n'
+                if min_interval:
+                    await asyncio.sleep(min_interval)
+            yield 'event: end\ndata: {}\n\n'
+        finally:
+            self.async_waiters.remove(waiter)
@@ -0,0 +1,44 @@
+import collections
+import threading
+import numpy as np
+
+class FrameBufferPool:
+    def __init__(self, size=4, dtype=np.uint8):
+        self.size = size
+        self.dtype = dtype
+        self.free = collections.deque()
+        self.lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def acquire(self, shape):
+        with self.lock:
+            while self.free:
+                buffer = self.free.pop()
+                if buffer.shape == shape:
+                    self.reused += 1
+                    return buffer
+            self.allocated += 1
+        return np.empty(shape, dtype=self.dtype)
+
+    def release(self, buffer):
+        if buffer is None:
+            return
+        with self.lock:
+            if len(self.free) < self.size:
+                self.free.append(buffer)
+
+    def stats(self):
+        with self.lock:
+            return {"allocated": self.allocated, "reused": self.reused, "free": len(self.free)}
+
+class ScratchBuffer:
+    # A reusable array for cv2 dst= arguments; reallocated only when the shape changes
+    def __init__(self, dtype=np.uint8):
+        self.dtype = dtype
+        self.buffer = None
+
+    def get(self, shape):
+        if self.buffer is None or self.buffer.shape != shape:
+            self.buffer = np.empty(shape, dtype=self.dtype)
+        return self.buffer
@@ -0,0 +1,158 @@
+import threading
+import time
+import collections
+from metrics import STAGE_SECONDS, FRAMES_TOTAL, DETECTIONS_TOTAL, DETECTION_REGIONS_TOTAL
+
+_CAPTURED = FRAMES_TOTAL.labels('captured')
+_DROPPED = FRAMES_TOTAL.labels('dropped')
+_PROCESSED = FRAMES_TOTAL.labels('processed')
+_DETECT_FULL = DETECTIONS_TOTAL.labels('full')
+_DETECT_REGION = DETECTIONS_TOTAL.labels('region')
+_DETECT_SKIPPED = DETECTIONS_TOTAL.labels('skipped')
+
+class FrameScheduler:
+    def __init__(self, target_latency=0.2, max_detect_interval=5, min_reinfer_interval=10,
+                 max_reinfer_interval=120, adapt_every=10, smoothing=0.2, lag_window=1000):
+        self.target_latency = target_latency
+        self.max_detect_interval = max_detect_interval
+        self.min_reinfer_interval = min_reinfer_interval
+        self.max_reinfer_interval = max_reinfer_interval
+        self.adapt_every = adapt_every
+        self.smoothing = smoothing
+        self.lag_window = lag_window
+        self.condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        with self.condition:
+            self._frame = None
+            self._closed = False
+            self._since_detect = 0
+            self._since_adapt = 0
+            self.detect_interval = 1
+            self.reinfer_interval = self.min_reinfer_interval
+            self.captured = 0
+            self.dropped = 0
+            self.processed = 0
+            self.detected = 0
+            self.region_detected = 0
+            self.regions = 0
+            self.motion_skipped = 0
+            self.classified = 0
+            self.lag_ms = 0.0
+            self.lag_ema_ms = 0.0
+            # Recent per-frame lags, for percentiles
+            self.lag_samples = collections.deque(maxlen=self.lag_window)
+            self.stage_ms = {}
+
+    def put(self, frame, captured_at=None):
+        # Latest frame wins: an unconsumed frame is replaced, counted as dropped and
+        # handed back so the caller can recycle its buffer
+        with self.condition:
+            replaced = self._frame[1] if self._frame is not None else None
+            if replaced is not None:
+                self.dropped += 1
+            self._frame = (captured_at if captured_at is not None else time.time(), frame)
+            self.captured += 1
+            self.condition.notify()
+        _CAPTURED.inc()
+        if replaced is not None:
+            _DROPPED.inc()
+        return replaced
+
+    def get(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self._frame is not None or self._closed, timeout)
+            item, self._frame = self._frame, None
+            return item
+
+    def close(self):
+        with self.condition:
+            self._closed = True
+            self.condition.notify_all()
+
+    def should_detect(self):
+        self._since_detect += 1
+        if self._since_detect >= self.detect_interval:
+            self._since_detect = 0
+            return True
+        return False
+
+    def record_detection(self, regions=None):
+        # regions=None is a full-frame detection; [] means the motion gate skipped it
+        if regions is None:
+            self.detected += 1
+            _DETECT_FULL.inc()
+        elif regions:
+            self.region_detected += 1
+            self.regions += len(regions)
+            _DETECT_REGION.inc()
+            DETECTION_REGIONS_TOTAL.inc(len(regions))
+        else:
+            self.motion_skipped += 1
+            _DETECT_SKIPPED.inc()
+
+    def record_dropped(self):
+        # Called from ingest threads, racing put() on the same counter
+        with self.condition:
+            self.dropped += 1
+        _DROPPED.inc()
+
+    def record_stage(self, stage, seconds):
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        previous = self.stage_ms.get(stage)
+        value = seconds * 1000
+        self.stage_ms[stage] = value if previous is None else previous + self.smoothing * (value - previous)
+
+    def record_classified(self, count):
+        self.classified += count
+
+    def complete(self, captured_at):
+        self.processed += 1
+        _PROCESSED.inc()
+        self.lag_ms = (time.time() - captured_at) * 1000
+        self.lag_samples.append(self.lag_ms)
+        self.lag_ema_ms += self.smoothing * (self.lag_ms - self.lag_ema_ms)
+        self._since_adapt += 1
+        if self._since_adapt >= self.adapt_every:
+            self._since_adapt = 0
+            self._adapt()
+
+    def _adapt(self):
+        # Shed detection work first, then classification; give it back in reverse order
+        target_ms = self.target_latency * 1000
+        if self.lag_ema_ms > target_ms:
+            if self.detect_interval < self.max_detect_interval:
+                self.detect_interval += 1
+            else:
+                self.reinfer_interval = min(self.max_reinfer_interval, int(self.reinfer_interval * 1.5))
+        elif self.lag_ema_ms < target_ms / 2:
+            if self.reinfer_interval > self.min_reinfer_interval:
+                self.reinfer_interval = max(self.min_reinfer_interval, int(self.reinfer_interval / 1.5))
+            elif self.detect_interval > 1:
+                self.detect_interval -= 1
+
+    def lag_percentile(self, percentile):
+        samples = sorted(self.lag_samples)
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def stats(self):
+        return {
+            "captured": self.captured,
+            "dropped": self.dropped,
+            "processed": self.processed,
+            "detected": self.detected,
+            "region_detected": self.region_detected,
+            "regions": self.regions,
+            "motion_skipped": self.motion_skipped,
+            "classified": self.classified,
+            "lag_ms": round(self.lag_ms, 1),
+            "lag_ema_ms": round(self.lag_ema_ms, 1),
+            "lag_p50_ms": round(self.lag_percentile(50), 1),
+            "lag_p95_ms": round(self.lag_percentile(95), 1),
+            "detect_interval": self.detect_interval,
+            "reinfer_interval": self.reinfer_interval,
+            "stage_ms": {stage: round(ms, 2) for stage, ms in self.stage_ms.items()}
+        }
@@ -0,0 +1,113 @@
+import os
+import queue
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Per-process state, populated by _init_worker in each pool process
+_worker = {}
+
+def _init_worker(detector_engine, detector_options, classifier_engine, classifier_options):
+    from emotion_classifier import create_classifier
+    from face_detectors import create_detector
+
+    _worker['detector'] = create_detector(detector_engine, **detector_options)
+    _worker['classifier'] = create_classifier(classifier_engine, **classifier_options)
+    _worker['classifier'].load()
+    _worker['segments'] = {}
+    logger.info(f"Inference worker {os.getpid()} ready")
+
+def _attach(name, shape, dtype):
+    segment = _worker['segments'].get(name)
+    if segment is None:
+        segment = shared_memory.SharedMemory(name=name)
+        # The parent owns the segment; stop this process's tracker from unlinking it on exit
+        resource_tracker.unregister(segment._name, 'shared_memory')
+        _worker['segments'][name] = segment
+    return np.ndarray(shape, dtype=dtype, buffer=segment.buf)
+
+def _detect_job(name, shape, dtype):
+    frame = _attach(name, shape, dtype)
+    return _worker['detector'].detect(frame)
+
+def _classify_job(name, shape, dtype, boxes):
+    import cv2
+
+    frame = _attach(name, shape, dtype)
+    rois = [cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY) for (x, y, w, h) in boxes]
+    return _worker['classifier'].predict_proba(rois)
+
+class FrameJob:
+    def __init__(self, pool, slot, shape, dtype, detect=True):
+        self.pool = pool
+        self.slot = slot
+        self.shape = shape
+        self.dtype = dtype
+        # Without detection the job only classifies boxes the caller already has
+        self.detections = pool.executor.submit(_detect_job, slot.name, shape, dtype) if detect else None
+
+    def classify(self, boxes):
+        future = self.pool.executor.submit(_classify_job, self.slot.name, self.shape, self.dtype, boxes)
+        future.add_done_callback(lambda _: self.release())
+        return future
+
+    def release(self):
+        if self.slot is not None:
+            self.pool.free_slots.put(self.slot)
+            self.slot = None
+
+class ProcessInferencePool:
+    def __init__(self, workers=None, detector_engine='haar', detector_options=None,
+                 slot_bytes=None, slot_count=None, start_method='spawn', classifier_engine='deepface',
+                 classifier_options=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = self.workers
+        # Slots are sized from the first frame unless slot_bytes is given, so /dev/shm
+        # only holds what the capture resolution needs
+        self.slot_bytes = slot_bytes
+        self.slot_count = slot_count or self.workers * 2 + 2
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(detector_engine, detector_options or {}, classifier_engine, classifier_options or {})
+        )
+
+        # Frames travel through shared-memory slots instead of being pickled
+        self.slots = []
+        self.free_slots = queue.Queue()
+        self._slots_lock = threading.Lock()
+
+    def _allocate_slots(self, frame_bytes):
+        with self._slots_lock:
+            if self.slots:
+                return
+            self.slot_bytes = self.slot_bytes or frame_bytes
+            self.slots = [
+                shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+                for _ in range(self.slot_count)
+            ]
+            for slot in self.slots:
+                self.free_slots.put(slot)
+            logger.info(f"Allocated {self.slot_count} shared frame slots of {self.slot_bytes} bytes")
+
+    def submit(self, frame, timeout=None, detect=True):
+        # Raises queue.Empty when no slot frees up within timeout
+        if not self.slots:
+            self._allocate_slots(frame.nbytes)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the {self.slot_bytes} byte slot size")
+        slot = self.free_slots.get(timeout=timeout)
+        np.ndarray(frame.shape, dtype=frame.dtype, buffer=slot.buf)[...] = frame
+        return FrameJob(self, slot, frame.shape, frame.dtype.str, detect)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for slot in self.slots:
+            slot.close()
+            slot.unlink()
@@ -0,0 +1,28 @@
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Owns cameras and models for web workers running with PROCESS_ROLE=web:
+#   LIVE_STATE_URL=redis://localhost:6379/0 python inference_worker.py
+# Importing app starts the model warmup and the session command listener.
+def main():
+    if not os.environ.get("LIVE_STATE_URL"):
+        raise SystemExit("inference_worker.py needs a shared LIVE_STATE_URL")
+    os.environ["PROCESS_ROLE"] = "all"
+    # Imported here, not at module level, so spawned inference processes that
+    # re-import this script as __mp_main__ do not start a second listener
+    from app import local_sessions
+
+    logger.info("Inference worker ready")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        local_sessions.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import os
+import json
+import time
+import queue
+import socket
+import threading
+
+# Identifies the process that owns a live session in the shared state
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Published on a session's channels when it ends
+END = b""
+
+FRAME_TTL = 10.0
+
+class Subscription:
+    def get(self, timeout=None):
+        raise NotImplementedError
+
+    def latest(self, timeout=None):
+        # Waits for one message, then drains the backlog so slow readers skip to the newest
+        message = self.get(timeout)
+        while message is not None and message != END:
+            newer = self.get(0)
+            if newer is None:
+                break
+            message = newer
+        return message
+
+    def close(self):
+        raise NotImplementedError
+
+class LiveState:
+    # Live session data keyed by user: ownership, the latest summary and encoded frame,
+    # plus pub/sub so readers in other processes are pushed updates
+    shared = False
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def claim(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def keys(self, prefix):
+        raise NotImplementedError
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+    def subscribe(self, channel):
+        raise NotImplementedError
+
+    def set_and_publish(self, key, value, ttl=None):
+        self.set(key, value, ttl)
+        self.publish(key, value)
+
+    def set_session(self, user_key, info, ttl=None):
+        self.set(f"session:{user_key}", json.dumps(info), ttl)
+
+    def claim_session(self, user_key, info, ttl=None):
+        return self.claim(f"session:{user_key}", json.dumps(info), ttl)
+
+    def get_session(self, user_key):
+        raw = self.get(f"session:{user_key}")
+        return json.loads(raw) if raw else None
+
+    def delete_session(self, user_key):
+        for key in (f"session:{user_key}", f"summary:{user_key}", f"frame:{user_key}"):
+            self.delete(key)
+        self.publish(f"summary:{user_key}", END)
+        self.publish(f"frame:{user_key}", END)
+
+    def session_keys(self):
+        return [key.split(":", 1)[1] for key in self.keys("session:")]
+
+    def set_summary(self, user_key, summary):
+        self.set_and_publish(f"summary:{user_key}", json.dumps(summary))
+
+    def get_summary(self, user_key):
+        raw = self.get(f"summary:{user_key}")
+        return json.loads(raw) if raw else None
+
+    def set_frame(self, user_key, jpeg):
+        self.set_and_publish(f"frame:{user_key}", jpeg, FRAME_TTL)
+
+    def get_frame(self, user_key):
+        return self.get(f"frame:{user_key}")
+
+class _LocalSubscription(Subscription):
+    def __init__(self, state, channel, max_backlog=64):
+        self.state = state
+        self.channel = channel
+        self.queue = queue.Queue(maxsize=max_backlog)
+
+    def put(self, message):
+        # A full backlog drops its oldest message rather than blocking the publisher
+        while True:
+            try:
+                self.queue.put_nowait(message)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        try:
+            if timeout == 0:
+                return self.queue.get_nowait()
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.state._unsubscribe(self)
+
+class InProcessState(LiveState):
+    # Default backend: enough for a single process, where readers could use the detector directly
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.expires = {}
+        self.subscribers = {}
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.values[key] = value
+            if ttl:
+                self.expires[key] = time.monotonic() + ttl
+            else:
+                self.expires.pop(key, None)
+
+    def claim(self, key, value, ttl=None):
+        with self.lock:
+            if self._alive(key):
+                return False
+            self.values[key] = value
+            if ttl:
+                self.expires[key] = time.monotonic() + ttl
+            return True
+
+    def get(self, key):
+        with self.lock:
+            return self.values.get(key) if self._alive(key) else None
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+
+    def keys(self, prefix):
+        with self.lock:
+            return [key for key in list(self.values) if key.startswith(prefix) and self._alive(key)]
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(message)
+
+    def subscribe(self, channel):
+        subscription = _LocalSubscription(self, channel)
+        with self.lock:
+            self.subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.channel]
+
+class _RedisSubscription(Subscription):
+    def __init__(self, client, channel):
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def get(self, timeout=None):
+        # get_message returns None for the subscribe acknowledgement and other control
+        # messages as well as on timeout, so keep reading until data or the deadline
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = 1.0 if deadline is None else max(deadline - time.monotonic(), 0)
+            message = self.pubsub.get_message(timeout=remaining)
+            if message is not None and message['type'] in ('message', 'pmessage'):
+                return message['data']
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+
+    def close(self):
+        self.pubsub.close()
+
+class RedisState(LiveState):
+    # Works against any Redis-compatible server, or fakeredis in tests
+    shared = True
+
+    def __init__(self, client=None, url=None, prefix='fed:'):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise ImportError("redis is required for a redis:// LIVE_STATE_URL") from e
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def claim(self, key, value, ttl=None):
+        return bool(self.client.set(self.prefix + key, value, nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def keys(self, prefix):
+        start = len(self.prefix)
+        return [key.decode()[start:] for key in self.client.scan_iter(match=f"{self.prefix}{prefix}*")]
+
+    def publish(self, channel, message):
+        self.client.publish(self.prefix + channel, message)
+
+    def subscribe(self, channel):
+        return _RedisSubscription(self.client, self.prefix + channel)
+
+    def set_and_publish(self, key, value, ttl=None):
+        # One round trip for the value and its notification
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+        pipeline.publish(self.prefix + key, value)
+        pipeline.execute()
+
+def _offer(viewer_queue, message):
+    # Viewers only want the newest message, so a full queue gives up its oldest
+    if viewer_queue.full():
+        viewer_queue.get_nowait()
+    viewer_queue.put_nowait(message)
+
+class AsyncRelay:
+    # Fans one blocking subscription per channel out to asyncio viewers, so a session
+    # watched from an event loop costs one thread per process, not one per viewer
+    def __init__(self, state, poll_interval=1.0):
+        self.state = state
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def add(self, channel, viewer):
+        # viewer is a (loop, asyncio.Queue) pair; subscribes before returning, so a
+        # value read afterwards is never older than the first message relayed
+        with self.lock:
+            viewers = self.channels.get(channel)
+            if viewers is not None:
+                viewers.add(viewer)
+                return
+            self.channels[channel] = {viewer}
+        subscription = self.state.subscribe(channel)
+        threading.Thread(target=self._run, args=(channel, subscription), daemon=True,
+                         name=f"relay-{channel}").start()
+
+    def remove(self, channel, viewer):
+        # The channel's thread exits at its next poll once nobody is left
+        with self.lock:
+            viewers = self.channels.get(channel)
+            if viewers is not None:
+                viewers.discard(viewer)
+
+    def _run(self, channel, subscription):
+        try:
+            while True:
+                message = subscription.get(timeout=self.poll_interval)
+                with self.lock:
+                    viewers = self.channels.get(channel)
+                    if not viewers:
+                        self.channels.pop(channel, None)
+                        return
+                    viewers = list(viewers)
+                if message is None:
+                    continue
+                for loop, viewer_queue in viewers:
+                    try:
+                        loop.call_soon_threadsafe(_offer, viewer_queue, message)
+                    except RuntimeError:
+                        # The viewer's loop has already shut down
+                        pass
+        finally:
+            subscription.close()
+
+def create_state(url=None):
+    if not url or url == 'memory://':
+        return InProcessState()
+    if url.startswith('fakeredis://'):
+        import fakeredis
+        return RedisState(client=fakeredis.FakeRedis())
+    return RedisState(url=url)
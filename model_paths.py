@@ -0,0 +1,5 @@
+import os
+
+# Model files shared by the detectors and classifiers; kept apart so either can be
+# imported without pulling in the other's dependencies
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+from frame_buffers import ScratchBuffer
+
+class MotionGate:
+    # Frame differencing on a small blurred grayscale copy of each frame, against the
+    # reference the current face boxes were detected on. Static frames skip detection,
+    # small changes are detected region by region, and every refresh_interval gated
+    # frames a full detection runs anyway so drift stays bounded
+    def __init__(self, size=(80, 60), threshold=20, min_area=3, max_changed=0.3, max_regions=4,
+                 margin=0.15, refresh_interval=50):
+        self.size = tuple(size)
+        self.threshold = threshold
+        self.min_area = min_area
+        self.max_changed = max_changed
+        self.max_regions = max_regions
+        self.margin = margin
+        self.refresh_interval = refresh_interval
+        self._kernel = np.ones((3, 3), dtype=np.uint8)
+        self._small = ScratchBuffer()
+        self._diff = ScratchBuffer()
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.current = None
+        self.since_refresh = 0
+
+    def _downsample(self, frame):
+        width, height = self.size
+        small = cv2.resize(frame, self.size, dst=self._small.get((height, width) + frame.shape[2:]),
+                           interpolation=cv2.INTER_AREA)
+        # A fresh array, because it becomes the reference once detection runs
+        gray = small.copy() if small.ndim == 2 else cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0, dst=gray)
+
+    def check(self, frame, boxes):
+        # None: detect the whole frame. []: nothing changed, carry the boxes forward.
+        # Otherwise a list of (x, y, w, h) regions in frame coordinates to detect in
+        self.current = self._downsample(frame)
+        self.since_refresh += 1
+        if self.reference is None or self.since_refresh >= self.refresh_interval:
+            return None
+
+        diff = cv2.absdiff(self.current, self.reference, dst=self._diff.get(self.current.shape))
+        cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY, dst=diff)
+        changed = cv2.countNonZero(diff)
+        if changed == 0:
+            return []
+        if changed > self.max_changed * diff.size:
+            return None
+
+        cv2.dilate(diff, self._kernel, dst=diff)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(diff, connectivity=8)
+        components = stats[1:][stats[1:, cv2.CC_STAT_AREA] >= self.min_area]
+        if len(components) == 0:
+            return []
+        if len(components) > self.max_regions:
+            return None
+
+        frame_h, frame_w = frame.shape[:2]
+        scale_x, scale_y = frame_w / self.size[0], frame_h / self.size[1]
+        regions = []
+        for x, y, w, h in components[:, :4]:
+            x1, y1 = x * scale_x, y * scale_y
+            x2, y2 = (x + w) * scale_x, (y + h) * scale_y
+            # Grow to cover any face the change touches, so it is re-detected whole
+            for bx, by, bw, bh in boxes:
+                if bx < x2 and bx + bw > x1 and by < y2 and by + bh > y1:
+                    x1, y1 = min(x1, bx), min(y1, by)
+                    x2, y2 = max(x2, bx + bw), max(y2, by + bh)
+            pad = self.margin * max(x2 - x1, y2 - y1)
+            regions.append([max(x1 - pad, 0), max(y1 - pad, 0), min(x2 + pad, frame_w), min(y2 + pad, frame_h)])
+        regions = _merge(regions)
+        if sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in regions) > self.max_changed * frame_w * frame_h:
+            return None
+        return [(int(x1), int(y1), int(round(x2 - x1)), int(round(y2 - y1))) for x1, y1, x2, y2 in regions]
+
+    def commit(self, frame_shape, regions=None):
+        # Called after detection: the reference follows the pixels the boxes came from
+        if regions is None or self.reference is None:
+            self.reference = self.current
+            self.since_refresh = 0
+            return
+        frame_h, frame_w = frame_shape[:2]
+        scale_x, scale_y = self.size[0] / frame_w, self.size[1] / frame_h
+        for x, y, w, h in regions:
+            x1, y1 = int(x * scale_x), int(y * scale_y)
+            x2, y2 = int(np.ceil((x + w) * scale_x)), int(np.ceil((y + h) * scale_y))
+            self.reference[y1:y2, x1:x2] = self.current[y1:y2, x1:x2]
+
+def _merge(regions):
+    # Overlapping regions are detected once, as their union
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return regions
+
+def overlaps(box, regions):
+    x, y, w, h = box
+    return any(x < rx + rw and x + w > rx and y < ry + rh and y + h > ry for rx, ry, rw, rh in regions)
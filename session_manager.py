@@ -0,0 +1,438 @@
+import os
+import json
+import uuid
+import threading
+import time
+import asyncio
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from emotion_log_writer import EmotionLogWriter
+from live_state import NODE_ID, END, AsyncRelay
+from frame_broadcaster import frame_part
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Capture source for sessions whose frames are uploaded by the browser
+BROWSER_SOURCE = 'browser'
+
+class SessionLimitError(Exception):
+    pass
+
+def parse_capture_source(source):
+    # Device indices arrive as ints or digit strings; BROWSER_SOURCE means uploaded
+    # frames and anything else is a URL or file path
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+class SessionManager:
+    def __init__(self, max_sessions=4, inference_workers=None, detector_engine='haar', detector_options=None,
+                 inference_backend='thread', stream_options=None, summary_interval=0.25, log_writer=None,
+                 scheduler_options=None, classifier_engine='deepface', classifier_options=None,
+                 decode_workers=2, max_pending_decodes=2, state=None, session_ttl=10.0, motion_options=None,
+                 process_pool_options=None):
+        if inference_backend not in ('thread', 'process'):
+            raise ValueError(f"Unknown inference backend '{inference_backend}'")
+        self.max_sessions = max_sessions
+        self.detector_engine = detector_engine
+        self.detector_options = detector_options or {}
+        self.inference_backend = inference_backend
+        self.stream_options = stream_options or {}
+        self.summary_interval = summary_interval
+        # Every stream feeds the same batched emotion_logs writer
+        self.log_writer = log_writer or EmotionLogWriter()
+        self.scheduler_options = scheduler_options or {}
+        self.classifier_engine = classifier_engine
+        self.classifier_options = classifier_options or {}
+        self.motion_options = motion_options
+        self.process_pool_options = process_pool_options or {}
+        # The process backend classifies in its workers and needs no thread pool
+        self.inference_pool = None if inference_backend == 'process' else ThreadPoolExecutor(
+            max_workers=inference_workers or os.cpu_count() or 1,
+            thread_name_prefix='inference'
+        )
+        self.inference_workers = inference_workers
+        # cv2.imdecode releases the GIL, so uploaded frames decode in parallel with inference
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix='frame-decode')
+        self.max_pending_decodes = max_pending_decodes
+        # Created on first use so importing the app never spawns worker processes
+        self.process_pool = None
+        # One emotion model shared by every stream; OpenCV and TensorFlow are only
+        # imported once a session starts or warmup() runs
+        self.classifier = None
+        self._model_lock = threading.Lock()
+        self.detectors = {}
+        self.lock = threading.Lock()
+        # Session ownership and info are recorded in the live state; with a shared
+        # backend, serve_commands() lets web workers elsewhere drive this process
+        self.state = state
+        self.session_ttl = session_ttl
+        self._serving = None
+
+    def _get_classifier(self):
+        with self._model_lock:
+            if self.classifier is None:
+                from emotion_classifier import create_classifier
+                self.classifier = create_classifier(self.classifier_engine, **self.classifier_options)
+            return self.classifier
+
+    def warmup(self, background=True):
+        def load():
+            try:
+                started = time.perf_counter()
+                importlib.import_module('face_emotion')
+                self._get_classifier().load()
+                logger.info(f"Models warmed up in {time.perf_counter() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"Model warmup failed: {e}")
+
+        if not background:
+            load()
+            return None
+        thread = threading.Thread(target=load, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, key):
+        return self.detectors.get(key)
+
+    def items(self):
+        with self.lock:
+            return list(self.detectors.items())
+
+    def active_count(self):
+        with self.lock:
+            return len(self.detectors)
+
+    def _session_info(self, detector, stats=False):
+        browser = detector.source == BROWSER_SOURCE
+        info = {
+            "owner": NODE_ID,
+            "source": str(detector.source),
+            "capture": "browser" if browser else "server",
+            "frame_size": list(detector.face_detector.input_size) if browser else None,
+            "session_id": detector.session_id
+        }
+        if stats:
+            info["stats"] = detector.pipeline_stats()
+        return info
+
+    def describe(self, key):
+        detector = self.get(key)
+        return self._session_info(detector) if detector is not None else None
+
+    def start(self, key, user_id, source=0):
+        from face_emotion import EmotionDetector
+        from inference_pool import ProcessInferencePool
+
+        source = parse_capture_source(source)
+        with self.lock:
+            detector = self.detectors.get(key)
+            if detector is not None:
+                return detector.is_running
+            if len(self.detectors) >= self.max_sessions:
+                raise SessionLimitError(f"Maximum of {self.max_sessions} concurrent sessions reached")
+            if self.inference_backend == 'process' and self.process_pool is None:
+                self.process_pool = ProcessInferencePool(
+                    workers=self.inference_workers,
+                    detector_engine=self.detector_engine,
+                    detector_options=self.detector_options,
+                    classifier_engine=self.classifier_engine,
+                    classifier_options=self.classifier_options,
+                    **self.process_pool_options
+                )
+            detector = EmotionDetector(
+                detector_engine=self.detector_engine,
+                detector_options=self.detector_options,
+                classifier=self._get_classifier(),
+                inference_pool=self.inference_pool,
+                process_pool=self.process_pool,
+                stream_options=self.stream_options,
+                summary_interval=self.summary_interval,
+                log_writer=self.log_writer,
+                scheduler_options=self.scheduler_options,
+                decode_pool=self.decode_pool,
+                max_pending_decodes=self.max_pending_decodes,
+                state=self.state if self.state is not None and self.state.shared else None,
+                state_key=str(key),
+                motion_options=self.motion_options
+            )
+            self.detectors[key] = detector
+
+        if detector.start_session(user_id, source):
+            if self.state is not None:
+                self.state.set_session(key, self._session_info(detector),
+                                       self.session_ttl if self.state.shared else None)
+                if self.state.shared and source == BROWSER_SOURCE:
+                    threading.Thread(target=self._relay_ingest, args=(key, detector),
+                                     name=f'ingest-relay-{key}', daemon=True).start()
+            logger.info(f"Session {key} started on source {source!r} ({self.active_count()}/{self.max_sessions})")
+            return True
+        with self.lock:
+            self.detectors.pop(key, None)
+        return False
+
+    def stop(self, key):
+        with self.lock:
+            detector = self.detectors.pop(key, None)
+        if detector is None:
+            return False
+        detector.stop_session()
+        if self.state is not None:
+            self.state.delete_session(key)
+        return True
+
+    def _relay_ingest(self, key, detector):
+        # Frames uploaded to web workers in other processes arrive over pub/sub
+        subscription = self.state.subscribe(f"ingest:{key}")
+        try:
+            while detector.is_running:
+                data = subscription.get(timeout=1.0)
+                if data:
+                    detector.submit_frame(data)
+        finally:
+            subscription.close()
+
+    def serve_commands(self, heartbeat=1.0):
+        # Executes start/stop commands published by RemoteSessions and keeps the
+        # session records of this process alive while it is up
+        if self._serving is not None:
+            return self._serving
+        subscription = self.state.subscribe("commands")
+
+        def serve():
+            next_heartbeat = 0.0
+            while True:
+                message = subscription.get(timeout=max(next_heartbeat - time.monotonic(), 0.05))
+                if message:
+                    threading.Thread(target=self._handle_command, args=(json.loads(message),), daemon=True).start()
+                if time.monotonic() >= next_heartbeat:
+                    next_heartbeat = time.monotonic() + heartbeat
+                    for key, detector in self.items():
+                        try:
+                            self.state.set_session(key, self._session_info(detector, stats=True), self.session_ttl)
+                        except Exception as e:
+                            logger.warning(f"Session heartbeat failed: {e}")
+
+        self._serving = threading.Thread(target=serve, name='session-commands', daemon=True)
+        self._serving.start()
+        return self._serving
+
+    def _handle_command(self, command):
+        key = command["key"]
+        reply = None
+        try:
+            if command["op"] == "start":
+                # The NX claim makes exactly one inference process own each session
+                claimed = self.state.claim_session(key, {"owner": NODE_ID, "starting": True}, self.session_ttl)
+                if not claimed and self.get(key) is None:
+                    return
+                try:
+                    started = self.start(key, command["user_id"], command["source"])
+                    reply = {"ok": started, "info": self.describe(key)}
+                except SessionLimitError as e:
+                    reply = {"ok": False, "error": "limit", "message": str(e)}
+                if not reply["ok"]:
+                    self.state.delete_session(key)
+            elif command["op"] == "stop":
+                if self.get(key) is None:
+                    return
+                reply = {"ok": self.stop(key)}
+        except Exception as e:
+            logger.error(f"Session command {command['op']} for {key} failed: {e}")
+            reply = {"ok": False, "message": str(e)}
+        finally:
+            if reply is not None:
+                self.state.publish(f"reply:{command['id']}", json.dumps(reply))
+
+    def shutdown(self):
+        with self.lock:
+            keys = list(self.detectors)
+        for key in keys:
+            self.stop(key)
+        self.log_writer.stop()
+        if self.inference_pool is not None:
+            self.inference_pool.shutdown(wait=False)
+        self.decode_pool.shutdown(wait=False)
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+
+class RemoteView:
+    # Stands in for an EmotionDetector owned by another process, backed by the live state
+    def __init__(self, state, key, info, relay=None):
+        self.state = state
+        self.key = key
+        self.info = info
+        self.source = info["source"]
+        self.relay = relay
+
+    @property
+    def emotion_summary(self):
+        return self.state.get_summary(self.key) or {"total_faces": 0, "emotions": {}}
+
+    def pipeline_stats(self):
+        return self.info.get("stats", {})
+
+    def submit_frame(self, data):
+        # The owner's decode backpressure still applies; drops there are not reported back
+        self.state.publish(f"ingest:{self.key}", data)
+        return True
+
+    def _alive(self):
+        return self.state.get_session(self.key) is not None
+
+    def generate_frames(self):
+        subscription = self.state.subscribe(f"frame:{self.key}")
+        try:
+            sequence = 0
+            jpeg = self.state.get_frame(self.key)
+            while True:
+                if jpeg:
+                    sequence += 1
+                    yield frame_part(sequence, jpeg)
+                jpeg = subscription.latest(timeout=1.0)
+                if jpeg == END or (jpeg is None and not self._alive()):
+                    break
+        finally:
+            subscription.close()
+
+    def generate_summary_events(self, min_interval=None, heartbeat=15.0):
+        subscription = self.state.subscribe(f"summary:{self.key}")
+        try:
+            sequence = 0
+            summary = self.state.get_summary(self.key)
+            if summary is not None:
+                sequence += 1
+                yield f'id: {sequence}\ndata: {json.dumps(summary)}\n\n'
+            while True:
+                message = subscription.latest(timeout=heartbeat)
+                if message == END:
+                    break
+                if message is None:
+                    if not self._alive():
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+                sequence += 1
+                data = message.decode() if isinstance(message, bytes) else message
+                yield f'id: {sequence}\ndata: {data}\n\n'
+                if min_interval:
+                    time.sleep(min_interval)
+            yield 'event: end\ndata: {}\n\n'
+        finally:
+            subscription.close()
+
+    async def _next_message(self, viewer, timeout):
+        try:
+            return await asyncio.wait_for(viewer[1].get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def astream_frames(self):
+        # Async twins of the generators above for the ASGI server; the live state is
+        # blocking, so its reads go to a thread and its messages arrive through the relay
+        channel = f"frame:{self.key}"
+        viewer = (asyncio.get_running_loop(), asyncio.Queue(maxsize=1))
+        await asyncio.to_thread(self.relay.add, channel, viewer)
+        try:
+            sequence = 0
+            jpeg = await asyncio.to_thread(self.state.get_frame, self.key)
+            while True:
+                if jpeg:
+                    sequence += 1
+                    yield frame_part(sequence, jpeg)
+                jpeg = await self._next_message(viewer, 1.0)
+                if jpeg == END or (jpeg is None and not await asyncio.to_thread(self._alive)):
+                    break
+        finally:
+            self.relay.remove(channel, viewer)
+
+    async def astream_summary(self, min_interval=None, heartbeat=15.0):
+        channel = f"summary:{self.key}"
+        viewer = (asyncio.get_running_loop(), asyncio.Queue(maxsize=1))
+        await asyncio.to_thread(self.relay.add, channel, viewer)
+        try:
+            sequence = 0
+            summary = await asyncio.to_thread(self.state.get_summary, self.key)
+            if summary is not None:
+                sequence += 1
+                yield f'id: {sequence}\ndata: {json.dumps(summary)}\n\n'
+            while True:
+                message = await self._next_message(viewer, heartbeat)
+                if message == END:
+                    break
+                if message is None:
+                    if not await asyncio.to_thread(self._alive):
+                        break
+                    yield ': keep-alive\n\n'
+                    continue
+                sequence += 1
+                data = message.decode() if isinstance(message, bytes) else message
+                yield f'id: {sequence}\ndata: {data}\n\n'
+                if min_interval:
+                    await asyncio.sleep(min_interval)
+            yield 'event: end\ndata: {}\n\n'
+        finally:
+            self.relay.remove(channel, viewer)
+
+class RemoteSessions:
+    # SessionManager interface for web workers: sessions run in whichever process
+    # claims them through serve_commands(), and reads go to the shared live state
+    process_pool = None
+    log_writer = None
+
+    def __init__(self, state, start_timeout=30.0):
+        self.state = state
+        self.start_timeout = start_timeout
+        self.relay = AsyncRelay(state)
+
+    def get(self, key):
+        info = self.state.get_session(key)
+        if info is None or info.get("starting"):
+            return None
+        return RemoteView(self.state, key, info, self.relay)
+
+    def describe(self, key):
+        return self.state.get_session(key)
+
+    def items(self):
+        # Per-session detail is exported by the owning process
+        return []
+
+    def active_count(self):
+        return len(self.state.session_keys())
+
+    def _call(self, op, key, timeout, **fields):
+        command_id = uuid.uuid4().hex
+        subscription = self.state.subscribe(f"reply:{command_id}")
+        try:
+            self.state.publish("commands", json.dumps({"id": command_id, "op": op, "key": key, **fields}))
+            reply = subscription.get(timeout=timeout)
+        finally:
+            subscription.close()
+        return json.loads(reply) if reply else None
+
+    def start(self, key, user_id, source=0):
+        if self.get(key) is not None:
+            return True
+        reply = self._call("start", key, self.start_timeout, user_id=user_id, source=source)
+        if reply is None:
+            logger.error(f"No inference process answered the start command for session {key}")
+            return False
+        if reply.get("error") == "limit":
+            raise SessionLimitError(reply["message"])
+        return reply["ok"]
+
+    def stop(self, key):
+        if self.state.get_session(key) is None:
+            return False
+        reply = self._call("stop", key, 10.0)
+        return bool(reply and reply["ok"])
+
+    def warmup(self, background=True):
+        return None
+
+    def shutdown(self):
+        pass
@@ -0,0 +1,56 @@
+document.addEventListener("DOMContentLoaded", function () {
+    const container = document.querySelector(".chart-container");
+    if (!container) return;
+
+    function showFallbackImages(sessionId) {
+        // Server-rendered PNGs when Chart.js is unavailable
+        for (const kind of ["bar", "pie"]) {
+            const canvas = document.getElementById(`${kind}-chart`);
+            const img = document.createElement("img");
+            img.src = `/api/stats/chart.png?kind=${kind}&session_id=${encodeURIComponent(sessionId || "")}`;
+            img.alt = kind === "bar" ? "Emotion Distribution Bar Chart" : "Emotion Proportions Pie Chart";
+            canvas.replaceWith(img);
+        }
+    }
+
+    async function renderCharts() {
+        try {
+            const response = await fetch(container.dataset.statsUrl);
+            if (!response.ok) throw new Error("Failed to fetch stats");
+            const data = await response.json();
+
+            if (!window.Chart) {
+                showFallbackImages(data.session_id);
+                return;
+            }
+
+            const title = data.session_id ? `Emotion Distribution (Session #${data.session_id})` : "Emotion Distribution (All Sessions)";
+            new Chart(document.getElementById("bar-chart"), {
+                type: "bar",
+                data: {
+                    labels: data.emotions,
+                    datasets: [{ label: "Count", data: data.counts, backgroundColor: data.colors }],
+                },
+                options: {
+                    plugins: { title: { display: true, text: title }, legend: { display: false } },
+                    scales: { y: { beginAtZero: true, title: { display: true, text: "Count" } } },
+                },
+            });
+
+            if (data.counts.some((count) => count > 0)) {
+                new Chart(document.getElementById("pie-chart"), {
+                    type: "pie",
+                    data: {
+                        labels: data.emotions,
+                        datasets: [{ data: data.counts, backgroundColor: data.colors }],
+                    },
+                    options: { plugins: { title: { display: true, text: "Emotion Proportions" } } },
+                });
+            }
+        } catch (error) {
+            console.error("Chart rendering failed:", error);
+        }
+    }
+
+    renderCharts();
+});
@@ -4,6 +4,57 @@ document.addEventListener("DOMContentLoaded", function () {
     const videoStream = document.getElementById("video-stream");
     const summaryContent = document.getElementById("summary-content");
     let updateInterval;
+    let summarySource;
+    let captureStream;
+    let captureTimer;
+    let frameInFlight = false;
+
+    function frameType(canvas) {
+        // toBlob silently falls back to PNG for unsupported types, which the server rejects
+        return canvas.toDataURL("image/webp").startsWith("data:image/webp") ? "image/webp" : "image/jpeg";
+    }
+
+    async function startBrowserCapture(frameSize, maxFps) {
+        captureStream = await navigator.mediaDevices.getUserMedia({ video: { width: 640, height: 480 }, audio: false });
+        const video = document.createElement("video");
+        video.muted = true;
+        video.playsInline = true;
+        video.srcObject = captureStream;
+        await video.play();
+
+        // Frames are downscaled to the detector's input size before upload
+        const canvas = document.createElement("canvas");
+        [canvas.width, canvas.height] = frameSize;
+        const context = canvas.getContext("2d");
+        const type = frameType(canvas);
+        captureTimer = setInterval(() => {
+            // One upload in flight at a time; ticks that find one pending are skipped
+            if (frameInFlight) return;
+            frameInFlight = true;
+            context.drawImage(video, 0, 0, canvas.width, canvas.height);
+            canvas.toBlob(async (blob) => {
+                try {
+                    if (blob) {
+                        // 429 means the server dropped this frame; the next tick simply sends a newer one
+                        await fetch("/ingest_frame", { method: "POST", headers: { "Content-Type": blob.type }, body: blob });
+                    }
+                } catch (error) {
+                    console.error("Frame upload failed:", error);
+                } finally {
+                    frameInFlight = false;
+                }
+            }, type, 0.7);
+        }, 1000 / maxFps);
+    }
+
+    function stopBrowserCapture() {
+        clearInterval(captureTimer);
+        if (captureStream) {
+            captureStream.getTracks().forEach((track) => track.stop());
+            captureStream = null;
+        }
+        frameInFlight = false;
+    }
 
     async function initializeCamera() {
         try {
@@ -34,18 +85,12 @@ document.addEventListener("DOMContentLoaded", function () {
             const data = await response.json();
 
             if (data.success) {
+                if (data.capture === "browser") {
+                    await startBrowserCapture(data.frame_size, data.max_fps);
+                }
                 if (await initializeCamera()) {
                     stopBtn.disabled = false;
-                    updateInterval = setInterval(async () => {
-                        try {
-                            const summaryResponse = await fetch("/get_emotion_summary");
-                            if (!summaryResponse.ok) throw new Error("Failed to fetch summary");
-                            const summary = await summaryResponse.json();
-                            updateSummaryDisplay(summary);
-                        } catch (error) {
-                            console.error("Summary update failed:", error);
-                        }
-                    }, 1500);
+                    subscribeToSummary();
                 } else {
                     throw new Error("Camera initialization failed");
                 }
@@ -55,13 +100,17 @@ document.addEventListener("DOMContentLoaded", function () {
         } catch (error) {
             console.error("Start session error:", error);
             alert(`Error: ${error.message}`);
+            // A denied camera leaves a server session with no frames; end it
+            stopBrowserCapture();
+            fetch("/stop_session", { method: "POST" }).catch(() => {});
             startBtn.disabled = false;
         }
     });
 
     stopBtn.addEventListener("click", async function () {
         try {
-            clearInterval(updateInterval);
+            unsubscribeFromSummary();
+            stopBrowserCapture();
             videoStream.src = "";
             startBtn.disabled = false;
             stopBtn.disabled = true;
@@ -74,6 +123,38 @@ document.addEventListener("DOMContentLoaded", function () {
         }
     });
 
+    function pollSummary() {
+        updateInterval = setInterval(async () => {
+            try {
+                const summaryResponse = await fetch("/get_emotion_summary");
+                if (!summaryResponse.ok) throw new Error("Failed to fetch summary");
+                const summary = await summaryResponse.json();
+                updateSummaryDisplay(summary);
+            } catch (error) {
+                console.error("Summary update failed:", error);
+            }
+        }, 1500);
+    }
+
+    function subscribeToSummary() {
+        if (!window.EventSource) {
+            pollSummary();
+            return;
+        }
+        summarySource = new EventSource("/emotion_summary_stream");
+        summarySource.onmessage = (event) => updateSummaryDisplay(JSON.parse(event.data));
+        summarySource.addEventListener("end", unsubscribeFromSummary);
+        summarySource.onerror = (error) => console.error("Summary stream error:", error);
+    }
+
+    function unsubscribeFromSummary() {
+        clearInterval(updateInterval);
+        if (summarySource) {
+            summarySource.close();
+            summarySource = null;
+        }
+    }
+
     function updateSummaryDisplay(summary) {
         let html = `<p>Detected Faces: ${summary.total_faces}</p><ul>`;
         if (summary.total_faces > 0) {
@@ -0,0 +1,49 @@
+import time
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from capture_sources import ReplaySource, parse_replay_source, open_capture
+
+@pytest.fixture
+def image_dir(tmp_path):
+    for i in range(5):
+        cv2.imwrite(str(tmp_path / f"{i:03d}.png"), np.full((8, 8, 3), i * 10, dtype=np.uint8))
+    return str(tmp_path)
+
+def test_replay_options_are_parsed():
+    assert parse_replay_source("replay:/data/clip.mp4?fps=15&loop=1") == {
+        "path": "/data/clip.mp4", "fps": 15.0, "loop": True, "preload": False
+    }
+    assert parse_replay_source("replay:/data/frames")["fps"] == 0
+
+@pytest.mark.parametrize("fps", ["abc", "-1", "nan", "inf"])
+def test_malformed_fps_is_rejected(fps):
+    assert parse_replay_source(f"replay:/data?fps={fps}") is None
+    assert open_capture(f"replay:/data?fps={fps}") is None
+
+def test_image_directories_replay_in_order(image_dir):
+    source = open_capture(f"replay:{image_dir}")
+    assert source.isOpened()
+    values = [source.read()[1][0, 0, 0] for _ in range(5)]
+    assert values == [0, 10, 20, 30, 40]
+    assert not source.ended
+    assert source.read() == (False, None)
+    assert source.ended
+
+def test_looping_and_buffer_reuse(image_dir):
+    source = ReplaySource(image_dir, loop=True, preload=True)
+    buffer = np.empty((8, 8, 3), dtype=np.uint8)
+    for expected in [0, 10, 20, 30, 40, 0]:
+        ok, frame = source.read(buffer)
+        assert ok and frame is buffer and frame[0, 0, 0] == expected
+    assert not source.ended
+
+def test_paced_replay_skips_frames_that_are_due(image_dir):
+    source = ReplaySource(image_dir, fps=20, loop=True)
+    source.read()
+    time.sleep(0.12)
+    ok, frame = source.read()
+    # Frames that came due while the consumer slept are skipped, not queued
+    assert ok and frame[0, 0, 0] >= 20
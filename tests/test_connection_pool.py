@@ -0,0 +1,101 @@
+import sqlite3
+import threading
+import pytest
+
+pytest.importorskip("pymysql")
+
+from database_setup import ConnectionPool, PoolTimeoutError
+
+class Connections:
+    # sqlite3 stands in for pymysql; _ping falls back to SELECT 1 for it
+    def __init__(self):
+        self.opened = []
+
+    def __call__(self):
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.opened.append(conn)
+        return conn
+
+def test_released_connections_are_reused():
+    connect = Connections()
+    pool = ConnectionPool(connect, max_size=2)
+    conn = pool.acquire()
+    raw = conn._conn
+    conn.close()
+    with pool.acquire() as again:
+        assert again._conn is raw
+    assert pool.stats()["created"] == 1
+    assert pool.stats()["checkouts"] == 2
+    assert pool.stats()["in_use"] == 0
+
+def test_closing_twice_releases_once():
+    pool = ConnectionPool(Connections(), max_size=1)
+    conn = pool.acquire()
+    conn.close()
+    conn.close()
+    assert pool.stats()["idle"] == 1
+    with pytest.raises(AttributeError):
+        conn.cursor()
+
+def test_acquire_times_out_when_exhausted():
+    pool = ConnectionPool(Connections(), max_size=1, timeout=0.05)
+    held = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    held.close()
+    pool.acquire().close()
+
+def test_waiters_get_the_released_connection():
+    pool = ConnectionPool(Connections(), max_size=1, timeout=2.0)
+    held = pool.acquire()
+    acquired = threading.Event()
+
+    def wait():
+        with pool.acquire():
+            acquired.set()
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+    assert not acquired.wait(0.05)
+    held.close()
+    thread.join(2.0)
+    assert acquired.is_set()
+    assert pool.stats()["created"] == 1
+
+def test_stale_and_broken_connections_are_replaced():
+    connect = Connections()
+    pool = ConnectionPool(connect, max_size=2, max_idle=0.0)
+    pool.acquire().close()
+    pool.acquire().close()
+    assert pool.stats()["created"] == 2
+    assert pool.stats()["discarded"] == 1
+
+    pool = ConnectionPool(connect, max_size=2)
+    conn = pool.acquire()
+    conn._conn.close()
+    conn.close()
+    with pool.acquire() as fresh:
+        fresh.execute("SELECT 1")
+    assert pool.stats()["discarded"] == 1
+
+def test_a_failed_connect_frees_its_slot():
+    def connect():
+        raise sqlite3.OperationalError("unreachable")
+
+    pool = ConnectionPool(connect, max_size=1, timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            pool.acquire()
+    assert pool.stats()["in_use"] == 0
+
+def test_errors_in_a_with_block_roll_back():
+    pool = ConnectionPool(Connections(), max_size=1)
+    with pool.acquire() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+    with pytest.raises(RuntimeError):
+        with pool.acquire() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise RuntimeError("boom")
+    with pool.acquire() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
@@ -0,0 +1,57 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from emotion_cache import EmotionCache, dhash, hamming
+
+class Track:
+    def __init__(self):
+        self.smoothed = None
+        self.probs = None
+        self.crop_hash = None
+        self.skips = 0
+
+@pytest.fixture
+def crop():
+    return np.random.RandomState(0).randint(0, 255, (64, 64), dtype=np.uint8)
+
+def confident():
+    return [0.0, 0.0, 0.0, 0.9, 0.0, 0.0, 0.1]
+
+def test_dhash_is_stable_under_small_changes(crop):
+    brighter = np.clip(crop.astype(np.int16) + 5, 0, 255).astype(np.uint8)
+    assert hamming(dhash(crop), dhash(brighter)) <= 6
+    assert hamming(dhash(crop), dhash(crop[:, ::-1])) > 6
+
+def test_unchanged_confident_tracks_skip_inference(crop):
+    cache = EmotionCache(max_skips=2)
+    track = Track()
+    assert cache.should_infer(track, crop)
+    cache.update(track, confident())
+    assert not cache.should_infer(track, crop)
+    assert not cache.should_infer(track, crop)
+    # max_skips bounds how long a label can go unverified
+    assert cache.should_infer(track, crop)
+    assert cache.stats() == {"inferred": 2, "skipped": 2}
+
+def test_changed_or_unsure_tracks_are_inferred(crop):
+    cache = EmotionCache()
+    track = Track()
+    cache.should_infer(track, crop)
+    cache.update(track, confident())
+    assert cache.should_infer(track, crop[:, ::-1].copy())
+
+    unsure = Track()
+    cache.should_infer(unsure, crop)
+    cache.update(unsure, [1 / 7] * 7)
+    assert cache.should_infer(unsure, crop)
+
+def test_update_smooths_probabilities():
+    cache = EmotionCache(alpha=0.5)
+    track = Track()
+    assert cache.update(track, confident()) == (3, pytest.approx(0.9))
+    index, confidence = cache.update(track, [0.0, 0.0, 0.0, 0.1, 0.9, 0.0, 0.0])
+    assert index in (3, 4)
+    assert confidence == pytest.approx(0.5)
+    np.testing.assert_allclose(track.probs, [0.0, 0.0, 0.0, 0.1, 0.9, 0.0, 0.0])
@@ -0,0 +1,116 @@
+import time
+from datetime import datetime
+import pytest
+
+pytest.importorskip("pymysql")
+
+import emotion_log_writer
+from emotion_log_writer import (
+    EmotionLogWriter, INSERT_EMOTION_LOGS, UPSERT_SESSION_COUNTS, UPSERT_USER_COUNTS, UPSERT_MINUTE_COUNTS
+)
+
+class FakeConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.statements = {}
+        self.committed = 0
+        self.rolled_back = 0
+        self.closed = 0
+
+    def begin(self):
+        pass
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, sql, rows):
+        if self.fail:
+            raise RuntimeError("write failed")
+        self.statements.setdefault(sql, []).extend(rows)
+
+    def commit(self):
+        self.committed += 1
+
+    def rollback(self):
+        self.rolled_back += 1
+
+    def close(self):
+        self.closed += 1
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr(emotion_log_writer, "get_db_connection", lambda: conn)
+    return conn
+
+def timestamp(text):
+    return datetime.fromisoformat(text).timestamp()
+
+def test_batches_roll_up_by_session_user_and_minute(conn):
+    writer = EmotionLogWriter(flush_interval=0.5)
+    writer.write(1, 1, "happy", 0.9, timestamp("2024-01-01 10:00:05"), user_id=7)
+    writer.write(1, 2, "happy", 0.8, timestamp("2024-01-01 10:00:59"), user_id=7)
+    writer.write(1, 1, "sad", 0.7, timestamp("2024-01-01 10:01:00"), user_id=7)
+    writer.write(2, 1, "happy", 0.6, timestamp("2024-01-01 10:00:30"))
+    assert writer.flush()
+    writer.stop()
+
+    assert len(conn.statements[INSERT_EMOTION_LOGS]) == 4
+    assert sorted(conn.statements[UPSERT_SESSION_COUNTS]) == [(1, "happy", 2), (1, "sad", 1), (2, "happy", 1)]
+    # Records without a user only count towards their session
+    assert sorted(conn.statements[UPSERT_USER_COUNTS]) == [(7, "happy", 2), (7, "sad", 1)]
+    minute = datetime.fromisoformat
+    assert sorted(conn.statements[UPSERT_MINUTE_COUNTS]) == [
+        (1, minute("2024-01-01 10:00:00"), "happy", 2),
+        (1, minute("2024-01-01 10:01:00"), "sad", 1),
+        (2, minute("2024-01-01 10:00:00"), "happy", 1)
+    ]
+    assert conn.committed == 1
+    assert writer.stats()["written"] == 4
+    assert writer.stats()["batches"] == 1
+
+def test_full_batches_are_written_without_waiting(conn):
+    writer = EmotionLogWriter(batch_size=2, flush_interval=0.5)
+    for track_id in range(4):
+        writer.write(1, track_id, "neutral")
+    deadline = time.monotonic() + 2.0
+    while writer.stats()["written"] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.stats()["batches"] == 2
+    writer.stop()
+
+def test_flush_writes_the_pending_records(conn):
+    writer = EmotionLogWriter(flush_interval=0.5)
+    writer.write(1, 1, "happy", 0.9, time.time())
+    writer.write(1, 2, "sad", 0.8)
+    assert writer.flush()
+    writer.stop()
+    assert [row[:3] for row in conn.statements[INSERT_EMOTION_LOGS]] == [(1, 1, "happy"), (1, 2, "sad")]
+    assert conn.committed == 1
+
+def test_failed_batches_roll_back_and_are_counted(monkeypatch):
+    conn = FakeConnection(fail=True)
+    monkeypatch.setattr(emotion_log_writer, "get_db_connection", lambda: conn)
+    writer = EmotionLogWriter()
+    writer.write(1, 1, "angry")
+    assert writer.flush()
+    writer.stop()
+    assert conn.rolled_back == 1
+    assert conn.closed == 1
+    assert writer.stats()["failed"] == 1
+    assert writer.stats()["written"] == 0
+
+def test_a_full_queue_drops_records(monkeypatch):
+    monkeypatch.setattr(emotion_log_writer, "get_db_connection", lambda: None)
+    writer = EmotionLogWriter(max_queue=1)
+    # Stop the writer thread from draining so the queue stays full
+    monkeypatch.setattr(writer, "start", lambda: None)
+    assert writer.write(1, 1, "fear")
+    assert not writer.write(1, 2, "fear")
+    assert writer.stats()["dropped"] == 1
@@ -0,0 +1,86 @@
+import time
+import threading
+from frame_scheduler import FrameScheduler
+
+def test_latest_frame_wins():
+    scheduler = FrameScheduler()
+    assert scheduler.put("a", 1.0) is None
+    assert scheduler.put("b", 2.0) == "a"
+    assert scheduler.get(timeout=0) == (2.0, "b")
+    assert scheduler.get(timeout=0) is None
+    stats = scheduler.stats()
+    assert (stats["captured"], stats["dropped"]) == (2, 1)
+
+def test_get_wakes_on_put_and_close():
+    scheduler = FrameScheduler()
+    results = []
+    thread = threading.Thread(target=lambda: results.append(scheduler.get(timeout=2.0)))
+    thread.start()
+    scheduler.put("frame", 1.0)
+    thread.join(2.0)
+    assert results == [(1.0, "frame")]
+
+    started = time.monotonic()
+    thread = threading.Thread(target=lambda: results.append(scheduler.get(timeout=2.0)))
+    thread.start()
+    scheduler.close()
+    thread.join(2.0)
+    assert results[-1] is None
+    assert time.monotonic() - started < 1.0
+
+def test_detection_interval_is_respected():
+    scheduler = FrameScheduler()
+    scheduler.detect_interval = 3
+    assert [scheduler.should_detect() for _ in range(6)] == [False, False, True, False, False, True]
+
+def test_detections_are_counted_by_kind():
+    scheduler = FrameScheduler()
+    scheduler.record_detection()
+    scheduler.record_detection([(0, 0, 10, 10), (20, 20, 10, 10)])
+    scheduler.record_detection([])
+    stats = scheduler.stats()
+    assert (stats["detected"], stats["region_detected"], stats["regions"], stats["motion_skipped"]) == (1, 1, 2, 1)
+
+def test_lagging_sheds_detection_then_classification():
+    scheduler = FrameScheduler(target_latency=0.01, max_detect_interval=2, adapt_every=1, smoothing=1.0)
+    late = time.time() - 1.0
+    scheduler.complete(late)
+    assert scheduler.detect_interval == 2
+    scheduler.complete(late)
+    assert scheduler.detect_interval == 2
+    assert scheduler.reinfer_interval > scheduler.min_reinfer_interval
+
+    # Once caught up, classification is given back before detection
+    for _ in range(10):
+        scheduler.complete(time.time())
+    assert scheduler.reinfer_interval == scheduler.min_reinfer_interval
+    assert scheduler.detect_interval == 1
+
+def test_lag_percentiles_cover_the_recent_window():
+    scheduler = FrameScheduler(lag_window=10)
+    now = time.time()
+    for lag in range(100):
+        scheduler.complete(now - lag / 1000)
+    assert len(scheduler.lag_samples) == 10
+    assert 90 <= scheduler.lag_percentile(50) < 100
+    assert scheduler.stats()["lag_p95_ms"] >= scheduler.stats()["lag_p50_ms"]
+    scheduler.reset()
+    assert scheduler.lag_percentile(95) == 0.0
+
+def test_drops_from_ingest_and_put_are_all_counted():
+    scheduler = FrameScheduler()
+
+    def drop():
+        for _ in range(10000):
+            scheduler.record_dropped()
+
+    def put():
+        for i in range(10000):
+            scheduler.put(i, 1.0)
+
+    threads = [threading.Thread(target=target) for target in (drop, drop, put)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert scheduler.stats()["dropped"] == 20000 + 9999
@@ -0,0 +1,111 @@
+import time
+import asyncio
+import threading
+import pytest
+
+from live_state import InProcessState, RedisState, AsyncRelay, END, create_state
+
+def redis_state():
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisState(client=fakeredis.FakeRedis())
+
+@pytest.fixture(params=["memory", "redis"])
+def state(request):
+    return InProcessState() if request.param == "memory" else redis_state()
+
+def test_values_and_expiry(state):
+    state.set("a", "1")
+    assert state.get("a") in ("1", b"1")
+    state.set("b", "2", ttl=0.05)
+    time.sleep(0.1)
+    assert state.get("b") is None
+    state.delete("a")
+    assert state.get("a") is None
+
+def test_claims_are_exclusive_until_they_expire(state):
+    assert state.claim("owner", "one", ttl=0.1)
+    assert not state.claim("owner", "two", ttl=0.1)
+    time.sleep(0.15)
+    assert state.claim("owner", "two")
+
+def test_sessions_round_trip(state):
+    state.set_session(1, {"owner": "here"})
+    state.set_session(2, {"owner": "there"})
+    assert state.get_session(1) == {"owner": "here"}
+    assert sorted(state.session_keys()) == ["1", "2"]
+    state.set_summary(1, {"total_faces": 1})
+    assert state.get_summary(1) == {"total_faces": 1}
+
+def test_subscribers_get_published_messages(state):
+    subscription = state.subscribe("channel")
+    try:
+        # Nothing is waiting: the read gives up at its deadline
+        started = time.monotonic()
+        assert subscription.get(timeout=0.1) is None
+        assert time.monotonic() - started >= 0.09
+        state.publish("channel", b"one")
+        assert subscription.get(timeout=1.0) == b"one"
+    finally:
+        subscription.close()
+
+def test_blocking_reads_wait_for_a_message(state):
+    subscription = state.subscribe("channel")
+    timer = threading.Timer(0.1, state.publish, ("channel", b"late"))
+    timer.start()
+    try:
+        assert subscription.get() == b"late"
+    finally:
+        timer.join()
+        subscription.close()
+
+def test_latest_skips_to_the_newest_message(state):
+    subscription = state.subscribe("channel")
+    try:
+        for message in (b"1", b"2", b"3"):
+            state.publish("channel", message)
+        time.sleep(0.05)
+        assert subscription.latest(timeout=1.0) == b"3"
+    finally:
+        subscription.close()
+
+def test_deleting_a_session_ends_its_streams(state):
+    state.set_session(1, {"owner": "here"})
+    state.set_frame(1, b"jpeg")
+    summaries = state.subscribe("summary:1")
+    frames = state.subscribe("frame:1")
+    try:
+        state.delete_session(1)
+        assert state.get_session(1) is None
+        assert state.get_frame(1) is None
+        assert summaries.get(timeout=1.0) == END
+        assert frames.get(timeout=1.0) == END
+    finally:
+        summaries.close()
+        frames.close()
+
+def test_the_relay_fans_out_to_every_viewer(state):
+    relay = AsyncRelay(state, poll_interval=0.05)
+
+    async def watch():
+        loop = asyncio.get_running_loop()
+        viewers = [(loop, asyncio.Queue(maxsize=1)) for _ in range(3)]
+        for viewer in viewers:
+            await asyncio.to_thread(relay.add, "channel", viewer)
+        await asyncio.to_thread(state.publish, "channel", b"frame")
+        received = [await asyncio.wait_for(queue.get(), 1.0) for _, queue in viewers]
+        for viewer in viewers:
+            relay.remove("channel", viewer)
+        return received
+
+    assert asyncio.run(watch()) == [b"frame"] * 3
+    deadline = time.monotonic() + 1.0
+    while relay.channels and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert relay.channels == {}
+
+def test_create_state_picks_the_backend():
+    assert isinstance(create_state(None), InProcessState)
+    assert isinstance(create_state("memory://"), InProcessState)
+    assert not create_state().shared
+    pytest.importorskip("fakeredis")
+    assert create_state("fakeredis://").shared
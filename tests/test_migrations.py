@@ -0,0 +1,129 @@
+import re
+import pytest
+
+pytest.importorskip("pymysql")
+
+import database_setup
+
+# The tables as the old import-time init_db created them
+BASELINE = {
+    "users": (["id", "username", "password", "total_sessions", "total_faces_detected", "most_common_emotion"],
+              ["PRIMARY", "username"]),
+    "sessions": (["id", "user_id", "start_time", "end_time", "total_faces", "most_common_emotion"],
+                 ["PRIMARY", "user_id"]),
+    "emotion_logs": (["id", "session_id", "emotion"], ["PRIMARY", "session_id"])
+}
+
+class FakeDatabase:
+    # Just enough of MySQL for migrate(): DDL updates a catalog of columns and indexes
+    def __init__(self, tables=None, applied=()):
+        self.tables = {name: (list(columns), set(indexes)) for name, (columns, indexes) in (tables or {}).items()}
+        self.applied = set(applied)
+        self.executed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def execute(self, sql, args=None):
+        db, text = self.db, " ".join(sql.split())
+        db.executed.append(text)
+        self.rows = []
+        if text.startswith("SELECT GET_LOCK"):
+            self.rows = [{"locked": 1}]
+        elif text.startswith("SELECT version FROM schema_migrations"):
+            self.rows = [{"version": version} for version in sorted(db.applied)]
+        elif text.startswith("INSERT INTO schema_migrations"):
+            db.applied.add(args[0])
+        elif "information_schema.COLUMNS" in text:
+            self.rows = [{"name": name} for name in db.tables.get(args[0], ([], set()))[0]]
+        elif "information_schema.STATISTICS" in text:
+            self.rows = [{"name": name} for name in db.tables.get(args[0], ([], set()))[1]]
+        elif text.startswith("CREATE TABLE IF NOT EXISTS"):
+            name = text.split()[5]
+            if name not in db.tables:
+                db.tables[name] = _parse_table(sql)
+        elif text.startswith("ALTER TABLE"):
+            match = re.match(r"ALTER TABLE (\w+) ADD COLUMN (\w+)", text)
+            columns = db.tables[match.group(1)][0]
+            assert match.group(2) not in columns, text
+            columns.append(match.group(2))
+        elif text.startswith("CREATE INDEX"):
+            match = re.match(r"CREATE INDEX (\w+) ON (\w+)", text)
+            indexes = db.tables[match.group(2)][1]
+            assert match.group(1) not in indexes, text
+            indexes.add(match.group(1))
+
+def _parse_table(sql):
+    body = sql[sql.index("(") + 1:sql.rindex(")")]
+    columns, indexes = [], {"PRIMARY"}
+    for line in body.splitlines():
+        words = line.strip().rstrip(",").split()
+        if not words or words[0] in ("PRIMARY", "FOREIGN"):
+            continue
+        if words[0] == "INDEX":
+            indexes.add(words[1])
+        else:
+            columns.append(words[0])
+    return columns, indexes
+
+def migrate(monkeypatch, db):
+    monkeypatch.setattr(database_setup, "get_db_connection", lambda: db)
+    return database_setup.migrate()
+
+def assert_current(db):
+    for table, upgrade in database_setup.BASELINE_UPGRADES.items():
+        columns, indexes = db.tables[table]
+        assert {name for name, _ in upgrade["columns"]} <= set(columns)
+        assert {name for name, _ in upgrade["indexes"]} <= indexes
+    assert {"session_emotion_counts", "user_emotion_counts", "emotion_minute_counts"} <= set(db.tables)
+    assert db.applied == {version for version, _ in database_setup.MIGRATIONS}
+
+def test_a_baseline_database_is_upgraded(monkeypatch):
+    db = FakeDatabase(BASELINE)
+    assert migrate(monkeypatch, db)
+    assert_current(db)
+    assert db.tables["emotion_logs"][0] == ["id", "session_id", "emotion", "track_id", "confidence", "captured_at"]
+
+def test_a_baseline_database_already_at_step_one_is_upgraded(monkeypatch):
+    # Deployments that ran the first migrate() recorded step 1 without gaining the columns
+    db = FakeDatabase(BASELINE)
+    with monkeypatch.context() as patch:
+        patch.setattr(database_setup, "MIGRATIONS", database_setup.MIGRATIONS[:1])
+        assert migrate(patch, db)
+    assert "track_id" not in db.tables["emotion_logs"][0]
+    assert migrate(monkeypatch, db)
+    assert_current(db)
+
+def test_a_fresh_database_needs_no_alterations(monkeypatch):
+    db = FakeDatabase()
+    assert migrate(monkeypatch, db)
+    assert_current(db)
+    assert not [sql for sql in db.executed if sql.startswith(("ALTER TABLE", "CREATE INDEX"))]
+
+def test_migrate_is_idempotent(monkeypatch):
+    db = FakeDatabase(BASELINE)
+    assert migrate(monkeypatch, db)
+    executed = len(db.executed)
+    assert migrate(monkeypatch, db)
+    assert not [sql for sql in db.executed[executed:] if sql.startswith(("ALTER TABLE", "CREATE INDEX"))]
+    assert_current(db)
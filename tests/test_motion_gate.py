@@ -0,0 +1,65 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from motion_gate import MotionGate, overlaps, _merge
+
+@pytest.fixture
+def frame():
+    return np.full((480, 640, 3), 120, dtype=np.uint8)
+
+def primed(frame, **options):
+    gate = MotionGate(**options)
+    assert gate.check(frame, []) is None
+    gate.commit(frame.shape)
+    return gate
+
+def test_first_frame_and_refreshes_detect_everything(frame):
+    gate = primed(frame, refresh_interval=3)
+    assert gate.check(frame, []) == []
+    assert gate.check(frame, []) == []
+    assert gate.check(frame, []) is None
+
+def test_static_frames_are_skipped(frame):
+    gate = primed(frame)
+    noisy = frame.copy()
+    noisy[::7, ::7] += 3
+    assert gate.check(noisy, []) == []
+
+def test_a_local_change_yields_a_region_around_it(frame):
+    gate = primed(frame)
+    moved = frame.copy()
+    moved[200:260, 300:360] = 255
+    regions = gate.check(moved, [])
+    assert len(regions) == 1
+    x, y, w, h = regions[0]
+    assert x <= 300 and y <= 200 and x + w >= 360 and y + h >= 260
+    assert w * h < 0.3 * 640 * 480
+
+def test_regions_grow_to_cover_touched_faces(frame):
+    gate = primed(frame)
+    moved = frame.copy()
+    moved[200:220, 300:320] = 255
+    regions = gate.check(moved, [(280, 180, 100, 100)])
+    x, y, w, h = regions[0]
+    assert x <= 280 and y <= 180 and x + w >= 380 and y + h >= 280
+
+def test_large_changes_fall_back_to_full_detection(frame):
+    gate = primed(frame)
+    assert gate.check(np.clip(frame.astype(np.int16) + 60, 0, 255).astype(np.uint8), []) is None
+
+def test_commit_only_updates_detected_regions(frame):
+    gate = primed(frame)
+    moved = frame.copy()
+    moved[200:260, 300:360] = 255
+    moved[20:60, 20:60] = 0
+    regions = gate.check(moved, [])
+    assert len(regions) == 2
+    gate.commit(moved.shape, regions[:1])
+    assert len(gate.check(moved, [])) == 1
+
+def test_merge_and_overlaps():
+    assert _merge([[0, 0, 10, 10], [5, 5, 20, 20], [30, 30, 40, 40]]) == [[0, 0, 20, 20], [30, 30, 40, 40]]
+    assert overlaps((0, 0, 10, 10), [(5, 5, 10, 10)])
+    assert not overlaps((0, 0, 10, 10), [(10, 0, 10, 10)])
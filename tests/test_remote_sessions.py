@@ -0,0 +1,176 @@
+import sys
+import time
+import types
+import asyncio
+import pytest
+
+pytest.importorskip("pymysql")
+pytest.importorskip("numpy")
+fakeredis = pytest.importorskip("fakeredis")
+
+from live_state import RedisState
+from session_manager import SessionManager, RemoteSessions, RemoteView, SessionLimitError, BROWSER_SOURCE
+
+class FakeDetector:
+    # Records what the session manager asks of it; the real pipeline needs a camera and models
+    def __init__(self, state=None, state_key=None, **options):
+        self.state = state
+        self.state_key = state_key
+        self.is_running = False
+        self.source = None
+        self.session_id = None
+        self.face_detector = types.SimpleNamespace(input_size=(320, 240))
+        self.submitted = []
+
+    def start_session(self, user_id, source):
+        self.is_running = True
+        self.source = source
+        self.session_id = user_id * 10
+        return True
+
+    def stop_session(self):
+        self.is_running = False
+
+    def pipeline_stats(self):
+        return {"processed": 0}
+
+    def submit_frame(self, data):
+        self.submitted.append(data)
+        return True
+
+class NullLogWriter:
+    def stop(self, timeout=5.0):
+        pass
+
+@pytest.fixture
+def fake_detectors(monkeypatch):
+    module = types.ModuleType("face_emotion")
+    module.EmotionDetector = FakeDetector
+    monkeypatch.setitem(sys.modules, "face_emotion", module)
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def make_state(server):
+    return RedisState(client=fakeredis.FakeRedis(server=server))
+
+def make_manager(server, max_sessions=4):
+    manager = SessionManager(max_sessions=max_sessions, state=make_state(server), log_writer=NullLogWriter(),
+                             inference_workers=1, decode_workers=1)
+    manager.serve_commands(heartbeat=0.1)
+    return manager
+
+@pytest.fixture
+def manager(server, fake_detectors):
+    manager = make_manager(server)
+    yield manager
+    manager.shutdown()
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_start_runs_the_session_in_the_serving_process(server, manager):
+    remote = RemoteSessions(make_state(server), start_timeout=2.0)
+    assert remote.start(1, 1, "0")
+    assert manager.get(1).is_running
+    view = remote.get(1)
+    assert isinstance(view, RemoteView)
+    assert view.info["session_id"] == 10
+    assert remote.describe(1)["capture"] == "server"
+    assert remote.active_count() == 1
+
+def test_start_reports_the_session_limit(server, fake_detectors):
+    manager = make_manager(server, max_sessions=1)
+    try:
+        remote = RemoteSessions(make_state(server), start_timeout=2.0)
+        assert remote.start(1, 1, "0")
+        with pytest.raises(SessionLimitError):
+            remote.start(2, 2, "0")
+        assert remote.get(2) is None
+    finally:
+        manager.shutdown()
+
+def test_start_times_out_without_an_inference_process(server):
+    remote = RemoteSessions(make_state(server), start_timeout=0.2)
+    assert remote.start(1, 1, "0") is False
+
+def test_only_one_process_claims_a_session(server, fake_detectors):
+    managers = [make_manager(server) for _ in range(3)]
+    try:
+        remote = RemoteSessions(make_state(server), start_timeout=2.0)
+        assert remote.start(1, 1, "0")
+        time.sleep(0.2)
+        assert sum(manager.get(1) is not None for manager in managers) == 1
+    finally:
+        for manager in managers:
+            manager.shutdown()
+
+def test_stop_ends_the_session_and_its_streams(server, manager):
+    remote = RemoteSessions(make_state(server), start_timeout=2.0)
+    assert remote.start(1, 1, "0")
+    frames = remote.get(1).generate_frames()
+    detector = manager.get(1)
+    assert remote.stop(1)
+    assert not detector.is_running
+    assert manager.get(1) is None
+    assert remote.get(1) is None
+    assert list(frames) == []
+    assert remote.stop(1) is False
+
+def test_summary_events_follow_the_owner(server, manager):
+    remote = RemoteSessions(make_state(server), start_timeout=2.0)
+    assert remote.start(1, 1, "0")
+    manager.state.set_summary(1, {"total_faces": 1, "emotions": {"happy": 1}})
+    view = remote.get(1)
+    assert view.emotion_summary["emotions"] == {"happy": 1}
+
+    events = view.generate_summary_events()
+    assert '"happy": 1' in next(events)
+    manager.state.set_summary(1, {"total_faces": 2, "emotions": {"happy": 2}})
+    assert '"happy": 2' in next(events)
+    manager.stop(1)
+    assert next(events) == 'event: end\ndata: {}\n\n'
+
+def test_frames_are_relayed_to_viewers(server, manager):
+    remote = RemoteSessions(make_state(server), start_timeout=2.0)
+    assert remote.start(1, 1, "0")
+    manager.state.set_frame(1, b"first")
+    frames = remote.get(1).generate_frames()
+    assert next(frames).endswith(b"first\r\n")
+    manager.state.set_frame(1, b"second")
+    assert next(frames).endswith(b"second\r\n")
+    frames.close()
+
+def test_async_frames_are_relayed_to_viewers(server, manager):
+    remote = RemoteSessions(make_state(server), start_timeout=2.0)
+    assert remote.start(1, 1, "0")
+    manager.state.set_frame(1, b"first")
+    view = remote.get(1)
+
+    async def watch():
+        frames = view.astream_frames()
+        parts = [await frames.__anext__()]
+        await asyncio.to_thread(manager.state.set_frame, 1, b"second")
+        parts.append(await frames.__anext__())
+        await asyncio.to_thread(manager.stop, 1)
+        parts.extend([part async for part in frames])
+        return parts
+
+    parts = asyncio.run(asyncio.wait_for(watch(), 5.0))
+    assert [part.rsplit(b"\r\n\r\n", 1)[1] for part in parts] == [b"first\r\n", b"second\r\n"]
+    assert wait_for(lambda: not remote.relay.channels)
+
+def test_uploaded_frames_reach_the_owner(server, manager):
+    remote = RemoteSessions(make_state(server), start_timeout=2.0)
+    assert remote.start(1, 1, BROWSER_SOURCE)
+    assert remote.describe(1)["capture"] == "browser"
+    detector = manager.get(1)
+    # The ingest relay subscribes from its own thread once the session has started
+    assert wait_for(lambda: remote.get(1).submit_frame(b"jpeg") and detector.submitted, timeout=2.0)
+    assert detector.submitted[0] == b"jpeg"
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip("pymysql")
+
+from session_manager import parse_capture_source, BROWSER_SOURCE
+
+@pytest.mark.parametrize("source, expected", [
+    (0, 0),
+    ("1", 1),
+    (" 2 ", 2),
+    (BROWSER_SOURCE, BROWSER_SOURCE),
+    ("rtsp://camera/stream", "rtsp://camera/stream"),
+    ("replay:/data/clip.mp4?fps=15", "replay:/data/clip.mp4?fps=15"),
+    ("-1", "-1")
+])
+def test_parse_capture_source(source, expected):
+    assert parse_capture_source(source) == expected
@@ -0,0 +1,71 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("pymysql")
+
+import video_analysis
+
+class FakeLogWriter:
+    def __init__(self, **options):
+        self.stopped = False
+
+    def write(self, *record):
+        return True
+
+    def flush(self, timeout=5.0):
+        return True
+
+    def stop(self, timeout=5.0):
+        self.stopped = True
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), i * 10, dtype=np.uint8))
+    writer.release()
+    return path
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    # Chunks run on threads in this process, so the chunk function can be replaced
+    calls = {"chunks": [], "finished": [], "writers": []}
+    release = threading.Event()
+
+    def analyze_chunk(path, start, end, *args):
+        calls["chunks"].append(start)
+        if start == 0:
+            raise RuntimeError("decoder crashed")
+        release.wait(5)
+        return {"start": start, "end": end, "frames": end - start, "seconds": 0.0,
+                "records": [], "first_boxes": {}, "last_boxes": {}}
+
+    def log_writer(**options):
+        writer = FakeLogWriter(**options)
+        calls["writers"].append(writer)
+        return writer
+
+    monkeypatch.setattr(video_analysis, "ProcessPoolExecutor",
+                        lambda max_workers, **options: ThreadPoolExecutor(max_workers))
+    monkeypatch.setattr(video_analysis, "_analyze_chunk", analyze_chunk)
+    monkeypatch.setattr(video_analysis, "create_session_record", lambda user_id: 42)
+    monkeypatch.setattr(video_analysis, "finish_session_record",
+                        lambda session_id, user_id, total: calls["finished"].append((session_id, total)))
+    monkeypatch.setattr(video_analysis, "EmotionLogWriter", log_writer)
+    yield calls
+    release.set()
+
+def test_a_failed_chunk_cancels_the_rest_and_closes_the_session(video, pipeline):
+    with pytest.raises(RuntimeError, match="decoder crashed"):
+        video_analysis.analyze_video(video, user_id=7, workers=1, chunk_seconds=0.5)
+    # Four chunks of five frames; only the failing one ran
+    assert pipeline["chunks"] == [0]
+    assert pipeline["finished"] == [(42, 0)]
+    assert pipeline["writers"][0].stopped
+
+def test_split_chunks_covers_every_frame():
+    assert video_analysis.split_chunks(11, 5) == [(0, 5), (5, 10), (10, 11)]
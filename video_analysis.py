@@ -0,0 +1,293 @@
+import os
+import time
+import itertools
+import uuid
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
+from database_setup import create_session_record, finish_session_record
+from emotion_log_writer import EmotionLogWriter
+from inference_pool import _init_worker, _worker
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _classify_pending(pending, records):
+    from emotion_classifier import EMOTION_LABELS
+
+    probs = _worker['classifier'].predict_proba([roi for _, _, roi in pending])
+    for (frame_index, track_id, _), track_probs in zip(pending, probs):
+        index = int(track_probs.argmax())
+        records.append((frame_index, track_id, EMOTION_LABELS[index], float(track_probs[index])))
+
+def _analyze_chunk(path, start, end, frame_step, tracker_options, batch_size):
+    import cv2
+    from face_tracker import FaceTracker
+
+    started = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    tracker = FaceTracker(**tracker_options)
+    records, pending = [], []
+    first_boxes, last_boxes = None, {}
+    frame_index, processed = start, 0
+
+    while frame_index < end:
+        if (frame_index - start) % frame_step:
+            # Skipped frames are grabbed without being retrieved
+            if not cap.grab():
+                break
+            frame_index += 1
+            continue
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        faces = _worker['detector'].detect(frame)
+        tracks = tracker.update(faces)
+        boxes = {}
+        gray = None
+        for track, (x, y, w, h) in zip(tracks, faces):
+            boxes[track.id] = (x, y, w, h)
+            if tracker.needs_inference(track):
+                if gray is None:
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                pending.append((frame_index, track.id, gray[y:y+h, x:x+w].copy()))
+                tracker.mark_inferred(track)
+        if first_boxes is None:
+            first_boxes = boxes
+        last_boxes = boxes
+
+        if len(pending) >= batch_size:
+            _classify_pending(pending, records)
+            pending = []
+        frame_index += 1
+        processed += 1
+
+    if pending:
+        _classify_pending(pending, records)
+    cap.release()
+    return {
+        "start": start,
+        "end": frame_index,
+        "frames": processed,
+        "seconds": time.perf_counter() - started,
+        "records": records,
+        "first_boxes": first_boxes or {},
+        "last_boxes": last_boxes
+    }
+
+def _stitch(previous, current, max_distance):
+    # Match tracks alive at the end of the previous chunk to those at the start of this one
+    from face_tracker import centroid_distances, assign
+
+    if not previous or not current:
+        return {}
+    prev_ids, prev_boxes = zip(*previous.items())
+    cur_ids, cur_boxes = zip(*current.items())
+    distances = centroid_distances(
+        np.array(cur_boxes, dtype=np.float32), np.array(prev_boxes, dtype=np.float32)
+    )
+    rows, cols = assign(distances, distances <= max_distance)
+    return {cur_ids[r]: prev_ids[c] for r, c in zip(rows, cols)}
+
+def split_chunks(total_frames, chunk_frames):
+    return [(start, min(start + chunk_frames, total_frames)) for start in range(0, total_frames, chunk_frames)]
+
+def analyze_video(path, user_id=None, workers=None, chunk_seconds=60, frame_step=1,
+                  detector_engine='haar', detector_options=None, tracker_options=None,
+                  batch_size=32, log_writer=None, progress=None, classifier_engine='deepface',
+                  classifier_options=None):
+    # OpenCV is imported on use so the web tier can import VideoAnalysisJobs cheaply
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Video file {path!r} could not be opened")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        raise ValueError(f"Video file {path!r} reports no frames")
+
+    workers = workers or os.cpu_count() or 1
+    frame_step = max(int(frame_step), 1)
+    tracker_options = {"max_distance": 75, "max_missed": 10, "reinfer_interval": 30, **(tracker_options or {})}
+    # Chunk lengths are a multiple of frame_step so sampling stays aligned across boundaries
+    chunks = split_chunks(total_frames, max(int(chunk_seconds * fps) // frame_step, 1) * frame_step)
+
+    session_id = create_session_record(user_id) if user_id is not None else None
+    owns_writer = log_writer is None and session_id is not None
+    if owns_writer:
+        log_writer = EmotionLogWriter(block_timeout=5.0)
+    base_time = time.time()
+
+    results = {}
+    next_chunk = 0
+    id_maps = {}
+    global_ids = itertools.count(1)
+    track_count = 0
+    frames_done = 0
+    chunks_done = 0
+    started = time.perf_counter()
+
+    def emit(index):
+        # Chunks are emitted in order so boundary tracks can inherit global IDs
+        nonlocal track_count
+        result = results.pop(index)
+        previous = id_maps.get(index - 1, ({}, {}))
+        inherited = _stitch(previous[1], result['first_boxes'], tracker_options['max_distance'])
+        id_map = {local: previous[0][prev] for local, prev in inherited.items() if prev in previous[0]}
+        for frame_index, local_id, emotion, confidence in result['records']:
+            if local_id not in id_map:
+                id_map[local_id] = next(global_ids)
+                track_count += 1
+            if log_writer is not None and session_id is not None:
+                log_writer.write(session_id, id_map[local_id], emotion, confidence,
+                                 base_time + frame_index / fps, user_id)
+        for local_id in result['last_boxes']:
+            if local_id not in id_map:
+                id_map[local_id] = next(global_ids)
+                track_count += 1
+        id_maps[index] = (id_map, result['last_boxes'])
+        id_maps.pop(index - 1, None)
+
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                   initargs=(detector_engine, detector_options or {},
+                                             classifier_engine, classifier_options or {}))
+    try:
+        futures = {
+            executor.submit(_analyze_chunk, path, start, end, frame_step, tracker_options, batch_size): index
+            for index, (start, end) in enumerate(chunks)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            frames_done += results[index]['frames']
+            chunks_done += 1
+            while next_chunk in results:
+                emit(next_chunk)
+                next_chunk += 1
+
+            elapsed = time.perf_counter() - started
+            if progress:
+                progress({
+                    "chunks_done": chunks_done,
+                    "chunks_total": len(chunks),
+                    "frames_done": frames_done,
+                    "frames_total": -(-total_frames // frame_step),
+                    "fps": frames_done / elapsed if elapsed else 0.0,
+                    "realtime_factor": frames_done * frame_step / fps / elapsed if elapsed else 0.0
+                })
+    finally:
+        # A failed chunk cancels the queued ones, and the session still gets closed
+        executor.shutdown(wait=True, cancel_futures=True)
+        if log_writer is not None:
+            log_writer.flush(timeout=60)
+        if session_id is not None:
+            finish_session_record(session_id, user_id, track_count)
+        if owns_writer:
+            log_writer.stop()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "session_id": session_id,
+        "frames": frames_done,
+        "tracks": track_count,
+        "seconds": elapsed,
+        "fps": frames_done / elapsed if elapsed else 0.0,
+        "realtime_factor": frames_done * frame_step / fps / elapsed if elapsed else 0.0
+    }
+
+class VideoAnalysisJobs:
+    def __init__(self, max_concurrent=1, on_done=None, job_ttl=3600.0, max_jobs=1000, **analysis_options):
+        self.analysis_options = analysis_options
+        # Called once with the job's user id when it finishes successfully
+        self.on_done = on_done
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='video-analysis')
+        self.log_writer = EmotionLogWriter(block_timeout=5.0)
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, path, user_id, delete_after=True):
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self._evict()
+            self.jobs[job_id] = {"id": job_id, "user_id": user_id, "status": "queued", "progress": None, "result": None}
+        self.executor.submit(self._run, job_id, path, user_id, delete_after)
+        return job_id
+
+    def _evict(self):
+        # Finished jobs are kept for job_ttl, and only the newest max_jobs of them
+        now = time.time()
+        finished = [job for job in self.jobs.values() if job.get('finished_at') is not None]
+        finished.sort(key=lambda job: job['finished_at'])
+        excess = len(self.jobs) - self.max_jobs + 1
+        for i, job in enumerate(finished):
+            if i < excess or now - job['finished_at'] > self.job_ttl:
+                del self.jobs[job['id']]
+
+    def get(self, job_id, user_id):
+        job = self.jobs.get(job_id)
+        if job is None or job['user_id'] != user_id:
+            return None
+        return dict(job)
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _run(self, job_id, path, user_id, delete_after):
+        self._update(job_id, status="running")
+        try:
+            result = analyze_video(
+                path, user_id=user_id, log_writer=self.log_writer,
+                progress=lambda p: self._update(job_id, progress=p),
+                **self.analysis_options
+            )
+            self._update(job_id, status="done", result=result, finished_at=time.time())
+            if self.on_done is not None:
+                self.on_done(user_id)
+        except Exception as e:
+            logger.error(f"Video analysis job {job_id} failed: {e}")
+            self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+        finally:
+            if delete_after:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze emotions in a recorded video file")
+    parser.add_argument("video")
+    parser.add_argument("--user-id", type=int, default=None, help="Store results as a session for this user")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-seconds", type=float, default=60)
+    parser.add_argument("--frame-step", type=int, default=1, help="Analyze every Nth frame")
+    parser.add_argument("--detector", default="haar")
+    parser.add_argument("--classifier", default="deepface", help="Emotion classifier engine: deepface, onnx or tflite")
+    args = parser.parse_args()
+
+    def report(p):
+        print(f"\r{p['frames_done']}/{p['frames_total']} frames "
+              f"({p['chunks_done']}/{p['chunks_total']} chunks) "
+              f"{p['fps']:.1f} fps, {p['realtime_factor']:.1f}x realtime", end="", flush=True)
+
+    result = analyze_video(
+        args.video, user_id=args.user_id, workers=args.workers, chunk_seconds=args.chunk_seconds,
+        frame_step=args.frame_step, detector_engine=args.detector, classifier_engine=args.classifier,
+        progress=report
+    )
+    print()
+    print(f"{result['frames']} frames, {result['tracks']} tracks in {result['seconds']:.1f}s "
+          f"({result['fps']:.1f} fps, {result['realtime_factor']:.1f}x realtime)"
+          + (f", session {result['session_id']}" if result['session_id'] else ""))
+
+if __name__ == "__main__":
+    main()